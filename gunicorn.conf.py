@@ -0,0 +1,12 @@
+import os
+
+# Gunicorn configuration. NEWS_SERVER_MODE=asgi serves the ASGI
+# application from uvicorn workers, so slow clients are handled by the
+# event loop instead of tying up a worker, and the read views run async
+# (see news/urls.py). Anything else serves the WSGI application from sync
+# workers. Worker count comes from WEB_CONCURRENCY as usual.
+if os.environ.get('NEWS_SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'news_forum.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'news_forum.wsgi:application'
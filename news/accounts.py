@@ -0,0 +1,139 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import counters
+from .cache import invalidate_post
+from .models import AccountDeletion, Comment, Post, Vote
+from .threads import subtree_bounds
+
+# Account deletion without one huge cascade: deleting a User row makes
+# Django's collector load every post, comment and reply of the user into
+# memory and delete them in one long transaction. Instead the user is
+# deactivated at once (inactive users can't log in, and their sessions stop
+# authenticating), and purge_batch() removes their content a bounded batch
+# at a time, each batch in its own short transaction, from the
+# purge_account background job. Only the emptied user row is deleted with
+# the collector at the end.
+
+
+# Deactivate `user` and queue the purge of their account. Asking twice
+# reuses the pending deletion.
+def request_deletion(user):
+    from .tasks import purge_account
+
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        deletion, created = AccountDeletion.objects.get_or_create(
+            user=user, defaults={
+                'username': user.get_username(),
+                'posts_total': Post.objects.filter(author=user).count(),
+                'comments_total': Comment.objects.filter(user=user).count(),
+            }
+        )
+        if created:
+            purge_account.enqueue(deletion.pk, key=purge_key(deletion.pk))
+    user.is_active = False
+    return deletion
+
+
+def purge_key(deletion_id):
+    return f'purge_account:{deletion_id}'
+
+
+def _record(deletion, **deleted):
+    AccountDeletion.objects.filter(pk=deletion.pk).update(
+        **{field: F(field) + n for field, n in deleted.items()}
+    )
+
+
+# Delete up to `batch_size` comments of `comments` (one post's comments,
+# or one subtree) deepest first. A reply's path sorts after its parent's,
+# so every reply of a comment in the batch is in the batch too or already
+# gone, and the collector has nothing further to cascade to. The
+# post_delete signals keep the counters, caches and search index in step.
+def _delete_comments(comments, batch_size):
+    ids = list(
+        comments.order_by('-path').values_list('pk', flat=True)[:batch_size]
+    )
+    if ids:
+        Comment.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+# Withdraw up to `batch_size` of the user's votes, moving the tallies of
+# the posts voted on as cast_vote does
+def _withdraw_votes(user_id, batch_size):
+    votes = list(
+        Vote.objects.filter(user_id=user_id).order_by('pk')
+        .values_list('pk', 'post_id', 'value')[:batch_size]
+    )
+    if not votes:
+        return 0
+    Vote.objects.filter(pk__in=[pk for pk, _, _ in votes]).delete()
+    for _, post_id, value in votes:
+        if value == Vote.UP:
+            counters.vote_changed(post_id, up=-1)
+        else:
+            counters.vote_changed(post_id, down=-1)
+    categories = dict(
+        Post.objects.filter(pk__in={post_id for _, post_id, _ in votes})
+        .values_list('pk', 'category_id')
+    )
+    for post_id, category_id in categories.items():
+        invalidate_post(post_id, category_id)
+    return len(votes)
+
+
+# Purge one batch of the account's content, in order: the comments on the
+# user's posts, then each post once it has none; the user's comments
+# elsewhere, with the replies to them; the user's votes; and finally the
+# user row. Returns the number of rows deleted, or 0 once the deletion has
+# finished.
+@transaction.atomic
+def purge_batch(deletion, batch_size):
+    user_id = deletion.user_id
+    post_id = Post.objects.filter(author_id=user_id).order_by(
+        'pk'
+    ).values_list('pk', flat=True).first()
+    if post_id is not None:
+        deleted = _delete_comments(
+            Comment.objects.filter(post_id=post_id), batch_size
+        )
+        if deleted:
+            _record(deletion, comments_deleted=deleted)
+            return deleted
+        # Votes and search entries on the post go with it, in one DELETE
+        # each
+        Post.objects.filter(pk=post_id).delete()
+        _record(deletion, posts_deleted=1)
+        return 1
+
+    root = Comment.objects.filter(user_id=user_id).order_by('pk').values(
+        'post_id', 'path'
+    ).first()
+    if root is not None:
+        comments = Comment.objects.filter(post_id=root['post_id'])
+        if root['path']:
+            low, high = subtree_bounds(root['path'])
+            comments = comments.filter(path__gte=low, path__lt=high)
+        else:
+            # Not threaded yet (see fill_missing_paths); the collector
+            # takes the replies along
+            comments = comments.filter(user_id=user_id, path='')
+        deleted = _delete_comments(comments, batch_size)
+        _record(deletion, comments_deleted=deleted)
+        return deleted
+
+    deleted = _withdraw_votes(user_id, batch_size)
+    if deleted:
+        _record(deletion, votes_deleted=deleted)
+        return deleted
+
+    # Emptied (or deleted meanwhile, e.g. from the admin)
+    User.objects.filter(pk=user_id).delete()
+    AccountDeletion.objects.filter(pk=deletion.pk).update(
+        finished_at=timezone.now()
+    )
+    return 0
@@ -1,6 +1,50 @@
 from django.contrib import admin
-from .models import Post, Comment, Category
+from .models import (
+    AccountDeletion, Post, Comment, Category, Job, Vote, UserProfile,
+)
 
-admin.site.register(Post)
-admin.site.register(Comment)
 admin.site.register(Category)
+admin.site.register(Vote)
+admin.site.register(UserProfile)
+
+
+@admin.register(Post)
+class PostAdmin(admin.ModelAdmin):
+    list_display = ['title', 'author', 'category', 'created_at', 'score']
+    readonly_fields = Post.COUNTER_FIELDS
+
+    # Save edits without writing back the counters loaded with the post
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=Post.edited_fields(form.fields))
+        else:
+            obj.save()
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ['post', 'user', 'created_at', 'depth']
+    raw_id_fields = ['parent', 'post']
+
+    # The materialized path is only filled in when a comment is created, so
+    # it can't be moved to another post or thread afterwards
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return []
+        return ['post', 'parent']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_at', 'locked_by', 'locked_at', 'finished_at']
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = [
+        'username', 'posts_deleted', 'posts_total', 'comments_deleted',
+        'comments_total', 'votes_deleted', 'requested_at', 'finished_at',
+    ]
+    readonly_fields = ['user', 'requested_at', 'finished_at']
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class NewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'news'
+
+    def ready(self):
+        # Connect the model signal handlers and register the background
+        # tasks
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,134 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    Http404, HttpResponse, JsonResponse, StreamingHttpResponse,
+)
+from django.shortcuts import aget_object_or_404, render
+from django.template.loader import render_to_string
+
+from . import events
+from .cache import cache_response, detail_scopes, get_category, list_scopes
+from .forms import CommentForm
+from .models import Post
+from .pagination import KeysetPaginator
+from .queries import acomment_page, post_detail_queryset, post_list_queryset
+from .ranking import SORT_ORDERINGS
+from .routers import replica_reads
+from .search import search as search_index
+from .voting import acurrent_vote
+
+# Async versions of the read views, routed in place of those in
+# news.views when serving over ASGI (NEWS_SERVER_MODE=asgi, see
+# news.urls). Their own queries go through the async ORM; templates are
+# rendered in a worker thread because context processors and lazy
+# template variables (request.user, the category list) query the database
+# synchronously.
+
+_render = sync_to_async(render)
+_render_to_string = sync_to_async(render_to_string)
+_get_category = sync_to_async(get_category)
+_search = sync_to_async(search_index)
+
+
+# View to display a page of posts, optionally filtered by category
+@cache_response(list_scopes)
+@replica_reads
+async def post_list(request, category_id=None):
+    selected_category = None
+    if category_id:
+        selected_category = await _get_category(category_id)
+        if selected_category is None:
+            raise Http404('No Category matches the given query.')
+    posts = post_list_queryset(category_id)
+
+    sort = request.GET.get('sort')
+    if sort not in SORT_ORDERINGS:
+        sort = settings.NEWS_DEFAULT_SORT
+    paginator = KeysetPaginator(posts, ordering=SORT_ORDERINGS[sort])
+    page = await paginator.aget_page(request.GET.get('cursor'))
+
+    return await _render(request, 'news/post_list.html', {
+        'posts': page,
+        'page_obj': page,
+        'selected_category': selected_category,
+        'sort': sort,
+    })
+
+
+# View to search posts and comments
+async def search(request):
+    query = request.GET.get('q', '').strip()
+    results = await _search(query) if query else []
+    return await _render(request, 'news/search.html', {
+        'query': query,
+        'results': results,
+    })
+
+
+# View to display details of a specific post
+@cache_response(detail_scopes)
+@replica_reads
+async def post_detail(request, id):
+    post = await aget_object_or_404(post_detail_queryset(), id=id)
+    comments = await acomment_page(
+        post.id, request.GET.get('comments'),
+        collapse_after=settings.NEWS_COMMENT_COLLAPSE_AFTER
+    )
+    return await _render(request, 'news/post_detail.html', {
+        'post': post, 'form': CommentForm(), 'comments': comments,
+        'current_vote': await acurrent_vote(request.user, post.id),
+        'live_comments': True})
+
+
+# View to fetch the next page of a post's comments, as an HTML fragment
+# or, with ?format=json, wrapped in JSON
+@cache_response(detail_scopes)
+@replica_reads
+async def post_comments(request, id):
+    post = await aget_object_or_404(Post.objects.only('id'), id=id)
+    comments = await acomment_page(
+        post.id, request.GET.get('cursor'),
+        collapse_after=settings.NEWS_COMMENT_COLLAPSE_AFTER
+    )
+    context = {'post': post, 'comments': comments}
+    if request.GET.get('format') != 'json':
+        return await _render(request, 'news/comment_page.html', context)
+    return JsonResponse({
+        'html': await _render_to_string(
+            'news/comment_page.html', context, request=request
+        ),
+        'count': len(comments),
+        'next_cursor': comments.next_cursor,
+    })
+
+
+# Stream of the post's comment changes as Server-Sent Events. Only served
+# in ASGI mode: under WSGI an open stream would hold a worker, so the
+# client gets 204, which tells EventSource not to reconnect.
+async def comment_stream(request, id):
+    if settings.NEWS_SERVER_MODE != 'asgi':
+        return HttpResponse(status=204)
+    post = await aget_object_or_404(Post.objects.only('id'), id=id)
+
+    async def stream():
+        channel = events.post_channel(post.id)
+        async with events.get_broker().subscribe(channel) as subscription:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.get(), settings.NEWS_EVENT_KEEPALIVE
+                    )
+                except TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield events.format_event(event)
+
+    response = StreamingHttpResponse(
+        stream(), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
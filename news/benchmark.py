@@ -0,0 +1,367 @@
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from . import markup
+from .cache import invalidate
+from .counters import reconcile_post_counters, reconcile_profiles
+from .models import Post, Comment, Category
+from .ranking import rerank_posts
+from .search import rebuild_index
+from .threads import fill_missing_paths
+from .transfer import preserve_timestamps
+
+# Load generation for the news views: seed a synthetic forum with bulk
+# inserts, drive the views through the test client (or a running server
+# over HTTP) and summarise latency, queries per request and throughput.
+
+READ_SCENARIOS = [
+    'post_list', 'category_posts', 'post_detail', 'post_comments', 'search',
+    'user_profile',
+]
+WRITE_SCENARIOS = ['add_comment', 'post_create']
+SCENARIOS = READ_SCENARIOS + WRITE_SCENARIOS
+
+# Rows each scenario picks its requests from (see scenario_request), on
+# top of the user the requests are made as
+SCENARIO_DATA = {
+    'post_list': [],
+    'category_posts': ['category_ids'],
+    'post_detail': ['post_ids'],
+    'post_comments': ['post_ids'],
+    'search': [],
+    'user_profile': ['usernames'],
+    'add_comment': ['post_ids'],
+    'post_create': ['category_ids'],
+}
+
+
+# Run the block in the test environment, which allows the test client's
+# host and keeps any email in memory
+@contextmanager
+def test_environment():
+    setup_test_environment()
+    try:
+        yield
+    finally:
+        teardown_test_environment()
+
+
+# Run the block against a fresh test database that is destroyed
+# afterwards, so the configured database is never touched
+@contextmanager
+def throwaway_database():
+    with test_environment():
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _bulk_insert(model, objects, batch_size):
+    batch = []
+    for obj in objects:
+        if model in (Post, Comment):
+            markup.render_content(obj)
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+# Fill the database with a synthetic forum. Rows are generated lazily and
+# inserted in batches, then the derived data is computed in bulk.
+def seed(users=50, categories=5, posts=1000, comments=5000,
+         batch_size=1000, seed_value=0):
+    rng = random.Random(seed_value)
+    now = timezone.now()
+    password = make_password(None)
+    prefix = f'bench{int(time.time())}'
+
+    _bulk_insert(User, (
+        User(username=f'{prefix}_user{i}', password=password)
+        for i in range(users)
+    ), batch_size)
+    _bulk_insert(Category, (
+        Category(name=f'{prefix} category {i}') for i in range(categories)
+    ), batch_size)
+    # Bulk inserts send no signals, so drop the cached category list here
+    invalidate('categories')
+    user_ids = list(User.objects.filter(
+        username__startswith=prefix
+    ).values_list('pk', flat=True))
+    category_ids = list(Category.objects.filter(
+        name__startswith=prefix
+    ).values_list('pk', flat=True))
+
+    # Spread posts over the last 30 days so the orderings have some work
+    def make_posts():
+        for i in range(posts):
+            created = now - timedelta(seconds=rng.randrange(30 * 86400))
+            yield Post(
+                title=f'Benchmark post {i}',
+                content=f'Synthetic content for post {i}. ' * 20,
+                author_id=rng.choice(user_ids),
+                category_id=rng.choice(category_ids),
+                created_at=created, updated_at=created,
+                upvotes=rng.randrange(100), downvotes=rng.randrange(20),
+            )
+
+    with preserve_timestamps():
+        _bulk_insert(Post, make_posts(), batch_size)
+        post_ids = list(Post.objects.filter(
+            author_id__in=user_ids
+        ).values_list('pk', flat=True))
+        _bulk_insert(Comment, (
+            Comment(
+                post_id=rng.choice(post_ids), user_id=rng.choice(user_ids),
+                content=f'Synthetic comment {i}', created_at=now,
+            )
+            for i in range(comments)
+        ), batch_size)
+
+    fill_missing_paths(batch_size=batch_size)
+    reconcile_post_counters(batch_size=batch_size)
+    reconcile_profiles(batch_size=batch_size)
+    rerank_posts(batch_size=batch_size)
+    rebuild_index(batch_size=batch_size)
+    return {
+        'user_ids': user_ids,
+        'usernames': [f'{prefix}_user{i}' for i in range(users)],
+        'category_ids': category_ids,
+        'post_ids': post_ids,
+    }
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(values, pct):
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def summarise(latencies, errors, wall_time, queries=None):
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': errors,
+        'mean_ms': round(sum(latencies) / total, 3) if total else None,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'queries_per_request': (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+        'throughput_rps': round(total / wall_time, 1) if wall_time else None,
+    }
+
+
+def scenario_request(name, rng, data):
+    post_ids, category_ids = data['post_ids'], data['category_ids']
+    if name == 'post_list':
+        return 'get', reverse('post_list'), {}
+    if name == 'category_posts':
+        category = rng.choice(category_ids)
+        return 'get', reverse('category_posts', args=[category]), {}
+    if name == 'post_detail':
+        post = rng.choice(post_ids)
+        return 'get', reverse('post_detail', args=[post]), {}
+    if name == 'post_comments':
+        post = rng.choice(post_ids)
+        return 'get', reverse('post_comments', args=[post]), {}
+    if name == 'search':
+        return 'get', reverse('search'), {'q': 'synthetic'}
+    if name == 'user_profile':
+        username = rng.choice(data['usernames'])
+        return 'get', reverse('user_profile', args=[username]), {}
+    if name == 'add_comment':
+        post = rng.choice(post_ids)
+        return 'post', reverse('add_comment', args=[post]), {
+            'content': 'Benchmark comment'
+        }
+    if name == 'post_create':
+        return 'post', reverse('post_create'), {
+            'title': 'Benchmark post', 'content': 'Benchmark content',
+            'category': rng.choice(category_ids),
+        }
+    raise ValueError(f'Unknown scenario: {name}')
+
+
+# Drive each scenario through the Django test client in-process, timing
+# every request and counting its queries. Reads are made as a logged in
+# user unless `anonymous` is set (which exercises the page cache). With
+# `reconnect` the database connection is closed before every request, so
+# each one pays for opening a connection (or taking one from the pool).
+# Rate limits are lifted, as the writes come faster than any user's.
+@override_settings(NEWS_RATE_LIMITS={}, NEWS_IP_RATE_LIMITS={})
+def run_client(data, scenarios=SCENARIOS, iterations=100, warmup=5,
+               anonymous=False, reconnect=False, seed_value=0):
+    rng = random.Random(seed_value)
+    user = User.objects.get(pk=data['user_ids'][0])
+    results = {}
+    for name in scenarios:
+        client = Client()
+        if not anonymous or name in WRITE_SCENARIOS:
+            client.force_login(user)
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for i in range(warmup + iterations):
+            method, path, params = scenario_request(name, rng, data)
+            if reconnect:
+                connection.close()
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, params, secure=True)
+                elapsed = (time.perf_counter() - start) * 1000
+            if i < warmup:
+                started = time.perf_counter()
+                continue
+            latencies.append(round(elapsed, 3))
+            queries.append(len(context.captured_queries))
+            if response.status_code >= 400:
+                errors += 1
+        results[name] = summarise(
+            latencies, errors, time.perf_counter() - started, queries
+        )
+    return results
+
+
+# Share of request latency spent setting up database connections: the
+# scenarios are run reusing one connection, then reconnecting before every
+# request as happens without persistent connections. With DATABASE_POOL
+# the reconnecting run only checks connections out of the pool, so the
+# difference should all but vanish.
+def connection_overhead(data, scenarios=READ_SCENARIOS, iterations=100,
+                        warmup=5, seed_value=0):
+    runs = {
+        mode: run_client(
+            data, scenarios, iterations=iterations, warmup=warmup,
+            reconnect=mode == 'reconnect', seed_value=seed_value,
+        )
+        for mode in ('persistent', 'reconnect')
+    }
+    overhead = {}
+    for name, persistent in runs['persistent'].items():
+        reconnect = runs['reconnect'][name]
+        overhead[name] = {
+            stat: round(reconnect[stat] - persistent[stat], 3)
+            for stat in ('mean_ms', 'p50_ms', 'p95_ms')
+        }
+    return {
+        'pooled': getattr(connection, 'pool', None) is not None,
+        'runs': runs,
+        'overhead_ms': overhead,
+    }
+
+
+def _fetch(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+# Drive the read scenarios against a running server (e.g. gunicorn on
+# localhost) from `concurrency` threads at once
+def run_http(base_url, data, scenarios=READ_SCENARIOS, requests=500,
+             concurrency=8, timeout=30, seed_value=0):
+    rng = random.Random(seed_value)
+    base_url = base_url.rstrip('/')
+    results = {}
+    for name in scenarios:
+        if name not in READ_SCENARIOS:
+            continue
+        urls = []
+        for _ in range(requests):
+            _, path, params = scenario_request(name, rng, data)
+            query = f'?{urllib.parse.urlencode(params)}' if params else ''
+            urls.append(base_url + path + query)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda url: _fetch(url, timeout), urls))
+        wall_time = time.perf_counter() - started
+        latencies = [round(elapsed, 3) for elapsed, _ in outcomes]
+        errors = sum(1 for _, ok in outcomes if not ok)
+        results[name] = summarise(latencies, errors, wall_time)
+        results[name]['concurrency'] = concurrency
+    return results
+
+
+# Run the read scenarios against several servers over the same data, e.g.
+# the same code served in WSGI and in ASGI mode. `servers` maps a label to
+# a base URL; each scenario's throughput is also reported relative to the
+# first server.
+def compare(servers, data, scenarios=READ_SCENARIOS, requests=500,
+            concurrency=8, timeout=30, seed_value=0):
+    results = {
+        label: run_http(
+            url, data, scenarios, requests=requests,
+            concurrency=concurrency, timeout=timeout, seed_value=seed_value,
+        )
+        for label, url in servers.items()
+    }
+    baseline_label = next(iter(servers))
+    comparison = {}
+    for name, baseline in results[baseline_label].items():
+        comparison[name] = {
+            label: (
+                round(runs[name]['throughput_rps']
+                      / baseline['throughput_rps'], 2)
+                if baseline['throughput_rps'] else None
+            )
+            for label, runs in results.items()
+        }
+    return {
+        'servers': results,
+        'relative_throughput': comparison,
+        'baseline': baseline_label,
+    }
+
+
+# Ids of the existing rows, for benchmarking a server's own database
+def existing_data():
+    users = User.objects.order_by('pk')
+    return {
+        'user_ids': list(users.values_list('pk', flat=True)[:1000]),
+        'usernames': list(users.values_list('username', flat=True)[:1000]),
+        'category_ids': list(Category.objects.values_list('pk', flat=True)),
+        'post_ids': list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[:10000]
+        ),
+    }
+
+
+# The kinds of rows missing from `data` for the scenarios to run, e.g.
+# ['category_ids'] for a database without categories
+def missing_data(data, scenarios):
+    needed = {'user_ids'}
+    for name in scenarios:
+        needed.update(SCENARIO_DATA[name])
+    return sorted(key for key in needed if not data[key])
@@ -0,0 +1,242 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+
+from .models import Category
+
+
+# Cached pages are keyed on the version numbers of the "scopes" they show.
+# Writes bump the versions of the scopes they touch, which makes every
+# page built from the old data unreachable at once without having to know
+# which URLs (cursors, sort orders) were cached. Scopes in use:
+#   post:<id>           the detail page of one post
+#   list:all            the unfiltered post list
+#   list:category:<id>  the post list of one category
+#   lists               every post list page (e.g. after re-ranking)
+#   categories          anything showing the category list
+
+
+def _version_key(scope):
+    return f'news:version:{scope}'
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock so a lost version can't come back as a
+            # number that some old cached page was stored under
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+# A bump sets a new version from the clock rather than incrementing the old
+# one: incr is not TTL-preserving on every backend (the database cache's
+# reads the value and writes it back with the default timeout), which would
+# make the versions expire and needlessly invalidate their pages
+def _bump(scopes):
+    for scope in scopes:
+        cache.set(_version_key(scope), time.time_ns(), timeout=None)
+
+
+# Invalidate everything cached for the given scopes. The versions are
+# bumped now and again after the surrounding transaction commits, so a page
+# rendered from pre-commit data in the meantime can't stay cached.
+def invalidate(*scopes):
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+# Process-level copy of the category list as (version, categories)
+_local_categories = (None, [])
+
+
+# All categories, cached until a category is saved or deleted. Each process
+# keeps its own copy and only checks the version number in the cache, so
+# steady state costs no query and no unpickling. A Category change bumps
+# the version, and every process sharing the cache (see CACHES; not a
+# per-process locmem cache) reloads on its next call.
+def get_categories():
+    global _local_categories
+    version, = get_versions(['categories'])
+    if _local_categories[0] == version:
+        return _local_categories[1]
+
+    key = f'news:categories:{version}'
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.order_by('pk'))
+        cache.set(key, categories, timeout=None)
+    _local_categories = (version, categories)
+    return categories
+
+
+# The category new posts are filed under unless the author picks another,
+# or None when it doesn't exist
+def get_default_category():
+    for category in get_categories():
+        if category.name == settings.NEWS_DEFAULT_CATEGORY:
+            return category
+    return None
+
+
+# The category with the given id, from the cached list, or None
+def get_category(category_id):
+    for category in get_categories():
+        if category.id == category_id:
+            return category
+    return None
+
+
+# Scopes affected by a change to a post shown in the given category
+def post_scopes(post_id, category_id=None):
+    scopes = [f'post:{post_id}', 'list:all']
+    if category_id:
+        scopes.append(f'list:category:{category_id}')
+    return scopes
+
+
+def invalidate_post(post_id, *category_ids):
+    scopes = post_scopes(post_id)
+    for category_id in set(category_ids):
+        if category_id:
+            scopes.append(f'list:category:{category_id}')
+    invalidate(*scopes)
+
+
+# Scopes of the post list views
+def list_scopes(request, category_id=None):
+    scope = f'list:category:{category_id}' if category_id else 'list:all'
+    return ['lists', scope, 'categories']
+
+
+# Scopes of the post detail view
+def detail_scopes(request, id):
+    return [f'post:{id}']
+
+
+def _can_cache(request, user):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _can_store(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _page_key(request, route, scopes, user):
+    versions = get_versions(scopes)
+    params = sorted(request.GET.lists())
+    digest = hashlib.md5(
+        repr((request.method, request.path, params, versions)).encode(),
+        usedforsecurity=False
+    ).hexdigest()
+    auth = 'auth' if user.is_authenticated else 'anon'
+    return f'news:page:{route}:{auth}:{digest}'
+
+
+# Pages read from a replica are kept briefly: one rendered just after a
+# write may not show it yet, and the write's invalidation has already run
+def _timeout(request):
+    if getattr(request, 'read_replica', None):
+        return min(
+            settings.NEWS_CACHE_TIMEOUT, settings.NEWS_REPLICA_CACHE_TIMEOUT
+        )
+    return settings.NEWS_CACHE_TIMEOUT
+
+
+def _route(request, view):
+    return getattr(request.resolver_match, 'view_name', view.__name__)
+
+
+# The page key doubles as the page's ETag: it changes exactly when the
+# cached copy is invalidated
+def _etag(key):
+    return f'"{key.rsplit(":", 1)[-1]}"'
+
+
+def _not_modified(request, etag):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+# Serve repeated anonymous requests for a view from the cache. `scopes`
+# is called with the view's arguments and names the data the page shows.
+# Only anonymous responses are stored: they carry no per-user content,
+# messages or CSRF token. Works on sync and async views alike.
+#
+# Cacheable responses also carry an ETag, so a client revalidating its
+# copy with If-None-Match gets a 304 from the version numbers alone,
+# without the page being fetched from the cache or rendered.
+def cache_response(scopes):
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _async_cache_response(view, scopes)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _can_cache(request, request.user):
+                return view(request, *args, **kwargs)
+
+            key = _page_key(
+                request, _route(request, view),
+                scopes(request, *args, **kwargs), request.user
+            )
+            etag = _etag(key)
+            response = _not_modified(request, etag) or cache.get(key)
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+            if _can_store(request, response):
+                response['ETag'] = etag
+                cache.set(key, response, _timeout(request))
+            return response
+        return wrapper
+    return decorator
+
+
+# The user is fetched with request.auser(), which loads the session
+# without blocking, and then stands in for the lazy request.user so that
+# templates don't fetch it a second time
+def _async_cache_response(view, scopes):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = request.user = await request.auser()
+        if not _can_cache(request, user):
+            return await view(request, *args, **kwargs)
+
+        key = await sync_to_async(_page_key)(
+            request, _route(request, view),
+            scopes(request, *args, **kwargs), user
+        )
+        etag = _etag(key)
+        response = _not_modified(request, etag) or await cache.aget(key)
+        if response is not None:
+            return response
+
+        response = await view(request, *args, **kwargs)
+        if _can_store(request, response):
+            response['ETag'] = etag
+            await cache.aset(key, response, _timeout(request))
+        return response
+    return wrapper
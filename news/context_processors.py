@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_categories, get_versions
+
+
+# Make the category list available to every template. Both values are
+# lazy, so pages that don't show the categories (or whose category
+# fragment is cached) never look them up.
+def categories(request):
+    return {
+        'categories': SimpleLazyObject(get_categories),
+        'categories_version': SimpleLazyObject(
+            lambda: get_versions(['categories'])[0]
+        ),
+        'fragment_cache_timeout': settings.NEWS_FRAGMENT_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,145 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Post, Comment, UserProfile
+from .ranking import hot_rank_expression, rerank_posts
+
+
+# Denormalized counters on Post and UserProfile. Every change is a single
+# UPDATE with F() expressions, so concurrent requests never overwrite each
+# other's counts. A post's hot rank is recomputed in the same UPDATE.
+
+
+# Move the post's vote and comment counters by the given amounts
+def _post_changed(post_id, up=0, down=0, comments=0):
+    created_at = Post.objects.filter(pk=post_id).values_list(
+        'created_at', flat=True
+    ).first()
+    if created_at is None:
+        return 0
+    score = F('score') + up - down
+    comment_count = F('comment_count') + comments
+    return Post.objects.filter(pk=post_id).update(
+        upvotes=F('upvotes') + up,
+        downvotes=F('downvotes') + down,
+        score=score,
+        comment_count=comment_count,
+        hot_rank=hot_rank_expression(score, comment_count, created_at),
+    )
+
+
+def comment_added(post_id):
+    _post_changed(post_id, comments=1)
+
+
+def comment_removed(post_id):
+    _post_changed(post_id, comments=-1)
+
+
+# Apply a vote change, e.g. up=1 for a new upvote or up=-1, down=1 when a
+# user switches their upvote to a downvote
+def vote_changed(post_id, up=0, down=0):
+    # The author's karma follows the post's score
+    UserProfile.objects.filter(
+        pk=Subquery(Post.objects.filter(pk=post_id).values('author')[:1])
+    ).update(karma=F('karma') + up - down)
+    return _post_changed(post_id, up=up, down=down)
+
+
+# Apply a change to a user's aggregates. Users without a profile row (e.g.
+# while their account is being deleted) are left alone.
+def profile_changed(user_id, posts=0, comments=0, karma=0):
+    return UserProfile.objects.filter(pk=user_id).update(
+        post_count=F('post_count') + posts,
+        comment_count=F('comment_count') + comments,
+        karma=F('karma') + karma,
+    )
+
+
+# Recompute the counters from the source rows, batch by batch, and fix the
+# posts that drifted, re-ranking them from the corrected counts. Returns
+# the number of posts that were corrected.
+def reconcile_post_counters(batch_size=1000):
+    actual_comments = Coalesce(
+        Subquery(
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by().values('post').annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Post.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return fixed
+        last_id = ids[-1]
+        drifted = list(
+            Post.objects.filter(pk__in=ids).annotate(
+                actual_comments=actual_comments
+            ).filter(
+                ~Q(comment_count=F('actual_comments'))
+                | ~Q(score=F('upvotes') - F('downvotes'))
+            ).values_list('pk', flat=True)
+        )
+        if not drifted:
+            continue
+        fixed += Post.objects.filter(pk__in=drifted).update(
+            comment_count=actual_comments,
+            score=F('upvotes') - F('downvotes'),
+        )
+        rerank_posts(ids=drifted, batch_size=batch_size)
+
+
+# Recompute the per-user aggregates, creating missing profile rows, batch
+# by batch. Returns the number of profiles that were corrected.
+def reconcile_profiles(batch_size=1000):
+    def aggregate(queryset, field, function):
+        return Coalesce(
+            Subquery(
+                queryset.filter(**{field: OuterRef('pk')})
+                .order_by().values(field).annotate(total=function)
+                .values('total')
+            ),
+            Value(0),
+        )
+
+    actual_posts = aggregate(Post.objects, 'author', Count('pk'))
+    actual_comments = aggregate(Comment.objects, 'user', Count('pk'))
+    actual_karma = aggregate(Post.objects, 'author', Sum('score'))
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return fixed
+        last_id = ids[-1]
+        UserProfile.objects.bulk_create(
+            [UserProfile(pk=pk) for pk in ids], ignore_conflicts=True
+        )
+        drifted = list(
+            UserProfile.objects.filter(pk__in=ids).annotate(
+                actual_posts=actual_posts,
+                actual_comments=actual_comments,
+                actual_karma=actual_karma,
+            ).filter(
+                ~Q(post_count=F('actual_posts'))
+                | ~Q(comment_count=F('actual_comments'))
+                | ~Q(karma=F('actual_karma'))
+            ).values_list('pk', flat=True)
+        )
+        if not drifted:
+            continue
+        fixed += UserProfile.objects.filter(pk__in=drifted).update(
+            post_count=actual_posts,
+            comment_count=actual_comments,
+            karma=actual_karma,
+        )
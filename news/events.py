@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Live updates pushed to open pages (see the comment_stream view). Writers
+# publish events to a channel, e.g. "post:<id>", from any thread; each
+# subscriber reads them from its own bounded queue on its event loop.
+
+# Delivered in place of the events a subscriber was too slow to take: the
+# buffer is dropped and the client has to reload instead
+RESYNC = {'type': 'resync'}
+
+
+# One open stream, registered with its broker while the `async with`
+# block runs. Events are handed over on the subscriber's event loop; when
+# the buffer is full the backlog is replaced by a single RESYNC, so a slow
+# client costs at most `maxsize` events of memory and never slows down the
+# publisher or the other subscribers.
+class Subscription:
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.maxsize)
+        self.broker.add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.remove(self)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+# In-process fan-out: events only reach subscribers in the same process.
+# With several server processes, swap in a broker backed by a shared
+# pub/sub (NEWS_EVENT_BROKER) with the same publish() and subscribe().
+class LocalBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def subscribe(self, channel, maxsize=None):
+        return Subscription(
+            self, channel, maxsize or settings.NEWS_EVENT_BUFFER
+        )
+
+    def add(self, subscription):
+        with self.lock:
+            self.subscriptions.setdefault(
+                subscription.channel, set()
+            ).add(subscription)
+
+    def remove(self, subscription):
+        with self.lock:
+            subscribers = self.subscriptions.get(subscription.channel, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def subscriber_count(self, channel):
+        with self.lock:
+            return len(self.subscriptions.get(channel, ()))
+
+
+_broker = None
+
+
+# The configured broker (NEWS_EVENT_BROKER)
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.NEWS_EVENT_BROKER)()
+    return _broker
+
+
+def publish(channel, event):
+    get_broker().publish(channel, event)
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+# Comment events as sent to the page
+def comment_event(kind, comment):
+    event = {'type': kind, 'id': comment.pk}
+    if kind != 'deleted':
+        event.update({
+            'parent': comment.parent_id,
+            'user': comment.user.username,
+            'html': comment.content_html,
+            'created_at': comment.created_at.isoformat(),
+        })
+    return event
+
+
+# An event in the text/event-stream format
+def format_event(event):
+    data = json.dumps(event, separators=(',', ':'))
+    return f'event: {event["type"]}\ndata: {data}\n\n'
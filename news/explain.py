@@ -0,0 +1,125 @@
+import json
+import random
+import re
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import benchmark
+
+# Query plans of the queries the views actually run, to verify they are
+# served from indexes. Each benchmark scenario is requested once through
+# the test client, its queries are captured and EXPLAINed, and plan steps
+# reading a whole table are reported.
+
+# Statements worth explaining; transaction control and inserts have no
+# access path to check
+EXPLAINED = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+# Plan steps reading a whole table. SQLite reports "SCAN <table>" without
+# a "USING ... INDEX" suffix; PostgreSQL a "Seq Scan" node.
+FULL_SCANS = {
+    'sqlite': re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$'),
+    'postgresql': re.compile(r'^Seq Scan on (\w+)'),
+}
+
+
+def _postgres_steps(node, depth=0):
+    step = node['Node Type']
+    if 'Index Name' in node:
+        step += f' using {node["Index Name"]}'
+    if 'Relation Name' in node:
+        step += f' on {node["Relation Name"]}'
+    steps = [('  ' * depth) + step]
+    for child in node.get('Plans', ()):
+        steps.extend(_postgres_steps(child, depth + 1))
+    return steps
+
+
+# The plan of `sql` as a list of steps. On PostgreSQL sequential scans are
+# disabled while planning, so one is only chosen when no index applies,
+# however small the table.
+def explain(sql, using='default'):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(using=using):
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return [
+                step.strip() for step in _postgres_steps(plan[0]['Plan'])
+            ]
+        cursor.execute(f'EXPLAIN {sql}')
+        return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+
+# Tables read in full by the plan, except those in `allow`
+def full_scans(plan, vendor, allow=()):
+    pattern = FULL_SCANS.get(vendor)
+    if pattern is None:
+        return []
+    tables = []
+    for step in plan:
+        match = pattern.match(step.strip())
+        if match and match.group(1) not in allow:
+            tables.append(match.group(1))
+    return tables
+
+
+# Run the block in a transaction that is rolled back, so checking the views
+# of a real database leaves nothing behind, not even the session and
+# last_login written by logging in
+@contextmanager
+def rolled_back(using='default'):
+    with transaction.atomic(using=using):
+        yield
+        transaction.set_rollback(True, using=using)
+
+
+# Request each scenario once as a logged in user (so the page cache is
+# bypassed) and return {scenario: [sql, ...]}. A scenario answered with
+# an error status raises RuntimeError: its queries wouldn't be the ones
+# the view normally runs.
+def capture_queries(data, scenarios=benchmark.SCENARIOS, using='default',
+                    seed_value=0):
+    rng = random.Random(seed_value)
+    client = Client()
+    client.force_login(User.objects.get(pk=data['user_ids'][0]))
+    captured = {}
+    for name in scenarios:
+        method, path, params = benchmark.scenario_request(name, rng, data)
+        with CaptureQueriesContext(connections[using]) as context:
+            response = getattr(client, method)(path, params, secure=True)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f'{name}: {method.upper()} {path} returned status '
+                f'{response.status_code}'
+            )
+        captured[name] = [query['sql'] for query in context.captured_queries]
+    return captured
+
+
+# Explain every query of every scenario. Returns a list of
+# (scenario, sql, plan, tables read in full) for the explained queries.
+def check_views(data, scenarios=benchmark.SCENARIOS, allow=(),
+                using='default'):
+    vendor = connections[using].vendor
+    results = []
+    for name, queries in capture_queries(data, scenarios, using).items():
+        for sql in queries:
+            if not EXPLAINED.match(sql):
+                continue
+            plan = explain(sql, using)
+            results.append(
+                (name, sql, plan, full_scans(plan, vendor, allow))
+            )
+    return results
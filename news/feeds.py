@@ -0,0 +1,111 @@
+import hashlib
+
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+
+from .cache import get_category
+from .queries import feed_queryset
+from .routers import replica_reads
+
+# RSS and Atom feeds of the newest posts, site-wide and per category. Feed
+# readers poll them every few minutes, so each request first fetches just
+# the ids and modification times of the listed posts (one indexed query)
+# and answers a matching If-None-Match / If-Modified-Since with 304 before
+# anything is rendered.
+
+
+# (ETag, Last-Modified) of a feed, or (None, None) when it lists nothing.
+# The ETag also covers the author and category names shown in the feed,
+# which change without touching the posts; Last-Modified only follows the
+# posts' updated_at, so clients revalidating with If-Modified-Since alone
+# may keep an entry with an old name until the post is next edited.
+def feed_validators(feed_type, category_id=None):
+    rows = list(feed_queryset(category_id).values_list(
+        'id', 'updated_at', 'author__username', 'category__name'
+    ))
+    if not rows:
+        return None, None
+    digest = hashlib.md5(
+        repr((feed_type.__name__, rows)).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f'"{digest}"', max(row[1] for row in rows)
+
+
+# Newest posts as RSS; with a category_id, the newest posts in it
+class PostFeed(Feed):
+    feed_type = Rss201rev2Feed
+
+    def __call__(self, request, category_id=None):
+        etag, last_modified = feed_validators(self.feed_type, category_id)
+        if last_modified:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().__call__(request, category_id=category_id)
+        if etag:
+            response['ETag'] = etag
+        return response
+
+    def get_object(self, request, category_id=None):
+        if category_id is None:
+            return None
+        category = get_category(category_id)
+        if category is None:
+            raise Http404('No Category matches the given query.')
+        return category
+
+    def title(self, category):
+        if category is None:
+            return 'News Forum'
+        return f'News Forum: {category.name}'
+
+    def link(self, category):
+        if category is None:
+            return reverse('post_list')
+        return reverse('category_posts', args=[category.id])
+
+    def description(self, category):
+        if category is None:
+            return 'The newest posts on News Forum.'
+        return f'The newest posts in {category.name} on News Forum.'
+
+    def items(self, category):
+        return feed_queryset(category.id if category else None)
+
+    def item_title(self, post):
+        return post.title
+
+    def item_description(self, post):
+        return post.content_html
+
+    def item_link(self, post):
+        return reverse('post_detail', args=[post.id])
+
+    def item_author_name(self, post):
+        return post.author.username
+
+    def item_pubdate(self, post):
+        return post.created_at
+
+    def item_updateddate(self, post):
+        return post.updated_at
+
+    def item_categories(self, post):
+        return [post.category.name] if post.category else []
+
+
+# The same feeds as Atom
+class AtomPostFeed(PostFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, category):
+        return self.description(category)
+
+
+rss_feed = replica_reads(PostFeed())
+atom_feed = replica_reads(AtomPostFeed())
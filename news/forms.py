@@ -1,20 +1,68 @@
 from django import forms
+from django.forms.models import ModelChoiceIterator
+from .cache import get_categories, get_default_category
 from .models import Post, Comment, Category
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
 
+# Choice iterator listing the categories from the process-level cache
+class CachedCategoryIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for category in get_categories():
+            yield self.choice(category)
+
+    def __len__(self):
+        empty = 1 if self.field.empty_label is not None else 0
+        return len(get_categories()) + empty
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(get_categories())
+
+
+# Category field that renders and validates against the cached category
+# list instead of querying the database
+class CategoryChoiceField(forms.ModelChoiceField):
+    iterator = CachedCategoryIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Category):
+            value = value.pk
+        for category in get_categories():
+            if str(category.pk) == str(value):
+                return category
+        raise forms.ValidationError(
+            self.error_messages['invalid_choice'],
+            code='invalid_choice',
+            params={'value': value},
+        )
+
+
 # Form for creating and editing posts
 class PostForm(forms.ModelForm):
+    category = CategoryChoiceField(queryset=Category.objects.all())
+
     def __init__(self, *args, **kwargs):
         super(PostForm, self).__init__(*args, **kwargs)
-        # Pre-select "News" category as default
-        self.fields['category'].initial = Category.objects.get(name="News")
+        # Pre-select the default ("News") category for new posts
+        if not self.instance.pk:
+            self.fields['category'].initial = get_default_category()
 
     class Meta:
         model = Post
         fields = ['title', 'content', 'category']
 
+    # The category was already checked against the cached list, so skip
+    # the model's existence query for the foreign key
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        exclude.add('category')
+        return exclude
+
     # Custom validation for the title field
     def clean_title(self):
         title = self.cleaned_data.get('title')
@@ -0,0 +1,157 @@
+import logging
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('news.jobs')
+
+# Background jobs kept in the database, so no broker is needed. Tasks are
+# registered with @task and queued with task.enqueue(...); their arguments
+# must be JSON serializable. Rows are inserted in the caller's
+# transaction, so a job only becomes visible to the run_jobs workers if
+# the work that queued it commits. With NEWS_JOBS_SYNC (tests, scripts)
+# tasks run at once in the calling thread instead.
+
+_tasks = {}
+
+
+# A function registered as a task under its dotted path. Calling it runs
+# it directly; enqueue() queues a run.
+class Task:
+    def __init__(self, func, max_attempts=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    # Queue a run `delay` seconds from now. Returns the job, or None when
+    # the task ran synchronously or a job with the same `key` is already
+    # waiting (it will see the same data).
+    def enqueue(self, *args, key='', delay=0, **kwargs):
+        if settings.NEWS_JOBS_SYNC:
+            self.func(*args, **kwargs)
+            return None
+        if key and Job.objects.filter(key=key, status=Job.QUEUED).exists():
+            return None
+        return Job.objects.create(
+            name=self.name, args=list(args), kwargs=kwargs, key=key,
+            max_attempts=self.max_attempts or settings.NEWS_JOBS_ATTEMPTS,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+
+# Decorator registering a task, as @task or @task(max_attempts=...)
+def task(func=None, *, max_attempts=None):
+    def register(func):
+        registered = Task(func, max_attempts)
+        _tasks[registered.name] = registered
+        return registered
+    return register(func) if func else register
+
+
+# Seconds to wait before retrying a job that has failed `attempts` times:
+# doubling from NEWS_JOBS_BACKOFF up to NEWS_JOBS_MAX_BACKOFF, with jitter
+# so jobs failing together don't all retry together
+def backoff(attempts):
+    delay = min(
+        settings.NEWS_JOBS_BACKOFF * 2 ** (attempts - 1),
+        settings.NEWS_JOBS_MAX_BACKOFF,
+    )
+    return delay * random.uniform(0.8, 1.2)
+
+
+# Claim up to `limit` due jobs for this worker. The candidates are locked
+# with SKIP LOCKED where supported; the status condition on the update
+# keeps two workers from claiming the same job on other backends.
+def claim(limit):
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=token, locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(
+        Job.objects.filter(id__in=ids, locked_by=token)
+        .order_by('run_at', 'id')
+    )
+
+
+# Run one claimed job and record the outcome
+def run(job):
+    now = timezone.now()
+    fields = ['status', 'locked_by', 'last_error', 'run_at', 'finished_at']
+    registered = _tasks.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'Unknown task {job.name}')
+        registered.func(*job.args, **job.kwargs)
+    except Exception as exc:
+        job.last_error = f'{type(exc).__name__}: {exc}'
+        if registered is None or job.attempts >= job.max_attempts:
+            logger.exception('Job %s (%s) failed', job.pk, job.name)
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        else:
+            logger.warning(
+                'Job %s (%s) failed on attempt %d, retrying: %s',
+                job.pk, job.name, job.attempts, job.last_error,
+            )
+            job.status = Job.QUEUED
+            job.run_at = now + timedelta(seconds=backoff(job.attempts))
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.save(update_fields=fields)
+    return job.status
+
+
+# Put back jobs whose worker died mid-run (claimed longer than
+# NEWS_JOBS_TIMEOUT ago); those out of attempts are marked failed
+def requeue_stalled():
+    now = timezone.now()
+    stalled = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.NEWS_JOBS_TIMEOUT),
+    )
+    failed = stalled.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by='', finished_at=now,
+        last_error='Worker stopped while running the job',
+    )
+    return failed + stalled.update(
+        status=Job.QUEUED, locked_by='', run_at=now
+    )
+
+
+# Delete jobs that finished more than NEWS_JOBS_KEEP seconds ago
+def purge():
+    cutoff = timezone.now() - timedelta(seconds=settings.NEWS_JOBS_KEEP)
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+# Claim and run one batch of due jobs; returns how many ran
+def work(limit=10):
+    jobs = claim(limit)
+    for job in jobs:
+        run(job)
+    return len(jobs)
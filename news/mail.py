@@ -0,0 +1,81 @@
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+# Email goes out from the job queue, so views (signup, password reset)
+# don't wait on the SMTP server: QueuedEmailBackend (EMAIL_BACKEND) only
+# stores each message as a job, and the run_jobs worker delivers it with
+# NEWS_EMAIL_BACKEND, retrying while the server is unreachable.
+
+
+def _encode(content):
+    if isinstance(content, bytes):
+        return {'base64': base64.b64encode(content).decode()}
+    return content
+
+
+def _decode(content):
+    if isinstance(content, dict):
+        return base64.b64decode(content['base64'])
+    return content
+
+
+# A message as JSON for the job's arguments
+def serialize_message(message):
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            # A MIME part built by the caller; send it as it is
+            attachment = (
+                attachment.get_filename(),
+                attachment.get_payload(decode=True),
+                attachment.get_content_type(),
+            )
+        filename, content, mimetype = attachment
+        attachments.append([filename, _encode(content), mimetype])
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'alternatives': [
+            list(alternative)
+            for alternative in getattr(message, 'alternatives', [])
+        ],
+        'attachments': attachments,
+        'content_subtype': message.content_subtype,
+    }
+
+
+def deserialize_message(data, connection=None):
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'],
+        from_email=data['from_email'], to=data['to'], cc=data['cc'],
+        bcc=data['bcc'], reply_to=data['reply_to'],
+        headers=data['headers'], connection=connection,
+        alternatives=[tuple(item) for item in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, _decode(content), mimetype)
+    return message
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        from .tasks import send_email
+
+        for message in email_messages:
+            send_email.enqueue(serialize_message(message))
+        return len(email_messages)
+
+
+# The backend that actually delivers queued mail
+def delivery_connection():
+    return get_connection(settings.NEWS_EMAIL_BACKEND)
@@ -0,0 +1,135 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from news import benchmark
+
+
+# Management command to benchmark the news views on a synthetic forum
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database with synthetic data and report latency '
+        'percentiles, queries per request and throughput for the news '
+        'views. With --url, load a running server over HTTP instead; '
+        'repeat --url to compare servers, e.g. WSGI against ASGI mode. '
+        'With --connections, measure the latency connection setup adds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument(
+            '--iterations', type=int, default=100,
+            help='Measured requests per scenario.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Unmeasured requests before each scenario.'
+        )
+        parser.add_argument(
+            '--scenarios', default=','.join(benchmark.SCENARIOS),
+            help='Comma separated scenarios to run.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Make read requests logged out, through the page cache.'
+        )
+        parser.add_argument(
+            '--connections', action='store_true',
+            help='Run the read scenarios reusing the database connection '
+                 'and again reconnecting before every request, and report '
+                 'the difference (compare with DATABASE_POOL=true).'
+        )
+        parser.add_argument(
+            '--url', action='append', default=[],
+            help='Base URL of a running server to load over HTTP, '
+                 'optionally labelled as LABEL=URL; uses the ids already in '
+                 'the configured database. Repeat to compare servers.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Concurrent connections in --url mode.'
+        )
+        parser.add_argument(
+            '--output', help='Write the JSON report to this file.'
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown = set(scenarios) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+
+        report = {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key] for key in (
+                    'users', 'categories', 'posts', 'comments', 'iterations',
+                    'warmup', 'anonymous', 'connections', 'url',
+                    'concurrency',
+                )
+            },
+        }
+        servers = self.parse_servers(options['url'])
+        if len(servers) > 1:
+            report['results'] = benchmark.compare(
+                servers, benchmark.existing_data(), scenarios,
+                requests=options['iterations'],
+                concurrency=options['concurrency'],
+            )
+        elif servers:
+            report['results'] = benchmark.run_http(
+                *servers.values(), benchmark.existing_data(), scenarios,
+                requests=options['iterations'],
+                concurrency=options['concurrency'],
+            )
+        else:
+            report['results'] = self.run_in_test_database(options, scenarios)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(output + '\n')
+        self.stdout.write(output)
+
+    # Map each --url value (URL or LABEL=URL) to its label
+    def parse_servers(self, values):
+        servers = {}
+        for value in values:
+            label, sep, url = value.partition('=')
+            if not sep or '://' in label:
+                label = url = value
+            if label in servers:
+                raise CommandError(f'Duplicate server label: {label}')
+            servers[label] = url
+        return servers
+
+    # Seed and measure inside a throwaway test database
+    def run_in_test_database(self, options, scenarios):
+        with benchmark.throwaway_database():
+            self.stderr.write('Seeding test database...')
+            data = benchmark.seed(
+                users=options['users'], categories=options['categories'],
+                posts=options['posts'], comments=options['comments'],
+            )
+            self.stderr.write('Running scenarios...')
+            if options['connections']:
+                return benchmark.connection_overhead(
+                    data, [s for s in scenarios
+                           if s in benchmark.READ_SCENARIOS],
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                )
+            return benchmark.run_client(
+                data, scenarios, iterations=options['iterations'],
+                warmup=options['warmup'], anonymous=options['anonymous'],
+            )
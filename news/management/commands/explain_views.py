@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from news import benchmark, explain
+
+
+# Management command to check that the views' queries are index backed
+class Command(BaseCommand):
+    help = (
+        'Request each view once, EXPLAIN the queries it runs and report '
+        'those reading a whole table. Runs against a throwaway database '
+        'seeded with synthetic data unless --existing is given, which '
+        'checks the read views only. Exits with an error when a full scan '
+        'is found or a view fails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument(
+            '--scenarios',
+            help='Comma separated scenarios to check (default: all, or the '
+                 'read scenarios with --existing).'
+        )
+        parser.add_argument(
+            '--allow', default='news_category',
+            help='Comma separated tables that may be read in full (the '
+                 'category list is loaded whole, then cached).'
+        )
+        parser.add_argument(
+            '--existing', action='store_true',
+            help='Use the configured database and the rows already in it; '
+                 'only the read scenarios can run, in a transaction that is '
+                 'rolled back, so nothing is written.'
+        )
+
+    def handle(self, *args, **options):
+        existing = options['existing']
+        available = (
+            benchmark.READ_SCENARIOS if existing else benchmark.SCENARIOS
+        )
+        if options['scenarios'] is None:
+            scenarios = list(available)
+        else:
+            scenarios = [s for s in options['scenarios'].split(',') if s]
+        unknown = set(scenarios) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+        writes = set(scenarios) - set(available)
+        if writes:
+            raise CommandError(
+                f'Scenarios that write can\'t run with --existing: '
+                f'{", ".join(sorted(writes))}'
+            )
+        allow = {t for t in options['allow'].split(',') if t}
+
+        try:
+            if existing:
+                data = benchmark.existing_data()
+                missing = benchmark.missing_data(data, scenarios)
+                if missing:
+                    raise CommandError(
+                        f'The database has no rows to check the scenarios '
+                        f'with: {", ".join(missing)} missing.'
+                    )
+                with benchmark.test_environment(), explain.rolled_back():
+                    results = explain.check_views(data, scenarios, allow)
+            else:
+                with benchmark.throwaway_database():
+                    data = benchmark.seed(
+                        posts=options['posts'], comments=options['comments']
+                    )
+                    results = explain.check_views(data, scenarios, allow)
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        if not results:
+            raise CommandError('No queries were captured.')
+
+        flagged = 0
+        for name, sql, plan, tables in results:
+            if tables:
+                flagged += 1
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: full scan of {", ".join(tables)}'
+                ))
+            elif options['verbosity'] < 2:
+                continue
+            else:
+                self.stdout.write(f'{name}: ok')
+            self.stdout.write(f'  {sql}')
+            for step in plan:
+                self.stdout.write(f'    {step}')
+
+        checked = len(results)
+        if flagged:
+            raise CommandError(
+                f'{flagged} of {checked} queries read a whole table.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} queries checked, all index backed.'
+        ))
@@ -0,0 +1,47 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from news.transfer import export_records, write_jsonl
+
+
+# Management command to stream the forum's content out as JSON Lines
+class Command(BaseCommand):
+    help = 'Export users, categories, posts and comments as JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write to; "-" writes to standard output.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows fetched from the database at a time.'
+        )
+        parser.add_argument(
+            '--include-passwords', action='store_true',
+            help='Export password hashes so users can keep logging in.'
+        )
+
+    def handle(self, *args, **options):
+        records = export_records(
+            batch_size=options['batch_size'],
+            include_passwords=options['include_passwords'],
+        )
+        start = time.monotonic()
+        if options['output'] == '-':
+            totals = Counter(write_jsonl(records, self.stdout))
+            report = self.stderr
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                totals = Counter(write_jsonl(records, stream))
+            report = self.stdout
+        elapsed = time.monotonic() - start
+
+        total = sum(totals.values())
+        details = ', '.join(f'{n} {kind}(s)' for kind, n in totals.items())
+        report.write(
+            f'Exported {total} records ({details}) in {elapsed:.2f}s, '
+            f'{total / max(elapsed, 1e-9):.0f} records/s.'
+        )
@@ -0,0 +1,75 @@
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from news.cache import invalidate
+from news.counters import reconcile_post_counters, reconcile_profiles
+from news.ranking import rerank_posts
+from news.search import rebuild_index
+from news.threads import fill_missing_paths
+from news.transfer import import_records, read_jsonl
+
+
+# Management command to load JSON Lines written by export_forum
+class Command(BaseCommand):
+    help = 'Import users, categories, posts and comments from JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', help='File to read; "-" reads standard input.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows inserted per bulk insert and transaction.'
+        )
+        parser.add_argument(
+            '--no-refresh', action='store_true',
+            help='Skip recomputing counters, hot ranks and the search '
+                 'index after the import.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        start = time.monotonic()
+        totals = Counter()
+        skipped = 0
+        try:
+            if options['input'] == '-':
+                stream = nullcontext(sys.stdin)
+            else:
+                stream = open(options['input'], encoding='utf-8')
+            with stream as lines:
+                batches = import_records(read_jsonl(lines), batch_size)
+                for kind, inserted, existing in batches:
+                    totals[kind] += inserted
+                    skipped += existing
+        except (OSError, ValueError, IntegrityError) as error:
+            raise CommandError(f'Import failed: {error}')
+        elapsed = time.monotonic() - start
+
+        total = sum(totals.values())
+        details = ', '.join(f'{n} {kind}(s)' for kind, n in totals.items())
+        self.stdout.write(
+            f'Imported {total} records ({details}) in {elapsed:.2f}s, '
+            f'{total / max(elapsed, 1e-9):.0f} records/s; skipped '
+            f'{skipped} already present.'
+        )
+
+        # Bulk inserts bypass the model signals, so bring the derived data
+        # up to date in bulk as well
+        if not options['no_refresh']:
+            fill_missing_paths(batch_size=batch_size)
+            reconcile_post_counters(batch_size=batch_size)
+            reconcile_profiles(batch_size=batch_size)
+            rerank_posts(batch_size=batch_size)
+            rebuild_index(batch_size=batch_size)
+            invalidate('lists', 'categories')
+            self.stdout.write(
+                'Refreshed comment paths, counters, profiles, ranks and '
+                'search index.'
+            )
+        self.stdout.write(self.style.SUCCESS('Import complete.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from news.search import rebuild_index
+
+
+# Management command to rebuild the full-text search index from scratch
+class Command(BaseCommand):
+    help = 'Rebuild the search index over all posts and comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows read and written per batch.'
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {written} post(s) and comment(s).')
+        )
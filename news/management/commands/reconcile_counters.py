@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from news.counters import reconcile_post_counters, reconcile_profiles
+from news.tasks import reconcile_counters
+
+
+# Management command to repair drift in the denormalized Post counters and
+# user profile aggregates
+class Command(BaseCommand):
+    help = (
+        'Recompute comment counts and scores on posts, and post counts, '
+        'comment counts and karma on user profiles, and fix drift.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts or users checked per UPDATE.'
+        )
+        parser.add_argument(
+            '--background', action='store_true',
+            help='Queue the work for the run_jobs worker instead.'
+        )
+
+    def handle(self, *args, **options):
+        if options['background']:
+            reconcile_counters.enqueue(
+                batch_size=options['batch_size'], key='reconcile_counters'
+            )
+            self.stdout.write('Queued counter reconciliation.')
+            return
+        fixed = reconcile_post_counters(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled counters on {fixed} post(s).')
+        )
+        fixed = reconcile_profiles(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled {fixed} user profile(s).')
+        )
@@ -0,0 +1,18 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from news import metrics
+
+
+# Management command to print the rolling per-view request metrics
+class Command(BaseCommand):
+    help = (
+        'Print per-view request metrics (latency histogram, throttled '
+        'requests, SQL and template time, queries, response size) as JSON. '
+        'Reads the shared cache, so set CACHE_URL to a cache all workers '
+        'use.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(metrics.report(), indent=2))
@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from news.ranking import rerank_posts
+
+
+# Management command to refresh the precomputed hot ranks of posts
+class Command(BaseCommand):
+    help = 'Recompute the stored hot rank of recent posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='Only re-rank posts created in the last N days '
+                 '(0 re-ranks every post).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts written per bulk update.'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and re-rank every N seconds.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            since = None
+            if options['days']:
+                since = timezone.now() - timedelta(days=options['days'])
+            changed = rerank_posts(
+                since=since, batch_size=options['batch_size']
+            )
+            self.stdout.write(f'Re-ranked {changed} post(s).')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from news import jobs, ratelimit
+
+
+# Management command running the background job worker
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (email, counter reconciliation, cache '
+        'warming) until stopped. Several workers can run side by side. '
+        'With --once, run the jobs that are due and exit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no job is due.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10,
+            help='Number of jobs claimed at a time.'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait when no job is due.'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        ran = 0
+        jobs.requeue_stalled()
+        jobs.purge()
+        ratelimit.purge_buckets()
+        while not self.stopping:
+            close_old_connections()
+            count = jobs.work(options['batch_size'])
+            ran += count
+            if count:
+                continue
+            if options['once']:
+                break
+            jobs.requeue_stalled()
+            ratelimit.purge_buckets()
+            time.sleep(options['sleep'])
+        self.stdout.write(f'Ran {ran} job(s).')
+
+    # Finish the job at hand, then exit
+    def stop(self, signum, frame):
+        self.stopping = True
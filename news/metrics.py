@@ -0,0 +1,237 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections
+
+# Rolling per-view request histograms. Each process aggregates in memory
+# and a background thread adds its counts to the shared cache every
+# NEWS_METRICS_FLUSH seconds, so recording a request never waits on the
+# cache. Counts live in time windows of NEWS_METRICS_WINDOW seconds and
+# expire after a few windows; reports sum the most recent ones. The cache
+# must be shared by all workers (see CACHES) for a report, e.g. from the
+# request_metrics command, to see every process.
+#
+# Every process keeps its counts of a window in one cache entry of its
+# own, a numbered slot it claims with cache.add (atomic on every backend),
+# so a flush is a get and a set per window and concurrent processes never
+# overwrite each other's counts. Reports read the slots from 0 up.
+
+logger = logging.getLogger('news.requests')
+
+# Upper bounds (ms) of the latency buckets; the last one is open-ended
+BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, None]
+
+FIELDS = [
+    'count', 'throttled', 'total_us', 'sql_us', 'template_us', 'queries',
+    'bytes',
+]
+
+# Slots read per cache round-trip by reports
+SLOT_BATCH = 8
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+# Counts recorded since the last flush: {window: {view: {field: value}}}
+_pending = {}
+# Slot claimed by this process per window
+_slots = {}
+_process = uuid4().hex
+# Process the flush thread was started in
+_flusher_pid = None
+
+
+def _window(now=None):
+    return int((now or time.time()) // settings.NEWS_METRICS_WINDOW)
+
+
+def _slot_key(window, slot):
+    return f'news:metrics:{window}:{slot}'
+
+
+def bucket_for(total_ms):
+    for i, bound in enumerate(BUCKETS):
+        if bound is None or total_ms <= bound:
+            return i
+
+
+def _add(totals, counts):
+    for field, value in counts.items():
+        totals[field] = totals.get(field, 0) + value
+
+
+# Record one request; times in milliseconds. Throttled requests (answered
+# with 429) are counted with the others and on their own.
+def record(view, total_ms, sql_ms, template_ms, queries, size,
+           throttled=False):
+    _start_flusher()
+    window = _window()
+    values = {
+        'count': 1,
+        'throttled': int(throttled),
+        'total_us': int(total_ms * 1000),
+        'sql_us': int(sql_ms * 1000),
+        'template_us': int(template_ms * 1000),
+        'queries': queries,
+        'bytes': size,
+        f'bucket{bucket_for(total_ms)}': 1,
+    }
+    with _lock:
+        _add(_pending.setdefault(window, {}).setdefault(view, {}), values)
+
+
+# Start this process's flush thread, once per process (a forked worker
+# starts its own); NEWS_METRICS_FLUSH = 0 leaves flushing to report()
+def _start_flusher():
+    global _flusher_pid, _process
+    if _flusher_pid == os.getpid() or not settings.NEWS_METRICS_FLUSH:
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        if _flusher_pid is not None:
+            # Forked: the parent's counts and slots aren't this process's
+            _pending.clear()
+            _slots.clear()
+            _process = uuid4().hex
+        _flusher_pid = os.getpid()
+    threading.Thread(
+        target=_flush_loop, name='news-metrics-flush', daemon=True
+    ).start()
+    atexit.register(flush)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.NEWS_METRICS_FLUSH)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing the request metrics failed')
+        finally:
+            close_old_connections()
+
+
+# Add this process's counts of a window to its slot, claiming one first
+def _store(window, views, timeout):
+    slot = _slots.get(window)
+    if slot is not None:
+        key = _slot_key(window, slot)
+        data = cache.get(key)
+        if data and data['process'] == _process:
+            for view, counts in views.items():
+                _add(data['views'].setdefault(view, {}), counts)
+            cache.set(key, data, timeout)
+            return
+    data = {'process': _process, 'views': views}
+    slot = 0
+    while not cache.add(_slot_key(window, slot), data, timeout):
+        slot += 1
+    _slots[window] = slot
+
+
+# Add this process's pending counts to the shared cache
+def flush():
+    with _flush_lock:
+        with _lock:
+            pending = dict(_pending)
+            _pending.clear()
+        timeout = settings.NEWS_METRICS_WINDOW * (
+            settings.NEWS_METRICS_WINDOWS + 1
+        )
+        for window, views in pending.items():
+            _store(window, views, timeout)
+        oldest = _window() - settings.NEWS_METRICS_WINDOWS
+        for window in [window for window in _slots if window < oldest]:
+            del _slots[window]
+
+
+# Counts of every process in a window, slot by slot
+def _window_views(window):
+    slot = 0
+    while True:
+        keys = [_slot_key(window, slot + i) for i in range(SLOT_BATCH)]
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                return
+            yield found[key]['views']
+        slot += SLOT_BATCH
+
+
+def _percentile(buckets, count, pct):
+    target = count * pct / 100
+    seen = 0
+    for bound, hits in zip(BUCKETS, buckets):
+        seen += hits
+        if seen >= target:
+            return bound
+    return None
+
+
+# Summaries per view over the last NEWS_METRICS_WINDOWS windows
+def report():
+    flush()
+    current = _window()
+    windows = range(current - settings.NEWS_METRICS_WINDOWS + 1, current + 1)
+    fields = FIELDS + [f'bucket{i}' for i in range(len(BUCKETS))]
+
+    totals = defaultdict(lambda: defaultdict(int))
+    for window in windows:
+        for views in _window_views(window):
+            for view, counts in views.items():
+                for field in fields:
+                    totals[view][field] += counts.get(field, 0)
+
+    summary = {}
+    for view, data in sorted(totals.items()):
+        count = data['count']
+        if not count:
+            continue
+        buckets = [data[f'bucket{i}'] for i in range(len(BUCKETS))]
+        summary[view] = {
+            'requests': count,
+            'throttled': data['throttled'],
+            'mean_ms': round(data['total_us'] / count / 1000, 3),
+            'mean_sql_ms': round(data['sql_us'] / count / 1000, 3),
+            'mean_template_ms': round(data['template_us'] / count / 1000, 3),
+            'mean_queries': round(data['queries'] / count, 2),
+            'mean_bytes': round(data['bytes'] / count),
+            'p50_ms_le': _percentile(buckets, count, 50),
+            'p95_ms_le': _percentile(buckets, count, 95),
+            'p99_ms_le': _percentile(buckets, count, 99),
+            'histogram': {
+                f'le_{bound}' if bound else 'inf': hits
+                for bound, hits in zip(BUCKETS, buckets)
+            },
+        }
+    return summary
+
+
+# Database connections of this process, per alias: the pool's usage
+# statistics (size, idle connections, waiting requests, checkout waits,
+# connection errors) when pooling, otherwise the persistent connection
+# settings and whether this thread's connection is open
+def connection_stats():
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            stats[alias] = {'pooled': True, **pool.get_stats()}
+        else:
+            stats[alias] = {
+                'pooled': False,
+                'max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'health_checks': connection.settings_dict[
+                    'CONN_HEALTH_CHECKS'
+                ],
+                'open': connection.connection is not None,
+            }
+    return stats
@@ -0,0 +1,217 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, routers
+
+logger = logging.getLogger('news.requests')
+
+# Statistics of the request being handled in the current thread/task
+_current = ContextVar('news_request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = []
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+
+# Database execute wrapper timing every query run for a request. The
+# connections are per thread, and async views query from sync_to_async
+# threads, so it is installed on the connections of whichever thread the
+# queries run in (see _watch_connections) and reports into the stats of the
+# request through the context variable, which follows it there.
+def _timed_execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        stats.sql_ms += elapsed
+        stats.queries.append((elapsed, sql))
+
+
+def _watch(connection):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+# request_started is sent in the thread the request's sync code (the ORM
+# included) runs in, under WSGI and ASGI alike; connections opened in
+# other threads are caught when they connect
+def _watch_connections(**kwargs):
+    if 'connection' in kwargs:
+        _watch(kwargs['connection'])
+    else:
+        for connection in connections.all():
+            _watch(connection)
+
+
+_template_render = Template.render
+
+
+# Time top-level template renders; nested renders ({% include %}, the
+# parent of {% extends %}) are part of their caller's time
+def _timed_render(self, context):
+    stats = _current.get()
+    if stats is None:
+        return _template_render(self, context)
+    stats.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context)
+    finally:
+        stats.template_depth -= 1
+        if not stats.template_depth:
+            stats.template_ms += (time.perf_counter() - start) * 1000
+
+
+# Middleware recording per-request query count, SQL time, template render
+# time and response size. The figures are sent back in a Server-Timing
+# header, added to rolling per-view histograms (news.metrics) and requests
+# slower than NEWS_SLOW_REQUEST_MS are logged with their slowest SQL.
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        Template.render = _timed_render
+        request_started.connect(
+            _watch_connections, dispatch_uid='news_request_metrics'
+        )
+        connection_created.connect(
+            _watch_connections, dispatch_uid='news_request_metrics'
+        )
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, start)
+
+    def finish(self, request, response, stats, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        size = 0 if response.streaming else len(response.content)
+        response['Server-Timing'] = (
+            f'db;dur={stats.sql_ms:.2f};desc="{len(stats.queries)} queries", '
+            f'tpl;dur={stats.template_ms:.2f}, '
+            f'total;dur={total_ms:.2f}'
+        )
+        # Cache warm-ups (news.tasks.warm_pages) aren't visitors' requests
+        if not getattr(request, 'warm_up', False):
+            view = getattr(request.resolver_match, 'view_name', None)
+            metrics.record(
+                view or 'unresolved', total_ms, stats.sql_ms,
+                stats.template_ms, len(stats.queries), size,
+                response.status_code == 429,
+            )
+        if total_ms >= settings.NEWS_SLOW_REQUEST_MS:
+            self.log_slow_request(request, stats, total_ms)
+        return response
+
+    def log_slow_request(self, request, stats, total_ms):
+        slowest = sorted(stats.queries, key=lambda query: -query[0])[:5]
+        queries = '\n'.join(
+            f'  {elapsed:.2f}ms {sql}' for elapsed, sql in slowest
+        )
+        logger.warning(
+            'Slow request %s %s: %.2fms total, %.2fms in %d queries, '
+            '%.2fms rendering templates. Slowest SQL:\n%s',
+            request.method, request.path, total_ms, stats.sql_ms,
+            len(stats.queries), stats.template_ms, queries,
+        )
+
+
+# WhiteNoise's middleware is sync only, which would make Django run every
+# async view through a thread under ASGI. Static files are looked up the
+# same way here; anything else is passed on in the handler's own mode.
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+# Middleware pinning a client that has just written to the primary
+# database: the response to any unsafe request (POST, ...) sets a short
+# lived cookie, and views reading from replicas read from the primary
+# for as long as it is sent back (see news.routers)
+class ReplicaPinMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if (settings.NEWS_DATABASE_REPLICAS
+                and request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            response.set_cookie(
+                routers.PIN_COOKIE, '1',
+                max_age=settings.NEWS_REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True, samesite='Lax',
+            )
+        return response
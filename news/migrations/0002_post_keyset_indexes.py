@@ -0,0 +1,27 @@
+# Generated by Django 5.1 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-created_at', '-id'],
+                name='news_post_created_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['category', '-created_at', '-id'],
+                name='news_post_cat_created_id_idx'
+            ),
+        ),
+    ]
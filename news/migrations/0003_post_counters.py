@@ -0,0 +1,56 @@
+# Generated by Django 5.1 on 2026-10-18 11:12
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+# Fill the new counter columns for posts that already exist
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('news', 'Post')
+    Comment = apps.get_model('news', 'Comment')
+    Post.objects.update(
+        score=F('upvotes') - F('downvotes'),
+        comment_count=Coalesce(
+            Subquery(
+                Comment.objects.filter(post=OuterRef('pk'))
+                .order_by().values('post').annotate(total=Count('pk'))
+                .values('total')
+            ),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0002_post_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-score', '-id'], name='news_post_score_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-comment_count', '-id'],
+                name='news_post_comments_id_idx'
+            ),
+        ),
+    ]
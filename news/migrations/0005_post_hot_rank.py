@@ -0,0 +1,52 @@
+# Generated by Django 5.1 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+from news.ranking import hot_rank
+
+
+# Rank the posts that already exist
+def rank_existing_posts(apps, schema_editor):
+    Post = apps.get_model('news', 'Post')
+    posts = list(Post.objects.only('score', 'comment_count', 'created_at'))
+    for post in posts:
+        post.hot_rank = hot_rank(
+            post.score, post.comment_count, post.created_at
+        )
+    Post.objects.bulk_update(posts, ['hot_rank'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_rank',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(rank_existing_posts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['category', '-score', '-id'],
+                name='news_post_cat_score_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['-hot_rank', '-id'], name='news_post_hot_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(
+                fields=['category', '-hot_rank', '-id'],
+                name='news_post_cat_hot_id_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.1 on 2026-10-18 11:19
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_FTS = [
+    # External-content FTS5 table over news_searchentry, kept in step with
+    # it by triggers
+    """
+    CREATE VIRTUAL TABLE news_searchentry_fts USING fts5(
+        title, body, content='news_searchentry', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER news_searchentry_fts_ai AFTER INSERT ON news_searchentry
+    BEGIN
+        INSERT INTO news_searchentry_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER news_searchentry_fts_ad AFTER DELETE ON news_searchentry
+    BEGIN
+        INSERT INTO news_searchentry_fts(
+            news_searchentry_fts, rowid, title, body
+        ) VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER news_searchentry_fts_au AFTER UPDATE ON news_searchentry
+    BEGIN
+        INSERT INTO news_searchentry_fts(
+            news_searchentry_fts, rowid, title, body
+        ) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO news_searchentry_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_FTS_DROP = [
+    'DROP TRIGGER IF EXISTS news_searchentry_fts_au',
+    'DROP TRIGGER IF EXISTS news_searchentry_fts_ad',
+    'DROP TRIGGER IF EXISTS news_searchentry_fts_ai',
+    'DROP TABLE IF EXISTS news_searchentry_fts',
+]
+
+POSTGRES_INDEX = (
+    'CREATE INDEX news_searchentry_vector_gin '
+    'ON news_searchentry USING gin (search_vector)'
+)
+
+POSTGRES_INDEX_DROP = 'DROP INDEX IF EXISTS news_searchentry_vector_gin'
+
+
+# Create the full-text index for the database in use
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_FTS:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_INDEX)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_FTS_DROP:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_INDEX_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_post_hot_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID'
+                )),
+                ('kind', models.CharField(
+                    choices=[('post', 'Post'), ('comment', 'Comment')],
+                    max_length=10
+                )),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('body', models.TextField()),
+                ('search_vector',
+                 django.contrib.postgres.search.SearchVectorField(
+                     null=True
+                 )),
+                ('post', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+',
+                    to='news.post'
+                )),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('kind', 'object_id'),
+                        name='news_searchentry_unique_object'
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from news.threads import path_segment
+
+
+# Existing comments are all top-level: their path is their own id
+def fill_paths(apps, schema_editor):
+    Comment = apps.get_model('news', 'Comment')
+    comments = Comment.objects.only('id').order_by('pk')
+    batch = []
+    for comment in comments.iterator(chunk_size=1000):
+        comment.path = path_segment(comment.pk)
+        batch.append(comment)
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0006_searchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(
+                blank=True, null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='children',
+                to='news.comment'
+            ),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['post', 'path'], name='news_comment_post_path_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['post', 'created_at', 'id'],
+                name='news_comment_post_created_idx'
+            ),
+        ),
+    ]
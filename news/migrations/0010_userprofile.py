@@ -0,0 +1,74 @@
+# Generated by Django 5.1 on 2026-10-18 11:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+# Create the profile rows of existing users with their current figures
+def backfill_profiles(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserProfile = apps.get_model('news', 'UserProfile')
+    Post = apps.get_model('news', 'Post')
+    Comment = apps.get_model('news', 'Comment')
+    posts = {
+        row['author']: row for row in Post.objects.order_by().values(
+            'author'
+        ).annotate(total=Count('pk'), karma=Sum('score'))
+    }
+    comments = dict(
+        Comment.objects.order_by().values('user')
+        .annotate(total=Count('pk')).values_list('user', 'total')
+    )
+    profiles = []
+    for user_id in User.objects.values_list('pk', flat=True).iterator():
+        row = posts.get(user_id, {})
+        profiles.append(UserProfile(
+            user_id=user_id,
+            post_count=row.get('total', 0),
+            comment_count=comments.get(user_id, 0),
+            karma=row.get('karma') or 0,
+        ))
+    UserProfile.objects.bulk_create(profiles, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_tune_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('user', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    primary_key=True, related_name='profile',
+                    serialize=False, to=settings.AUTH_USER_MODEL
+                )),
+                ('post_count', models.IntegerField(default=0)),
+                ('comment_count', models.IntegerField(default=0)),
+                ('karma', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_profiles, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='news_comment_user_created_idx'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='user',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1 on 2026-10-18 12:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0010_userprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID'
+                )),
+                ('name', models.CharField(max_length=200)),
+                ('args', models.JSONField(default=list)),
+                ('kwargs', models.JSONField(default=dict)),
+                ('key', models.CharField(blank=True, max_length=200)),
+                ('status', models.CharField(
+                    choices=[
+                        ('queued', 'Queued'), ('running', 'Running'),
+                        ('done', 'Done'), ('failed', 'Failed'),
+                    ],
+                    default='queued', max_length=10
+                )),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_at', models.DateTimeField(
+                    default=django.utils.timezone.now
+                )),
+                ('locked_by', models.CharField(blank=True, max_length=32)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        fields=['status', 'run_at', 'id'],
+                        name='news_job_status_run_at_idx'
+                    ),
+                    models.Index(
+                        condition=models.Q(('status', 'queued')),
+                        fields=['key'], name='news_job_queued_key_idx'
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-18 14:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0011_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID'
+                )),
+                ('username', models.CharField(max_length=150)),
+                ('posts_total', models.IntegerField(default=0)),
+                ('comments_total', models.IntegerField(default=0)),
+                ('posts_deleted', models.IntegerField(default=0)),
+                ('comments_deleted', models.IntegerField(default=0)),
+                ('votes_deleted', models.IntegerField(default=0)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.OneToOneField(
+                    blank=True, null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='deletion', to=settings.AUTH_USER_MODEL
+                )),
+            ],
+        ),
+    ]
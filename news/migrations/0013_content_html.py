@@ -0,0 +1,200 @@
+# Generated by Django 5.1 on 2026-10-18 14:31
+
+import re
+from html import escape, unescape
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# The Markdown renderer of news.markup as of this migration, frozen here so
+# that later changes to news.markup don't change what the migration writes.
+# Re-render existing rows in a new migration when the renderer changes.
+
+# Length of the plain-text excerpts shown in lists
+EXCERPT_LENGTH = 200
+
+# Quotes nested deeper than this are rendered as plain text
+MAX_QUOTE_DEPTH = 5
+
+FENCE = re.compile(r'^\s*```')
+QUOTE = re.compile(r'^\s*> ?')
+LIST_ITEM = re.compile(r'^\s*(?:[-*+]|(\d{1,9})[.)])\s+(.*)$')
+CODE_SPAN = re.compile(r'`([^`\n]+)`')
+LINK = re.compile(r'\[([^\[\]\n]+)\]\(([^()\s]+)\)')
+STRONG = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*')
+# No tags inside, so <em> never straddles a </strong>
+EMPHASIS = re.compile(
+    r'\*(?=\S)([^<>]+?)(?<=\S)\*|(?<!\w)_(?=\S)([^<>]+?)(?<=\S)_(?!\w)'
+)
+SAFE_URL = re.compile(r'^(?:https?://|mailto:)', re.IGNORECASE)
+# Marks where already rendered HTML goes back in, see _inline
+PLACEHOLDER = re.compile('\x00(\\d+)\x00')
+
+
+def _emphasis(html):
+    html = STRONG.sub(r'<strong>\1</strong>', html)
+    return EMPHASIS.sub(
+        lambda match: f'<em>{match[1] or match[2]}</em>', html
+    )
+
+
+# One line of text as HTML. Code spans and links are rendered first and
+# parked behind placeholders, so the emphasis markers inside them (e.g.
+# underscores in URLs) are left alone. Backticks in a link's URL are part
+# of the URL, so the code spans parked there are put back as typed.
+def _inline(text):
+    parked = []
+    typed = []
+
+    def park(html, source=''):
+        parked.append(html)
+        typed.append(source)
+        return f'\x00{len(parked) - 1}\x00'
+
+    def code(match):
+        return park(f'<code>{escape(match[1])}</code>', match[0])
+
+    def link(match):
+        label = match[1]
+        url = PLACEHOLDER.sub(lambda match: typed[int(match[1])], match[2])
+        if not SAFE_URL.match(url):
+            return park(escape(f'[{label}]({url})'))
+        return park(
+            f'<a href="{escape(url)}" rel="nofollow ugc">'
+            f'{_emphasis(escape(label))}</a>'
+        )
+
+    html = _emphasis(escape(LINK.sub(link, CODE_SPAN.sub(code, text))))
+    # A link label may itself hold a parked code span
+    while PLACEHOLDER.search(html):
+        html = PLACEHOLDER.sub(lambda match: parked[int(match[1])], html)
+    return html
+
+
+# Split lines into ('code', lines) fenced blocks and ('text', lines) runs
+# of non-blank lines
+def _blocks(lines):
+    block = []
+    lines = iter(lines)
+    for line in lines:
+        if FENCE.match(line):
+            if block:
+                yield 'text', block
+                block = []
+            code = []
+            for line in lines:
+                if FENCE.match(line):
+                    break
+                code.append(line)
+            yield 'code', code
+        elif line.strip():
+            block.append(line)
+        elif block:
+            yield 'text', block
+            block = []
+    if block:
+        yield 'text', block
+
+
+# Lines of a paragraph or list item, keeping the line breaks
+def _lines(lines):
+    return '<br>\n'.join(_inline(line) for line in lines)
+
+
+def _list(lines):
+    items = []
+    for line in lines:
+        match = LIST_ITEM.match(line)
+        if match:
+            items.append([match[2]])
+        else:
+            items[-1].append(line.strip())
+    tag = 'ol' if LIST_ITEM.match(lines[0])[1] else 'ul'
+    body = '\n'.join(f'<li>{_lines(item)}</li>' for item in items)
+    return f'<{tag}>{body}</{tag}>'
+
+
+def _render(lines, depth):
+    html = []
+    for kind, block in _blocks(lines):
+        if kind == 'code':
+            code = escape('\n'.join(block))
+            html.append(f'<pre><code>{code}</code></pre>')
+        elif depth < MAX_QUOTE_DEPTH and all(
+            QUOTE.match(line) for line in block
+        ):
+            inner = _render([QUOTE.sub('', line) for line in block],
+                            depth + 1)
+            html.append(f'<blockquote>{inner}</blockquote>')
+        elif LIST_ITEM.match(block[0]):
+            html.append(_list(block))
+        else:
+            html.append(f'<p>{_lines(block)}</p>')
+    return '\n'.join(html)
+
+
+# The Markdown `text` as HTML, safe to output unescaped
+def render(text):
+    text = text.replace('\x00', '').replace('\r\n', '\n').replace('\r', '\n')
+    return _render(text.split('\n'), 0)
+
+
+# Plain text of rendered `html`, cut to EXCERPT_LENGTH characters
+def excerpt(html):
+    text = ' '.join(unescape(strip_tags(html)).split())
+    return Truncator(text).chars(EXCERPT_LENGTH)
+
+
+# Render the content of existing posts and comments, batch by batch
+def render_existing(apps, schema_editor):
+    for name in ['Post', 'Comment']:
+        model = apps.get_model('news', name)
+        last_id = 0
+        while True:
+            batch = list(
+                model.objects.filter(pk__gt=last_id).order_by('pk')
+                .only('id', 'content')[:1000]
+            )
+            if not batch:
+                break
+            for obj in batch:
+                obj.content_html = render(obj.content)
+                obj.excerpt = excerpt(obj.content_html)
+            model.objects.bulk_update(batch, ['content_html', 'excerpt'])
+            last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0012_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='excerpt',
+            field=models.CharField(
+                blank=True, editable=False, max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(
+                blank=True, editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0014_comment_path_not_editable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(
+                    max_length=200, primary_key=True, serialize=False
+                )),
+                ('full_at', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,22 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+
+from . import markup
+from .threads import depth_of, path_segment
+
+
+# Render a post's or comment's content before it's saved, unless the save
+# is limited to other fields
+def _render_on_save(instance, kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or 'content' in update_fields:
+        markup.render_content(instance)
+        if update_fields is not None:
+            kwargs['update_fields'] = {
+                *update_fields, 'content_html', 'excerpt'
+            }
 
 
 # Model for representing a category of posts
@@ -18,7 +35,13 @@ class Category(models.Model):
 # Model for representing a blog post
 class Post(models.Model):
     title = models.CharField(max_length=200)  # Title of the post
-    content = models.TextField()  # Main content of the post
+    content = models.TextField()  # Main content of the post, in Markdown
+    content_html = models.TextField(
+        blank=True, editable=False
+    )  # The content rendered to HTML on save, see news.markup
+    excerpt = models.CharField(
+        max_length=255, blank=True, editable=False
+    )  # Plain-text start of the content, shown in lists
     created_at = models.DateTimeField(
         auto_now_add=True
     )  # Auto-set when the post is created
@@ -26,13 +49,80 @@ class Post(models.Model):
         auto_now=True
     )  # Auto-update when the post is modified
     author = models.ForeignKey(
-        User, on_delete=models.CASCADE
-    )  # Link to the user who authored the post
+        User, on_delete=models.CASCADE, db_index=False
+    )  # Link to the user who authored the post, see Meta.indexes
     category = models.ForeignKey(
-        Category, on_delete=models.SET_NULL, null=True
-    )  # Link to the category of the post, allows null
+        Category, on_delete=models.SET_NULL, null=True, db_index=False
+    )  # Link to the category of the post, allows null, see Meta.indexes
     upvotes = models.IntegerField(default=0)  # Number of upvotes for the post
     downvotes = models.IntegerField(default=0)  # Number of downvotes
+    score = models.IntegerField(
+        default=0
+    )  # Denormalized upvotes - downvotes, kept in sync by news.counters
+    comment_count = models.IntegerField(
+        default=0
+    )  # Denormalized number of comments, kept in sync by news.counters
+    hot_rank = models.FloatField(
+        default=0
+    )  # Precomputed "hot" ordering key, kept in sync by news.counters
+
+    # Fields moved with F() updates by news.counters and news.ranking. A
+    # full save() writes back the values loaded with the post, undoing any
+    # vote or comment counted since, so editing code saves only the edited
+    # fields (see edited_fields).
+    COUNTER_FIELDS = [
+        'upvotes', 'downvotes', 'score', 'comment_count', 'hot_rank',
+    ]
+
+    class Meta:
+        indexes = [
+            # Back the keyset pagination of the post list pages
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='news_post_created_id_idx'
+            ),
+            models.Index(
+                fields=['category', '-created_at', '-id'],
+                name='news_post_cat_created_id_idx'
+            ),
+            # Back the "top" and "most discussed" orderings
+            models.Index(
+                fields=['-score', '-id'], name='news_post_score_id_idx'
+            ),
+            models.Index(
+                fields=['-comment_count', '-id'],
+                name='news_post_comments_id_idx'
+            ),
+            models.Index(
+                fields=['category', '-score', '-id'],
+                name='news_post_cat_score_id_idx'
+            ),
+            # Back the "hot" ordering
+            models.Index(
+                fields=['-hot_rank', '-id'], name='news_post_hot_id_idx'
+            ),
+            models.Index(
+                fields=['category', '-hot_rank', '-id'],
+                name='news_post_cat_hot_id_idx'
+            ),
+            # Back an author's posts, newest first; also serves the author
+            # foreign key, like the category indexes above serve category
+            models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='news_post_author_created_idx'
+            ),
+        ]
+
+    # Render the Markdown once here rather than on every page view
+    def save(self, *args, **kwargs):
+        _render_on_save(self, kwargs)
+        super().save(*args, **kwargs)
+
+    # update_fields for saving an edit of `fields`, stamping updated_at (the
+    # rendered content follows content, see _render_on_save)
+    @staticmethod
+    def edited_fields(fields):
+        return [*fields, 'updated_at']
 
     def __str__(self):
         return self.title  # Display the post title when referenced as a string
@@ -41,17 +131,272 @@ class Post(models.Model):
 # Model for representing comments on a post
 class Comment(models.Model):
     post = models.ForeignKey(
-        Post, related_name='comments', on_delete=models.CASCADE
-    )  # Link to the post being commented on
+        Post, related_name='comments', on_delete=models.CASCADE,
+        db_index=False
+    )  # Link to the post being commented on, see Meta.indexes
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE
-    )  # Link to the user who made the comment
-    content = models.TextField()  # Content of the comment
+        User, on_delete=models.CASCADE, db_index=False
+    )  # Link to the user who made the comment, see Meta.indexes
+    content = models.TextField()  # Content of the comment, in Markdown
+    content_html = models.TextField(
+        blank=True, editable=False
+    )  # The content rendered to HTML on save, see news.markup
+    excerpt = models.CharField(
+        max_length=255, blank=True, editable=False
+    )  # Plain-text start of the content, shown on profiles
     created_at = models.DateTimeField(
         auto_now_add=True
     )  # Auto-set when the comment is created
+    parent = models.ForeignKey(
+        'self', related_name='children', null=True, blank=True,
+        on_delete=models.CASCADE
+    )  # Comment this one replies to, empty for top-level comments
+    path = models.CharField(
+        max_length=255, blank=True, editable=False
+    )  # Materialized path of ids from the top-level comment, see threads
+    depth = models.PositiveSmallIntegerField(
+        default=0, editable=False
+    )  # Nesting level, 0 for top-level comments
+
+    class Meta:
+        # The post indexes also serve the post foreign key, and the user
+        # index the user foreign key
+        indexes = [
+            # Load a post's threads, or any subtree, with one range scan
+            models.Index(
+                fields=['post', 'path'], name='news_comment_post_path_idx'
+            ),
+            # Page through a post's comments in posting order
+            models.Index(
+                fields=['post', 'created_at', 'id'],
+                name='news_comment_post_created_idx'
+            ),
+            # Page through a user's comments, newest first
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='news_comment_user_created_idx'
+            ),
+        ]
+
+    # Render the Markdown, and fill in the materialized path once the
+    # comment has an id
+    def save(self, *args, **kwargs):
+        _render_on_save(self, kwargs)
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding and not self.path:
+            parent_path = ''
+            if Comment.parent.is_cached(self) and self.parent:
+                parent_path = self.parent.path
+            elif self.parent_id:
+                parent_path = Comment.objects.values_list(
+                    'path', flat=True
+                ).get(pk=self.parent_id)
+            self.path = parent_path + path_segment(self.pk)
+            self.depth = depth_of(self.path)
+            Comment.objects.filter(pk=self.pk).update(
+                path=self.path, depth=self.depth
+            )
 
     def __str__(self):
         return (
             f'Comment by {self.user.username} on {self.post.title}'
         )  # Display a string representation of the comment
+
+
+# Model for recording how each user voted on a post
+class Vote(models.Model):
+    UP = 1
+    DOWN = -1
+    VALUE_CHOICES = [(UP, 'Upvote'), (DOWN, 'Downvote')]
+
+    user = models.ForeignKey(
+        User, related_name='votes', on_delete=models.CASCADE
+    )  # Link to the user who voted
+    post = models.ForeignKey(
+        Post, related_name='votes', on_delete=models.CASCADE
+    )  # Link to the post being voted on
+    value = models.SmallIntegerField(
+        choices=VALUE_CHOICES
+    )  # +1 for an upvote, -1 for a downvote
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )  # Auto-set when the vote is first cast
+
+    class Meta:
+        constraints = [
+            # A user holds at most one vote per post
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='news_vote_unique_user_post'
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.get_value_display()} by user {self.user_id} '
+            f'on post {self.post_id}'
+        )
+
+
+# Model for the per-user aggregates shown on profile pages. The figures
+# are denormalized and moved incrementally by news.counters; the row is
+# created along with the user.
+class UserProfile(models.Model):
+    user = models.OneToOneField(
+        User, related_name='profile', primary_key=True,
+        on_delete=models.CASCADE
+    )  # The user these figures describe
+    post_count = models.IntegerField(
+        default=0
+    )  # Denormalized number of posts by the user
+    comment_count = models.IntegerField(
+        default=0
+    )  # Denormalized number of comments by the user
+    karma = models.IntegerField(
+        default=0
+    )  # Denormalized sum of the scores of the user's posts
+
+    def __str__(self):
+        return f'Profile of user {self.user_id}'
+
+
+# Model for the searchable text of posts and comments, one row per object.
+# The full-text index over it is backend specific: a GIN-indexed
+# search_vector column on PostgreSQL, an FTS5 table on SQLite (see
+# news.search and migration 0006).
+class SearchEntry(models.Model):
+    POST = 'post'
+    COMMENT = 'comment'
+    KIND_CHOICES = [(POST, 'Post'), (COMMENT, 'Comment')]
+
+    kind = models.CharField(
+        max_length=10, choices=KIND_CHOICES
+    )  # Whether the row indexes a post or a comment
+    object_id = models.BigIntegerField()  # Id of the indexed post/comment
+    post = models.ForeignKey(
+        Post, related_name='+', on_delete=models.CASCADE
+    )  # Post the result links to
+    title = models.CharField(
+        max_length=200, blank=True
+    )  # Post title, empty for comments
+    body = models.TextField()  # Post or comment content
+    search_vector = SearchVectorField(
+        null=True
+    )  # Weighted tsvector, only filled on PostgreSQL
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'object_id'],
+                name='news_searchentry_unique_object'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+# Model for a background job: a call of a task registered in news.jobs,
+# run by the run_jobs worker. Failed runs are retried with exponential
+# backoff up to max_attempts; finished jobs are purged after a while.
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)  # Registered name of the task
+    args = models.JSONField(default=list)  # Positional arguments
+    kwargs = models.JSONField(default=dict)  # Keyword arguments
+    key = models.CharField(
+        max_length=200, blank=True
+    )  # Optional key; a job isn't queued twice under the same key
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )  # Where the job is in its life cycle
+    attempts = models.PositiveIntegerField(default=0)  # Runs started so far
+    max_attempts = models.PositiveIntegerField(
+        default=5
+    )  # Runs allowed before the job is marked failed
+    run_at = models.DateTimeField(
+        default=timezone.now
+    )  # Earliest time of the next run
+    locked_by = models.CharField(
+        max_length=32, blank=True
+    )  # Token of the worker running the job
+    locked_at = models.DateTimeField(
+        null=True, blank=True
+    )  # When the current run was claimed
+    last_error = models.TextField(blank=True)  # Error of the last failed run
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )  # Auto-set when the job is queued
+    finished_at = models.DateTimeField(
+        null=True, blank=True
+    )  # When the job succeeded or finally failed
+
+    class Meta:
+        indexes = [
+            # Workers claim due jobs in run_at order
+            models.Index(
+                fields=['status', 'run_at', 'id'],
+                name='news_job_status_run_at_idx'
+            ),
+            models.Index(
+                fields=['key'], condition=models.Q(status='queued'),
+                name='news_job_queued_key_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+# Model tracking the deletion of a user's account. The user is deactivated
+# at once; news.accounts then purges their content in batches from a
+# background job and finally deletes the user row itself.
+class AccountDeletion(models.Model):
+    user = models.OneToOneField(
+        User, related_name='deletion', null=True, blank=True,
+        on_delete=models.SET_NULL
+    )  # The user being deleted, empty once the purge has finished
+    username = models.CharField(max_length=150)  # Username, for the record
+    posts_total = models.IntegerField(
+        default=0
+    )  # Posts by the user when deletion was requested
+    comments_total = models.IntegerField(
+        default=0
+    )  # Comments by the user when deletion was requested
+    posts_deleted = models.IntegerField(default=0)  # Posts purged so far
+    comments_deleted = models.IntegerField(
+        default=0
+    )  # Comments purged so far, including replies and comments on the posts
+    votes_deleted = models.IntegerField(default=0)  # Votes withdrawn so far
+    requested_at = models.DateTimeField(
+        auto_now_add=True
+    )  # Auto-set when the user asked for the deletion
+    finished_at = models.DateTimeField(
+        null=True, blank=True
+    )  # When the user row was finally deleted
+
+    def __str__(self):
+        return f'Deletion of {self.username}'
+
+
+# Model for a rate limit bucket (see news.ratelimit), used when the cache
+# can't update one atomically. The bucket is full again at full_at; rows
+# of full buckets are purged by the run_jobs worker.
+class RateLimitBucket(models.Model):
+    key = models.CharField(
+        max_length=200, primary_key=True
+    )  # Scope and user or address of the bucket
+    full_at = models.BigIntegerField(
+        db_index=True
+    )  # Time (ms since the epoch) at which the bucket is full again
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,163 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# Raised when a cursor from the URL can't be decoded
+class InvalidCursor(ValueError):
+    pass
+
+
+# A single page of results plus the opaque cursors to its neighbours
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+# Cursor-based paginator: every page is fetched with an indexed range
+# condition on the ordering columns instead of an OFFSET, so deep pages
+# cost the same as the first one. The ordering must end in a unique,
+# non-null column (normally "id").
+class KeysetPaginator:
+    def __init__(self, queryset, ordering=('-created_at', '-id'),
+                 page_size=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.page_size = page_size or settings.NEWS_PAGE_SIZE
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    # Return the requested page, falling back to the first one when the
+    # cursor is missing or malformed
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+    async def aget_page(self, cursor=None):
+        try:
+            return await self.apage(cursor)
+        except InvalidCursor:
+            return await self.apage(None)
+
+    def page(self, cursor=None):
+        query, values, backwards = self._query(cursor)
+        return self._page(list(query), values, backwards)
+
+    async def apage(self, cursor=None):
+        query, values, backwards = self._query(cursor)
+        return self._page([row async for row in query], values, backwards)
+
+    def _query(self, cursor):
+        if cursor:
+            values, backwards = self.decode_cursor(cursor)
+        else:
+            values, backwards = None, False
+
+        queryset = self.queryset
+        ordering = self.ordering
+        if backwards:
+            ordering = self._reverse(ordering)
+        if values is not None:
+            queryset = queryset.filter(
+                self._after(values, reverse=backwards)
+            )
+        # One extra row tells us whether there is anything beyond this page
+        return (
+            queryset.order_by(*ordering)[:self.page_size + 1],
+            values, backwards,
+        )
+
+    def _page(self, rows, values, backwards):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = self.encode_cursor(rows[-1])
+            if values is not None and (has_more or not backwards):
+                previous_cursor = self.encode_cursor(rows[0], backwards=True)
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    # Build the row-value comparison "(a, b) < (x, y)" as OR-ed prefixes so
+    # it works on every backend. The OR alone can't bound an index scan, so
+    # it is ANDed with "a <= x", which the composite index serves as a
+    # range: every page then starts at its cursor instead of the top.
+    def _after(self, values, reverse=False):
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            descending = self.descending[i] != reverse
+            lookup = 'lt' if descending else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        lookup = 'lte' if self.descending[0] != reverse else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': values[0]}) & condition
+
+    @staticmethod
+    def _reverse(ordering):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in ordering
+        )
+
+    def encode_cursor(self, obj, backwards=False):
+        model = self.queryset.model
+        values = []
+        for name in self.fields:
+            field = model._meta.get_field(name)
+            values.append(field.value_to_string(obj))
+        payload = {'v': values}
+        if backwards:
+            payload['b'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        model = self.queryset.model
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded))
+            raw_values = payload['v']
+            if len(raw_values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, raw_values)
+            ]
+        except (ValueError, TypeError, KeyError, ValidationError):
+            raise InvalidCursor(cursor)
+        if any(value is None for value in values):
+            raise InvalidCursor(cursor)
+        return values, bool(payload.get('b'))
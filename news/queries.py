@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Post, Comment
+from .pagination import KeysetPaginator
+from .threads import build_tree, subtree_bounds
+
+
+# Query plans for the news views. Each function returns a queryset that
+# loads everything its template touches up front, so a page costs a fixed
+# number of queries no matter how many rows it shows.
+
+
+# Posts as rendered by the post cards on the list pages, which show the
+# stored excerpt, so the full content is never loaded
+def post_list_queryset(category_id=None):
+    posts = Post.objects.select_related('category').only(
+        'id', 'title', 'excerpt', 'created_at', 'updated_at', 'score',
+        'comment_count', 'hot_rank', 'category', 'category__name',
+    )
+    if category_id:
+        posts = posts.filter(category_id=category_id)
+    return posts
+
+
+# The newest posts as listed in the feeds, with author and category
+def feed_queryset(category_id=None):
+    posts = Post.objects.select_related('author', 'category').only(
+        'id', 'title', 'content_html', 'created_at', 'updated_at',
+        'author', 'author__username', 'category', 'category__name',
+    )
+    if category_id:
+        posts = posts.filter(category_id=category_id)
+    return posts.order_by('-created_at', '-id')[:settings.NEWS_FEED_ITEMS]
+
+
+# Comments as rendered under a post, together with their authors, in
+# thread (materialized path) order
+def comment_queryset():
+    return Comment.objects.select_related('user').only(
+        'id', 'post', 'content_html', 'created_at', 'parent', 'path',
+        'depth', 'user', 'user__username',
+    ).order_by('path')
+
+
+# Comments as listed on their author's profile, with the post they're on
+def user_comment_queryset():
+    return Comment.objects.select_related('post').only(
+        'id', 'excerpt', 'created_at', 'user', 'post', 'post__title',
+    )
+
+
+# A single post with its author and category; its comments are loaded a
+# page at a time by comment_page()
+def post_detail_queryset():
+    return Post.objects.select_related('author', 'category').only(
+        'id', 'title', 'content_html', 'created_at', 'updated_at',
+        'upvotes', 'downvotes', 'score', 'comment_count',
+        'author', 'author__username', 'category', 'category__name',
+    )
+
+
+# One page of a post's top-level comments, oldest first, with their
+# threads attached as `replies` (see threads.build_tree). The top-level
+# comments are paged by cursor over (created_at, id); their replies are
+# loaded with a single query over the page's path ranges.
+def comment_page(post_id, cursor=None, collapse_after=None):
+    page = _comment_paginator(post_id).get_page(cursor)
+    replies = _replies_queryset(post_id, page)
+    replies = list(replies) if replies is not None else []
+    return _attach_replies(page, replies, collapse_after)
+
+
+async def acomment_page(post_id, cursor=None, collapse_after=None):
+    page = await _comment_paginator(post_id).aget_page(cursor)
+    replies = _replies_queryset(post_id, page)
+    replies = [c async for c in replies] if replies is not None else []
+    return _attach_replies(page, replies, collapse_after)
+
+
+def _comment_paginator(post_id):
+    roots = comment_queryset().filter(post_id=post_id, parent__isnull=True)
+    return KeysetPaginator(
+        roots, ordering=('created_at', 'id'),
+        page_size=settings.NEWS_COMMENT_PAGE
+    )
+
+
+def _replies_queryset(post_id, page):
+    ranges = Q()
+    for root in page:
+        if root.path:
+            lower, upper = subtree_bounds(root.path)
+            ranges |= Q(path__gt=lower, path__lt=upper)
+    if not ranges:
+        return None
+    return comment_queryset().filter(ranges, post_id=post_id)
+
+
+# The page's comments are the roots of the trees, so they pick up their
+# replies in place and keep their page order
+def _attach_replies(page, replies, collapse_after):
+    comments = sorted([*page, *replies], key=lambda c: c.path)
+    build_tree(comments, collapse_after=collapse_after)
+    return page
@@ -0,0 +1,82 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Value
+from django.db.models.functions import Abs, Greatest, Log, Round, Sign
+
+from .cache import invalidate
+from .models import Post
+
+
+# Reference point for the age term of the hot rank; only differences
+# between ranks matter, so any fixed date works
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# A comment counts as much as half an upvote towards a post's activity
+COMMENT_WEIGHT = 0.5
+
+# Seconds of age that cost a post one order of magnitude of activity
+DECAY_SECONDS = 45000
+
+# Orderings offered on the list pages through ?sort=
+SORT_ORDERINGS = {
+    'hot': ('-hot_rank', '-id'),
+    'new': ('-created_at', '-id'),
+    'top': ('-score', '-id'),
+}
+
+
+# Hot rank in the style of link aggregators: the log of the activity plus
+# a term that grows with creation time, so newer posts need less activity
+# to rank as high. The rank of a post only changes when its votes or
+# comments do, which is what lets it be stored and indexed.
+def hot_rank(score, comment_count, created_at):
+    activity = score + COMMENT_WEIGHT * comment_count
+    order = math.log10(max(abs(activity), 1))
+    sign = (activity > 0) - (activity < 0)
+    age = (created_at - EPOCH).total_seconds()
+    return round(sign * order + age / DECAY_SECONDS, 7)
+
+
+# hot_rank() as a database expression over the `score` and `comment_count`
+# expressions, so the UPDATE that changes a post's counters re-ranks it
+# from the values it writes (see news.counters)
+def hot_rank_expression(score, comment_count, created_at):
+    activity = score + COMMENT_WEIGHT * comment_count
+    order = Log(10, Greatest(Abs(activity), Value(1.0)))
+    age = (created_at - EPOCH).total_seconds()
+    return Round(Sign(activity) * order + age / DECAY_SECONDS, 7)
+
+
+# Recompute the stored hot rank of posts created since `since` (or of all
+# posts), or of the posts with the given `ids`, in batches, e.g. after the
+# counters were reconciled. Returns the number of posts whose rank changed.
+def rerank_posts(since=None, batch_size=1000, ids=None):
+    posts = Post.objects.only(
+        'id', 'score', 'comment_count', 'created_at', 'hot_rank'
+    ).order_by('pk')
+    if since is not None:
+        posts = posts.filter(created_at__gte=since)
+    if ids is not None:
+        posts = posts.filter(pk__in=ids)
+
+    changed = 0
+    batch = []
+    for post in posts.iterator(chunk_size=batch_size):
+        rank = hot_rank(post.score, post.comment_count, post.created_at)
+        if rank != post.hot_rank:
+            post.hot_rank = rank
+            batch.append(post)
+        if len(batch) >= batch_size:
+            changed += _save_ranks(batch)
+            batch = []
+    if batch:
+        changed += _save_ranks(batch)
+    if changed:
+        invalidate('lists')
+    return changed
+
+
+def _save_ranks(posts):
+    Post.objects.bulk_update(posts, ['hot_rank'])
+    return len(posts)
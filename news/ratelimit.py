@@ -0,0 +1,205 @@
+import math
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.shortcuts import render
+
+from .models import RateLimitBucket
+
+# Token-bucket throttling of write views. Each user and each client
+# address has a bucket per scope holding up to N tokens that refill at the
+# configured rate (NEWS_RATE_LIMITS and NEWS_IP_RATE_LIMITS, e.g. "10/m":
+# bursts of 10, then one every 6 seconds); a request takes a token from
+# both buckets or is answered with 429.
+#
+# A bucket is a single integer: the time (ms) at which it will be full
+# again. On a cache with an atomic, TTL-keeping incr (ATOMIC_CACHES) it
+# lives in the cache and taking a token is one incr of that time; the
+# request is allowed unless it now lies more than a whole bucket ahead. A
+# throttled request gives its token back with a decr, and the first
+# request after the bucket has filled up resets it with a set. The cache
+# must be shared by all workers (see CACHES) for the limits to hold across
+# processes.
+#
+# Other caches, such as the default database cache, implement incr as a
+# read and a write that concurrent requests would race past, so there the
+# buckets are RateLimitBucket rows instead, and taking a token is a single
+# conditional UPDATE that only moves the time forward while the bucket
+# isn't empty.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+
+# Cache backends whose incr is atomic and keeps the key's timeout; the
+# in-memory cache only in that each process (e.g. a test run) has its own
+ATOMIC_CACHES = {'RedisCache', 'PyMemcacheCache', 'PyLibMCCache',
+                 'LocMemCache'}
+
+# Cached buckets are dropped this long after they were started (or two
+# bucket periods if longer); each expiry lets at most one extra burst
+# through
+BUCKET_TIMEOUT = 3600
+
+
+# (tokens, ms per token) of a rate such as "10/m" or "5/10m"
+def parse_rate(rate):
+    match = RATE.match(rate.strip())
+    if not match or not int(match[1]):
+        raise ImproperlyConfigured(f'Invalid rate limit {rate!r}')
+    count, multiplier, unit = match.groups()
+    period_ms = int(multiplier or 1) * PERIODS[unit] * 1000
+    return int(count), period_ms // int(count)
+
+
+# The client's address. Behind NEWS_TRUSTED_PROXIES proxies it is the
+# entry the outermost of them appended to X-Forwarded-For; anything before
+# it comes from the client and can be forged.
+def client_ip(request):
+    proxies = settings.NEWS_TRUSTED_PROXIES
+    if proxies:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+# (bucket key, rate) of each bucket a request to the view must take a
+# token from: the signed in user's under NEWS_RATE_LIMITS, and the client
+# address's under NEWS_IP_RATE_LIMITS, which also catches one address
+# using many accounts
+def _buckets(scope, request):
+    buckets = []
+    user = request.user
+    rate = settings.NEWS_RATE_LIMITS.get(scope)
+    if rate and user.is_authenticated:
+        buckets.append((f'news:ratelimit:{scope}:user:{user.pk}', rate))
+    rate = settings.NEWS_IP_RATE_LIMITS.get(scope)
+    if rate:
+        buckets.append(
+            (f'news:ratelimit:{scope}:ip:{client_ip(request)}', rate)
+        )
+    return buckets
+
+
+# Whether buckets live in the cache rather than in RateLimitBucket rows
+def cached_buckets():
+    backend = settings.CACHES['default']['BACKEND']
+    return backend.rsplit('.', 1)[-1] in ATOMIC_CACHES
+
+
+def _wait(full_at, now, capacity):
+    return max(1, math.ceil((full_at - now - capacity) / 1000))
+
+
+# Put back a token taken from the bucket
+def return_token(key, interval):
+    if not cached_buckets():
+        RateLimitBucket.objects.filter(key=key).update(
+            full_at=F('full_at') - interval
+        )
+        return
+    try:
+        cache.decr(key, interval)
+    except ValueError:
+        pass
+
+
+def _take_cached_token(key, now, capacity, interval):
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        full_at = None
+    if full_at is None or full_at - interval < now:
+        timeout = max(BUCKET_TIMEOUT, math.ceil(2 * capacity / 1000))
+        cache.set(key, now + interval, timeout)
+        return 0
+    if full_at - now <= capacity:
+        return 0
+    return_token(key, interval)
+    return _wait(full_at, now, capacity)
+
+
+# The bucket's time moves to max(full_at, now) + interval, unless that
+# would put it more than a whole bucket ahead
+def _take_stored_token(key, now, capacity, interval):
+    buckets = RateLimitBucket.objects.filter(key=key)
+    while True:
+        taken = buckets.filter(
+            full_at__lte=now + capacity - interval
+        ).update(full_at=Greatest(F('full_at'), Value(now)) + interval)
+        if taken:
+            return 0
+        full_at = buckets.values_list('full_at', flat=True).first()
+        if full_at is not None:
+            return _wait(full_at + interval, now, capacity)
+        try:
+            with transaction.atomic():
+                RateLimitBucket.objects.create(
+                    key=key, full_at=now + interval
+                )
+            return 0
+        except IntegrityError:
+            # Created by a concurrent request in the meantime
+            continue
+
+
+# Take a token from the bucket; returns 0 when the request may proceed or
+# the seconds to wait until a token is back
+def take_token(key, tokens, interval):
+    now = int(time.time() * 1000)
+    if cached_buckets():
+        return _take_cached_token(key, now, tokens * interval, interval)
+    return _take_stored_token(key, now, tokens * interval, interval)
+
+
+# Delete the rows of buckets that are full again, which are the same as no
+# bucket; returns how many were deleted
+def purge_buckets():
+    now = int(time.time() * 1000)
+    deleted, _ = RateLimitBucket.objects.filter(full_at__lte=now).delete()
+    return deleted
+
+
+# Take a token from every bucket; returns 0 when the request may proceed
+# or the seconds to wait. Tokens already taken from the other buckets of a
+# throttled request are put back.
+def take_tokens(buckets):
+    taken = []
+    for key, rate in buckets:
+        tokens, interval = parse_rate(rate)
+        wait = take_token(key, tokens, interval)
+        if wait:
+            for key, interval in taken:
+                return_token(key, interval)
+            return wait
+        taken.append((key, interval))
+    return 0
+
+
+# Decorator limiting how often a client may call the view with one of
+# `methods`: per signed in user at NEWS_RATE_LIMITS[scope] and per
+# address at NEWS_IP_RATE_LIMITS[scope]. The request is throttled when
+# either bucket is empty; a scope with neither rate is not limited.
+def rate_limit(scope, methods=('POST',)):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                wait = take_tokens(_buckets(scope, request))
+                if wait:
+                    response = render(
+                        request, 'news/rate_limited.html',
+                        {'retry_after': wait}, status=429
+                    )
+                    response['Retry-After'] = str(wait)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
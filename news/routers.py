@@ -0,0 +1,80 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+# Read replicas of the default database (NEWS_DATABASE_REPLICAS, built
+# from DATABASE_REPLICA_URLS). Only views decorated with replica_reads
+# read from one, and only the news app's tables: users and sessions stay
+# on the primary, so a fresh login is never missed because it hasn't been
+# replicated yet. Every write goes to the primary.
+#
+# A client that has just written is sent the PIN_COOKIE by
+# news.middleware.ReplicaPinMiddleware and reads from the primary until it
+# expires (NEWS_REPLICA_PIN_SECONDS, which should exceed the replication
+# lag), so it always sees its own posts, comments and votes.
+
+PIN_COOKIE = 'news_primary'
+
+# Replica the current view reads from, if any
+_replica = ContextVar('news_replica', default=None)
+
+
+# The replica a request should read from, or None for the primary
+def choose_replica(request):
+    replicas = settings.NEWS_DATABASE_REPLICAS
+    if not replicas or PIN_COOKIE in request.COOKIES:
+        return None
+    return random.choice(replicas)
+
+
+# Decorator sending the view's reads to a replica, one per request so its
+# queries see a consistent snapshot. The chosen alias is kept on the
+# request as `read_replica`. Works on sync and async views alike.
+def replica_reads(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            request.read_replica = choose_replica(request)
+            token = _replica.set(request.read_replica)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.read_replica = choose_replica(request)
+        token = _replica.set(request.read_replica)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+# Database router for the replicas (see DATABASE_ROUTERS). Reads inside a
+# transaction on the primary stay there so they see its uncommitted
+# writes. Returning None leaves the choice to Django, which reads from the
+# database the related instance came from, or else the default one.
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if (replica and model._meta.app_label == 'news'
+                and not connections['default'].in_atomic_block):
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    # Replicas receive the schema from the primary
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.NEWS_DATABASE_REPLICAS
@@ -0,0 +1,259 @@
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector,
+)
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Post, Comment, SearchEntry
+
+# Private-use characters wrapped around matches by the database; they
+# survive HTML escaping and are then turned into <mark> tags
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+# One search hit; title and snippet are HTML with the matches highlighted
+SearchResult = namedtuple(
+    'SearchResult', 'kind object_id post_id post_title title snippet rank'
+)
+
+
+def _highlight(text):
+    return mark_safe(
+        escape(text or '')
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _result(entry, rank, title, snippet):
+    return SearchResult(
+        kind=entry.kind,
+        object_id=entry.object_id,
+        post_id=entry.post_id,
+        post_title=entry.post.title,
+        title=_highlight(title),
+        snippet=_highlight(snippet),
+        rank=rank,
+    )
+
+
+# Search backend for PostgreSQL: a weighted tsvector per entry stored in
+# SearchEntry.search_vector, backed by a GIN index
+class PostgresSearchBackend:
+    def __init__(self):
+        self.config = settings.NEWS_SEARCH_CONFIG
+
+    def vector(self):
+        return (
+            SearchVector('title', weight='A', config=self.config)
+            + SearchVector('body', weight='B', config=self.config)
+        )
+
+    def entries_saved(self, entry_ids):
+        SearchEntry.objects.filter(pk__in=entry_ids).update(
+            search_vector=self.vector()
+        )
+
+    def rebuild(self, batch_size=1000):
+        last_id = 0
+        while True:
+            ids = list(
+                SearchEntry.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            self.entries_saved(ids)
+            last_id = ids[-1]
+
+    def search(self, query, limit):
+        search_query = SearchQuery(
+            query, search_type='websearch', config=self.config
+        )
+        entries = SearchEntry.objects.filter(
+            search_vector=search_query
+        ).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            title_html=SearchHeadline(
+                'title', search_query, config=self.config,
+                start_sel=MARK_START, stop_sel=MARK_END,
+                highlight_all=True,
+            ),
+            snippet_html=SearchHeadline(
+                'body', search_query, config=self.config,
+                start_sel=MARK_START, stop_sel=MARK_END,
+                max_words=35, min_words=15,
+            ),
+        ).select_related('post').only(
+            'kind', 'object_id', 'post', 'post__title'
+        ).order_by('-rank', 'pk')[:limit]
+        return [
+            _result(entry, entry.rank, entry.title_html, entry.snippet_html)
+            for entry in entries
+        ]
+
+
+# Search backend for SQLite: an FTS5 table over news_searchentry that
+# triggers keep current, ranked with bm25
+class SQLiteSearchBackend:
+    table = 'news_searchentry_fts'
+
+    def entries_saved(self, entry_ids):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')"
+            )
+
+    def search(self, query, limit):
+        # Quote every word so user input can't use FTS5 query syntax
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"' for term in terms)
+        table = self.table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({table}, 5.0, 1.0), "
+                f"highlight({table}, 0, %s, %s), "
+                f"snippet({table}, 1, %s, %s, '…', 32) "
+                f"FROM {table} WHERE {table} MATCH %s "
+                f"ORDER BY 2, rowid LIMIT %s",
+                [MARK_START, MARK_END, MARK_START, MARK_END, match, limit]
+            )
+            rows = cursor.fetchall()
+        entries = SearchEntry.objects.select_related('post').only(
+            'kind', 'object_id', 'post', 'post__title'
+        ).in_bulk([row[0] for row in rows])
+        # bm25 scores are lower for better matches; flip them for display
+        return [
+            _result(entries[entry_id], -rank, title, snippet)
+            for entry_id, rank, title, snippet in rows
+            if entry_id in entries
+        ]
+
+
+# Fallback for databases without a supported full-text index: substring
+# matching, unranked
+class SimpleSearchBackend:
+    def entries_saved(self, entry_ids):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        pass
+
+    def search(self, query, limit):
+        terms = query.split()
+        if not terms:
+            return []
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(body__icontains=term)
+        entries = SearchEntry.objects.filter(condition).select_related(
+            'post'
+        ).order_by('-pk')[:limit]
+        return [
+            _result(entry, 0, entry.title, entry.body[:200])
+            for entry in entries
+        ]
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+_backend = None
+
+
+# The configured backend (NEWS_SEARCH_BACKEND), or the one matching the
+# database in use
+def get_backend():
+    global _backend
+    if _backend is None:
+        if settings.NEWS_SEARCH_BACKEND:
+            backend_class = import_string(settings.NEWS_SEARCH_BACKEND)
+        else:
+            backend_class = BACKENDS.get(
+                connection.vendor, SimpleSearchBackend
+            )
+        _backend = backend_class()
+    return _backend
+
+
+def search(query, limit=None):
+    query = query.strip()
+    if not query:
+        return []
+    return get_backend().search(
+        query, limit or settings.NEWS_SEARCH_RESULTS
+    )
+
+
+# Incremental indexing, called from the model signals
+
+def index_post(post):
+    entry, _ = SearchEntry.objects.update_or_create(
+        kind=SearchEntry.POST, object_id=post.pk,
+        defaults={'post_id': post.pk, 'title': post.title,
+                  'body': post.content},
+    )
+    get_backend().entries_saved([entry.pk])
+
+
+def index_comment(comment):
+    entry, _ = SearchEntry.objects.update_or_create(
+        kind=SearchEntry.COMMENT, object_id=comment.pk,
+        defaults={'post_id': comment.post_id, 'title': '',
+                  'body': comment.content},
+    )
+    get_backend().entries_saved([entry.pk])
+
+
+def unindex_comment(comment):
+    SearchEntry.objects.filter(
+        kind=SearchEntry.COMMENT, object_id=comment.pk
+    ).delete()
+
+
+def _entries(batch_size):
+    posts = Post.objects.only('id', 'title', 'content').order_by('pk')
+    for post in posts.iterator(chunk_size=batch_size):
+        yield SearchEntry(
+            kind=SearchEntry.POST, object_id=post.pk, post_id=post.pk,
+            title=post.title, body=post.content,
+        )
+    comments = Comment.objects.only('id', 'post', 'content').order_by('pk')
+    for comment in comments.iterator(chunk_size=batch_size):
+        yield SearchEntry(
+            kind=SearchEntry.COMMENT, object_id=comment.pk,
+            post_id=comment.post_id, body=comment.content,
+        )
+
+
+# Rebuild the whole index from the posts and comments, streaming them in
+# batches. Returns the number of entries written.
+def rebuild_index(batch_size=1000):
+    SearchEntry.objects.all().delete()
+    written = 0
+    batch = []
+    for entry in _entries(batch_size):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            SearchEntry.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        SearchEntry.objects.bulk_create(batch)
+        written += len(batch)
+    get_backend().rebuild(batch_size)
+    return written
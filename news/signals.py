@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.urls import reverse
+
+from . import counters, events, search, tasks
+from .cache import invalidate, invalidate_post
+from .models import Post, Comment, Category, UserProfile
+from .ranking import hot_rank
+
+
+# Category of the post a comment belongs to, without a query when the post
+# is already loaded on the comment
+def _comment_category_id(comment):
+    if Comment.post.is_cached(comment):
+        return comment.post.category_id
+    return Post.objects.filter(pk=comment.post_id).values_list(
+        'category_id', flat=True
+    ).first()
+
+
+# Push a comment change to the post's open pages once it is committed
+def _publish_comment(kind, comment):
+    channel = events.post_channel(comment.post_id)
+    event = events.comment_event(kind, comment)
+    transaction.on_commit(lambda: events.publish(channel, event))
+
+
+# Once the change is committed, have a worker render the pages showing
+# the post again so anonymous readers don't pay for the cache misses
+# (NEWS_WARM_CACHE)
+def _warm_post_pages(post_id, category_id, deleted=False):
+    if not settings.NEWS_WARM_CACHE:
+        return
+    paths = [reverse('post_list')]
+    if category_id:
+        paths.append(reverse('category_posts', args=[category_id]))
+    if not deleted:
+        paths.append(reverse('post_detail', args=[post_id]))
+    key = f'warm:{",".join(paths)}'
+    transaction.on_commit(lambda: tasks.warm_pages.enqueue(paths, key=key))
+
+
+# Keep the denormalized comment count on Post in step with Comment rows,
+# whichever code path (views, admin, cascades) creates or removes them
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance.post_id)
+        counters.profile_changed(instance.user_id, comments=1)
+    category_id = _comment_category_id(instance)
+    invalidate_post(instance.post_id, category_id)
+    _warm_post_pages(instance.post_id, category_id)
+    search.index_comment(instance)
+    _publish_comment('created' if created else 'edited', instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_removed(instance.post_id)
+    counters.profile_changed(instance.user_id, comments=-1)
+    category_id = _comment_category_id(instance)
+    invalidate_post(instance.post_id, category_id)
+    _warm_post_pages(instance.post_id, category_id)
+    search.unindex_comment(instance)
+    _publish_comment('deleted', instance)
+
+
+# Remember the category a post was loaded with, so moving it to another
+# category also invalidates the list it left
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+
+# Rank new posts as soon as they're created so they show up in the hot
+# feed before their first vote or comment
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        instance.hot_rank = hot_rank(
+            instance.score, instance.comment_count, instance.created_at
+        )
+        Post.objects.filter(pk=instance.pk).update(
+            hot_rank=instance.hot_rank
+        )
+        counters.profile_changed(
+            instance.author_id, posts=1, karma=instance.score
+        )
+    invalidate_post(
+        instance.pk, instance.category_id, instance._loaded_category_id
+    )
+    _warm_post_pages(instance.pk, instance.category_id)
+    instance._loaded_category_id = instance.category_id
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    invalidate_post(instance.pk, instance.__dict__.get('category_id'))
+    _warm_post_pages(
+        instance.pk, instance.__dict__.get('category_id'), deleted=True
+    )
+    counters.profile_changed(
+        instance.author_id, posts=-1, karma=-instance.score
+    )
+
+
+# Every user gets a profile row for their aggregates
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate('categories')
@@ -0,0 +1,78 @@
+// Apply comments created, edited or deleted by others while the page is open
+let commentList = document.querySelector(".comments[data-stream-url]");
+if (commentList && window.EventSource) {
+    let counter = document.querySelector(".comment-count");
+    let stream = new EventSource(commentList.dataset.streamUrl);
+
+    let adjustCount = function (delta) {
+        if (counter) {
+            counter.textContent = Number(counter.textContent) + delta;
+        }
+    };
+
+    stream.addEventListener("created", function (message) {
+        let data = JSON.parse(message.data);
+        adjustCount(1);
+        if (document.getElementById("comment-" + data.id)) {
+            return;
+        }
+        let list = commentList;
+        if (data.parent) {
+            let parent = document.getElementById("comment-" + data.parent);
+            if (!parent) {
+                return;
+            }
+            list = parent.querySelector(":scope > .replies");
+            if (!list) {
+                list = document.createElement("ul");
+                list.className = "replies";
+                parent.appendChild(list);
+            }
+        } else if (commentList.querySelector(":scope > .more-comments")) {
+            // Top-level comments arrive at the end, which isn't loaded yet
+            return;
+        }
+        let item = document.createElement("li");
+        item.id = "comment-" + data.id;
+        item.className = "comment";
+        // Rendered and sanitized by the server (see news.markup)
+        let content = document.createElement("div");
+        content.className = "comment-body";
+        content.innerHTML = data.html;
+        let byline = document.createElement("small");
+        byline.textContent = "by " + data.user + " on " +
+            new Date(data.created_at).toLocaleString();
+        item.append(content, byline);
+        list.appendChild(item);
+    });
+
+    stream.addEventListener("edited", function (message) {
+        let data = JSON.parse(message.data);
+        let item = document.getElementById("comment-" + data.id);
+        if (item) {
+            item.querySelector(":scope > .comment-body").innerHTML =
+                data.html;
+        }
+    });
+
+    stream.addEventListener("deleted", function (message) {
+        let data = JSON.parse(message.data);
+        let item = document.getElementById("comment-" + data.id);
+        adjustCount(-1);
+        if (item) {
+            item.remove();
+        }
+    });
+
+    // Too many updates were missed to apply them one by one
+    stream.addEventListener("resync", function () {
+        stream.close();
+        let notice = document.createElement("p");
+        notice.className = "comments-stale";
+        let link = document.createElement("a");
+        link.href = window.location.pathname + "#comments";
+        link.textContent = "New activity: reload the comments";
+        notice.appendChild(link);
+        commentList.before(notice);
+    });
+}
@@ -0,0 +1,17 @@
+// Append the next page of comments in place instead of following the link
+document.addEventListener("click", function (event) {
+    let link = event.target.closest(".more-comments a[data-fragment-url]");
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    let item = link.closest("li");
+    fetch(link.dataset.fragmentUrl)
+        .then(function (response) {
+            return response.json();
+        })
+        .then(function (data) {
+            item.insertAdjacentHTML("beforebegin", data.html);
+            item.remove();
+        });
+});
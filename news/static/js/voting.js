@@ -0,0 +1,25 @@
+// Send votes in the background and update the tallies in place
+document.querySelectorAll(".votes").forEach(function (box) {
+    box.querySelectorAll("button[data-vote]").forEach(function (button) {
+        button.addEventListener("click", function () {
+            let token = document.querySelector("[name=csrfmiddlewaretoken]");
+            let value = button.dataset.vote;
+            // Clicking the active vote again withdraws it
+            if (box.dataset.current === value) {
+                value = "none";
+            }
+            fetch(box.dataset.voteUrl, {
+                method: "POST",
+                headers: {"X-CSRFToken": token ? token.value : ""},
+                body: new URLSearchParams({value: value})
+            })
+                .then(function (response) {
+                    return response.json();
+                })
+                .then(function (data) {
+                    box.dataset.current = data.vote;
+                    box.querySelector(".vote-score").textContent = data.score;
+                });
+        });
+    });
+});
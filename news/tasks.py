@@ -0,0 +1,105 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpRequest
+
+from . import accounts, mail
+from .counters import reconcile_post_counters, reconcile_profiles
+from .jobs import task
+from .models import AccountDeletion
+
+# Work run by the run_jobs worker instead of in the request (see
+# news.jobs)
+
+
+# Deliver a message queued by news.mail.QueuedEmailBackend
+@task
+def send_email(data):
+    with mail.delivery_connection() as connection:
+        mail.deserialize_message(data, connection).send()
+
+
+# Recompute the denormalized post and profile counters
+@task(max_attempts=1)
+def reconcile_counters(batch_size=1000):
+    return (
+        reconcile_post_counters(batch_size=batch_size)
+        + reconcile_profiles(batch_size=batch_size)
+    )
+
+
+# An anonymous GET of a path, as the web server hands it to Django. It is
+# made over HTTPS where plain HTTP would be redirected, and kept out of the
+# request metrics (see news.middleware), as it isn't a visitor's.
+class WarmUpRequest(HttpRequest):
+    warm_up = True
+
+    def __init__(self, path):
+        super().__init__()
+        self.method = 'GET'
+        self.path = self.path_info = path
+        self.META = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'SERVER_NAME': settings.NEWS_WARM_HOST,
+            'SERVER_PORT': '443' if settings.SECURE_SSL_REDIRECT else '80',
+        }
+
+    def _get_scheme(self):
+        return 'https' if settings.SECURE_SSL_REDIRECT else 'http'
+
+
+# Request handlers with the middleware loaded, per mode; loading it sets up
+# WhiteNoise's file index among others, so it is done once per process
+_handlers = {}
+
+
+# Middleware reads some settings when loaded; tests change them
+@receiver(setting_changed)
+def _reset_handlers(**kwargs):
+    _handlers.clear()
+
+
+def _get_response(is_async):
+    handler = _handlers.get(is_async)
+    if handler is None:
+        handler = _handlers[is_async] = BaseHandler()
+        handler.load_middleware(is_async=is_async)
+    if is_async:
+        return async_to_sync(handler.get_response_async)
+    return handler.get_response
+
+
+# Render pages anonymously so the next visitor is served from the page
+# cache (see news.cache.cache_response). The requests go through the
+# project's middleware and views in the mode the web processes serve them
+# (NEWS_SERVER_MODE), so the pages are stored under the keys real
+# anonymous requests look up; only worthwhile with a cache shared with the
+# web processes (see CACHES).
+@task(max_attempts=1)
+def warm_pages(paths):
+    get_response = _get_response(settings.NEWS_SERVER_MODE == 'asgi')
+    for path in paths:
+        get_response(WarmUpRequest(path))
+
+
+# Purge a deleted account (see news.accounts) for up to
+# NEWS_ACCOUNT_PURGE_SECONDS, then queue the rest so other jobs get a turn
+@task
+def purge_account(deletion_id):
+    deletion = AccountDeletion.objects.filter(
+        pk=deletion_id, finished_at=None
+    ).first()
+    if deletion is None:
+        return
+    deadline = time.monotonic() + settings.NEWS_ACCOUNT_PURGE_SECONDS
+    while time.monotonic() < deadline:
+        if not accounts.purge_batch(
+            deletion, settings.NEWS_ACCOUNT_PURGE_BATCH_SIZE
+        ):
+            return
+    purge_account.enqueue(deletion_id, key=accounts.purge_key(deletion_id))
@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+# The production default cache backend (see CACHES), for tests of code
+# relying on how long its keys live; use with override_settings(CACHES=...)
+DATABASE_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'news_test_cache',
+    },
+}
+
+
+# Test helpers shared by the news test suites
+class QueryBudgetMixin:
+
+    # Fail when the wrapped block runs more than `budget` queries, listing
+    # the SQL that was executed so the offending query is easy to spot
+    @contextmanager
+    def assertMaxQueries(self, budget, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}'
+                for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f'{executed} queries executed, budget is {budget}:\n'
+                f'{queries}'
+            )
+
+
+# Test helpers for suites running under DATABASE_CACHES
+class DatabaseCacheMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        call_command('createcachetable', verbosity=0)
+
+    # The value of a cache key as seen `seconds` from now, or None once it
+    # has expired by then
+    def cache_get_later(self, key, seconds):
+        later = timezone.now() + timedelta(seconds=seconds)
+        with patch('django.core.cache.backends.db.tz_now',
+                   return_value=later):
+            return cache.get(key)
@@ -1,8 +1,54 @@
-from django.test import TestCase
-from django.urls import reverse
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from io import StringIO
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMultiAlternatives
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from django.contrib import admin
 from django.contrib.auth.models import User
-from .models import Post, Comment, Category
+from django.contrib.sessions.models import Session
+import news.urls
+import news_forum.urls
+from .models import (
+    AccountDeletion, Post, Comment, Category, Job, RateLimitBucket,
+    SearchEntry, UserProfile, Vote,
+)
+from .cache import get_versions, invalidate, invalidate_post
 from .forms import PostForm
+from . import (
+    accounts, benchmark, counters, events, explain, jobs, markup, metrics,
+    ratelimit, routers, tasks,
+)
+from .pagination import KeysetPaginator
+from .threads import build_tree, fill_missing_paths, path_segment
+from .ranking import SORT_ORDERINGS, hot_rank, rerank_posts
+from .search import search
+from .testing import (
+    DATABASE_CACHES, DatabaseCacheMixin, QueryBudgetMixin,
+)
+from .voting import cast_vote
 
 
 # Test class for the Post model
@@ -157,32 +203,2439 @@ class PostFormTests(TestCase):
         # Asserting that the form is invalid without content
         self.assertFalse(form.is_valid())
 
+    # Test that the form pre-selects the default category
+    def test_post_form_default_category(self):
+        form = PostForm()
+        self.assertEqual(form.fields['category'].initial, self.category)
 
-def test_edit_other_users_post(self):
-    # Creating another user
-    another_user = User.objects.create(username='anotheruser')
+    # Test that a missing default category doesn't break the form
+    def test_post_form_without_default_category(self):
+        self.category.delete()
+        form = PostForm()
+        self.assertIsNone(form.fields['category'].initial)
 
-    # Creating a test post
-    post = Post.objects.create(
-        title='Test Post', content='Just a test', author=another_user
-    )
+    # Test that rendering and validating the form hits no category query
+    # once the category list is cached
+    def test_post_form_steady_state_queries(self):
+        PostForm().as_p()
+        with self.assertNumQueries(0):
+            form = PostForm(data={
+                'title': 'Test Title',
+                'content': 'Test Content',
+                'category': self.category.id
+            })
+            form.as_p()
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['category'], self.category)
 
-    response = self.client.get(reverse('post_edit', args=[post.id]))
+    # Test that unknown categories are rejected and new ones picked up
+    def test_post_form_category_choices(self):
+        data = {'title': 'Test Title', 'content': 'Test Content',
+                'category': 999}
+        self.assertFalse(PostForm(data=data).is_valid())
 
-    # Expect redirection to post list or error page
-    self.assertEqual(response.status_code, 302)
+        sport = Category.objects.create(name='Sport')
+        data['category'] = sport.id
+        self.assertTrue(PostForm(data=data).is_valid())
+        self.assertIn('Sport', PostForm().as_p())
 
 
-def test_delete_other_users_post(self):
-    # Creating another user
-    another_user = User.objects.create(username='anotheruser')
+# Test class for the cursor pagination of the post list pages
+@override_settings(NEWS_PAGE_SIZE=10)
+class PostListPaginationTests(TestCase):
 
-    # Creating a test post
-    post = Post.objects.create(
-        title='Test Post', content='Just a test', author=another_user
+    # Setup method to create 25 posts spread over two categories
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='password'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        other = Category.objects.create(name='Other Category')
+        for i in range(25):
+            Post.objects.create(
+                title=f'Post {i}', content='Test Content', author=self.user,
+                category=self.category if i % 2 else other
+            )
+
+    # Test that following next cursors visits every post exactly once
+    def test_walk_all_pages(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            response = self.client.get(reverse('post_list'), params)
+            page = response.context['page_obj']
+            seen.extend(post.id for post in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        # Asserting newest-first order without gaps or duplicates
+        expected = list(
+            Post.objects.order_by('-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    # Test that the previous cursor leads back to the same page
+    def test_previous_cursor(self):
+        first = KeysetPaginator(Post.objects.all()).page()
+        second = KeysetPaginator(Post.objects.all()).page(first.next_cursor)
+        back = KeysetPaginator(Post.objects.all()).page(
+            second.previous_cursor
+        )
+
+        # Asserting the first page has no previous page
+        self.assertFalse(first.has_previous)
+        self.assertEqual(
+            [post.id for post in back], [post.id for post in first]
+        )
+        self.assertTrue(back.has_next)
+        self.assertFalse(back.has_previous)
+
+    # Test that a deep page is read with an index range starting at the
+    # cursor, in every ordering and both directions. The plan is taken
+    # with bound parameters, as the query runs: with the values inlined
+    # SQLite can find a range the parameterized query doesn't have.
+    @skipUnless(connection.vendor == 'sqlite', 'Checks SQLite plans')
+    def test_deep_page_plan(self):
+        post = Post.objects.order_by('id')[12]
+        for ordering in SORT_ORDERINGS.values():
+            for queryset in [Post.objects.all(),
+                             Post.objects.filter(category=self.category)]:
+                paginator = KeysetPaginator(queryset, ordering)
+                for backwards in [False, True]:
+                    query, _, _ = paginator._query(
+                        paginator.encode_cursor(post, backwards)
+                    )
+                    sql, params = query.query.sql_with_params()
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                        plan = cursor.fetchall()[0][-1]
+                    self.assertRegex(
+                        plan, r'^SEARCH news_post USING INDEX \w+ \('
+                        r'(category_id=\? AND )?\w+[<>]\?\)$'
+                    )
+
+    # Test that the category page only pages through its own posts
+    def test_category_posts_paginated(self):
+        response = self.client.get(
+            reverse('category_posts', args=[self.category.id])
+        )
+        page = response.context['page_obj']
+
+        # Asserting 10 of the 12 posts are shown with a next cursor
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next)
+        self.assertTrue(
+            all(post.category_id == self.category.id for post in page)
+        )
+
+    # Test that a tampered cursor falls back to the first page
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse('post_list'), {'cursor': 'not-a-cursor'}
+        )
+
+        # Asserting the first page is served
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous)
+
+
+# Test class for the number of queries issued by the read views
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    # Setup method to create posts with comments by several users
+    def setUp(self):
+        self.category = Category.objects.create(name='Test Category')
+        users = [
+            User.objects.create(username=f'user{i}')
+            for i in range(5)
+        ]
+        for i in range(15):
+            post = Post.objects.create(
+                title=f'Post {i}', content='Test Content',
+                author=users[i % 5], category=self.category
+            )
+            for user in users:
+                Comment.objects.create(
+                    post=post, user=user, content='A comment'
+                )
+        self.post = post
+
+    # Test that the list pages don't query once per post
+    def test_post_list_queries(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post_list'))
+        self.assertEqual(len(response.context['posts']), 15)
+
+        with self.assertMaxQueries(3):
+            self.client.get(
+                reverse('category_posts', args=[self.category.id])
+            )
+
+    # Test that the detail page doesn't query once per comment
+    def test_post_detail_queries(self):
+        with self.assertMaxQueries(3):
+            response = self.client.get(
+                reverse('post_detail', args=[self.post.id])
+            )
+        self.assertContains(response, 'by <a href="/user/user4/">user4</a>')
+
+    # Test that the helper reports a blown budget
+    def test_budget_exceeded(self):
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(1):
+                list(Post.objects.all())
+                list(Comment.objects.all())
+
+
+# Test class for the denormalized counters on Post
+class PostCounterTests(TestCase):
+
+    # Setup method to create a user and a post before each test
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=self.user
+        )
+
+    # Test that adding and deleting comments updates the comment count
+    def test_comment_count(self):
+        self.client.login(username='testuser', password='password')
+        self.client.post(
+            reverse('add_comment', args=[self.post.id]),
+            {'content': 'First comment'}
+        )
+        self.client.post(
+            reverse('add_comment', args=[self.post.id]),
+            {'content': 'Second comment'}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+        comment = self.post.comments.first()
+        self.client.post(reverse('delete_comment', args=[comment.id]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    # Test that vote changes keep the score in step
+    def test_vote_changed(self):
+        counters.vote_changed(self.post.id, up=1)
+        counters.vote_changed(self.post.id, up=1)
+        counters.vote_changed(self.post.id, up=-1, down=1)
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.upvotes, self.post.downvotes, self.post.score),
+            (1, 1, 0)
+        )
+
+    # Test that editing a post doesn't write back the counters it loaded
+    def test_edit_keeps_counters(self):
+        self.client.login(username='testuser', password='password')
+        is_valid = PostForm.is_valid
+
+        # A vote lands while the edit is being processed
+        def vote_then_validate(form):
+            counters.vote_changed(self.post.id, up=1)
+            return is_valid(form)
+
+        with patch.object(PostForm, 'is_valid', vote_then_validate):
+            self.client.post(
+                reverse('post_edit', args=[self.post.id]),
+                {'title': 'Edited Post', 'content': 'Edited *content*',
+                 'category': Category.objects.create(name='Edits').pk}
+            )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, 'Edited Post')
+        self.assertEqual(
+            self.post.content_html, '<p>Edited <em>content</em></p>'
+        )
+        self.assertEqual((self.post.upvotes, self.post.score), (1, 1))
+
+    # Test that the admin shows the counters read-only and keeps them
+    def test_admin_keeps_counters(self):
+        admin_user = User.objects.create_superuser(
+            username='admin', password='password'
+        )
+        model_admin = admin.site._registry[Post]
+        request = RequestFactory().post('/')
+        request.user = admin_user
+        form_class = model_admin.get_form(request, self.post)
+        self.assertFalse(
+            set(Post.COUNTER_FIELDS) & set(form_class.base_fields)
+        )
+
+        stale = Post.objects.get(pk=self.post.pk)
+        counters.vote_changed(self.post.id, up=1)
+        form = form_class({
+            'title': 'Edited Post', 'content': 'Test Content',
+            'author': self.user.pk,
+            'category': Category.objects.create(name='Edits').pk,
+        }, instance=stale)
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, True)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, 'Edited Post')
+        self.assertEqual(self.post.upvotes, 1)
+
+    # Test that the reconcile command repairs drifted counters
+    def test_reconcile_counters(self):
+        Comment.objects.create(
+            post=self.post, user=self.user, content='A comment'
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            comment_count=7, upvotes=3, score=0
+        )
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.score, 3)
+        # The hot rank follows the corrected counts
+        self.assertEqual(
+            self.post.hot_rank, hot_rank(3, 1, self.post.created_at)
+        )
+
+
+# Test class for the voting endpoint
+class VoteViewTests(TestCase):
+
+    # Setup method to create a logged in user and a post
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=self.user
+        )
+        self.url = reverse('vote_post', args=[self.post.id])
+        self.client.login(username='testuser', password='password')
+
+    # Test that voting returns the new tallies as JSON
+    def test_upvote(self):
+        response = self.client.post(self.url, {'value': 'up'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['upvotes'], 1)
+        self.assertEqual(response.json()['score'], 1)
+
+    # Test that repeating a vote doesn't count it twice
+    def test_vote_is_idempotent(self):
+        self.client.post(self.url, {'value': 'up'})
+        response = self.client.post(self.url, {'value': 'up'})
+        self.assertEqual(response.json()['upvotes'], 1)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    # Test switching and withdrawing a vote
+    def test_switch_and_withdraw(self):
+        self.client.post(self.url, {'value': 'up'})
+        data = self.client.post(self.url, {'value': 'down'}).json()
+        self.assertEqual(
+            (data['upvotes'], data['downvotes'], data['score']), (0, 1, -1)
+        )
+        data = self.client.post(self.url, {'value': 'none'}).json()
+        self.assertEqual(
+            (data['upvotes'], data['downvotes'], data['score']), (0, 0, 0)
+        )
+        self.assertFalse(Vote.objects.exists())
+
+    # Test that the post page tells the script which vote is active, so
+    # clicking it again withdraws it
+    def test_current_vote_rendered(self):
+        detail_url = reverse('post_detail', args=[self.post.id])
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'data-current=""')
+        self.client.post(self.url, {'value': 'down'})
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'data-current="down"')
+
+        self.client.logout()
+        response = self.client.get(detail_url)
+        self.assertNotContains(response, 'data-current')
+
+    # Test that GET requests and unknown values are rejected
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        response = self.client.post(self.url, {'value': 'sideways'})
+        self.assertEqual(response.status_code, 400)
+
+
+# Test class for voting from many threads at once
+class ConcurrentVoteTests(TransactionTestCase):
+
+    # Setup method to create voters and a post
+    def setUp(self):
+        author = User.objects.create(username='author')
+        self.voters = [
+            User.objects.create(username=f'voter{i}') for i in range(20)
+        ]
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=author
+        )
+
+    def vote(self, user, value):
+        try:
+            for _ in range(50):
+                try:
+                    return cast_vote(user, self.post.id, value)
+                except OperationalError:
+                    # SQLite reports lock contention instead of waiting
+                    time.sleep(0.01)
+            raise AssertionError('vote never got the database lock')
+        finally:
+            connection.close()
+
+    # Test that concurrent votes and switches lose no updates
+    def test_concurrent_votes(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            # Every voter upvotes twice, then half of them switch
+            jobs = [
+                pool.submit(self.vote, user, Vote.UP)
+                for user in self.voters * 2
+            ]
+            for job in jobs:
+                job.result()
+            jobs = [
+                pool.submit(self.vote, user, Vote.DOWN)
+                for user in self.voters[::2]
+            ]
+            for job in jobs:
+                job.result()
+
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.upvotes, self.post.downvotes, self.post.score),
+            (10, 10, 0)
+        )
+        self.assertEqual(Vote.objects.count(), 20)
+
+
+# Test class for the hot ranking and the sort options
+class HotRankingTests(TestCase):
+
+    # Setup method to create an old popular post and a new quiet one
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.popular = Post.objects.create(
+            title='Popular', content='Test Content', author=self.user
+        )
+        self.quiet = Post.objects.create(
+            title='Quiet', content='Test Content', author=self.user
+        )
+        counters.vote_changed(self.popular.id, up=50)
+
+    # Test that activity and age both move the rank
+    def test_hot_rank(self):
+        now = timezone.now()
+        self.assertGreater(hot_rank(10, 0, now), hot_rank(1, 0, now))
+        self.assertGreater(
+            hot_rank(1, 0, now), hot_rank(1, 0, now - timedelta(days=2))
+        )
+        self.assertGreater(hot_rank(1, 4, now), hot_rank(1, 0, now))
+
+    # Test that new posts are ranked on creation
+    def test_new_post_is_ranked(self):
+        self.quiet.refresh_from_db()
+        self.assertEqual(
+            self.quiet.hot_rank,
+            hot_rank(0, 0, self.quiet.created_at)
+        )
+
+    # Test that votes and comments re-rank the post right away, to the
+    # rank rerank_posts would store
+    def test_counters_rerank(self):
+        self.popular.refresh_from_db()
+        self.assertEqual(
+            self.popular.hot_rank,
+            hot_rank(50, 0, self.popular.created_at)
+        )
+        Comment.objects.create(
+            post=self.quiet, user=self.user, content='Test Comment'
+        )
+        counters.vote_changed(self.quiet.id, down=3)
+        self.quiet.refresh_from_db()
+        self.assertEqual(
+            self.quiet.hot_rank,
+            hot_rank(-3, 1, self.quiet.created_at)
+        )
+        self.assertEqual(rerank_posts(), 0)
+
+    # Test that the hot ordering follows the votes
+    def test_sort_hot(self):
+        url = reverse('post_list')
+        response = self.client.get(url, {'sort': 'hot'})
+        self.assertEqual(response.context['posts'].object_list[0],
+                         self.popular)
+        self.assertEqual(response.context['sort'], 'hot')
+
+        counters.vote_changed(self.popular.id, up=-50, down=1)
+        # As cast_vote does
+        invalidate_post(self.popular.id, None)
+        posts = self.client.get(url, {'sort': 'hot'}).context['posts']
+        self.assertEqual(posts.object_list[0], self.quiet)
+
+    # Test the top and new orderings and the fallback for unknown values
+    def test_sort_top_and_new(self):
+        url = reverse('post_list')
+        top = self.client.get(url, {'sort': 'top'}).context['posts']
+        self.assertEqual(top.object_list[0], self.popular)
+        new = self.client.get(url, {'sort': 'bogus'})
+        self.assertEqual(new.context['sort'], 'new')
+        self.assertEqual(new.context['posts'].object_list[0], self.quiet)
+
+
+# Test class for the anonymous response cache and its invalidation
+class ResponseCacheTests(TestCase):
+
+    # Setup method to create two posts in different categories
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='testuser')
+        self.news = Category.objects.create(name='News')
+        self.sport = Category.objects.create(name='Sport')
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content',
+            author=self.user, category=self.news
+        )
+        self.other = Post.objects.create(
+            title='Other Post', content='Test Content',
+            author=self.user, category=self.sport
+        )
+
+    def get(self, name, *args):
+        return self.client.get(reverse(name, args=args))
+
+    # Test that repeated anonymous requests are served from the cache
+    def test_cache_hit(self):
+        self.get('post_detail', self.post.id)
+        self.get('post_list')
+        with self.assertNumQueries(0):
+            response = self.get('post_detail', self.post.id)
+            self.get('post_list')
+        self.assertContains(response, 'Test Post')
+
+    # Test that a comment only invalidates the pages that show it
+    def test_comment_invalidates_affected_pages(self):
+        for args in [('post_detail', self.post.id),
+                     ('post_detail', self.other.id),
+                     ('post_list',),
+                     ('category_posts', self.news.id),
+                     ('category_posts', self.sport.id)]:
+            self.get(*args)
+
+        Comment.objects.create(
+            post=self.post, user=self.user, content='A new comment'
+        )
+
+        # Asserting the untouched pages are still cached
+        with self.assertNumQueries(0):
+            self.get('post_detail', self.other.id)
+            self.get('category_posts', self.sport.id)
+
+        # Asserting the affected pages are rendered again
+        self.assertContains(
+            self.get('post_detail', self.post.id), 'A new comment'
+        )
+        self.assertContains(self.get('post_list'), '1 comments')
+        self.assertContains(
+            self.get('category_posts', self.news.id), '1 comments'
+        )
+
+    # Test that moving a post clears both category pages
+    def test_post_move_invalidates_both_categories(self):
+        self.get('category_posts', self.news.id)
+        self.get('category_posts', self.sport.id)
+        post = Post.objects.get(pk=self.post.pk)
+        post.category = self.sport
+        post.save()
+        self.assertNotContains(
+            self.get('category_posts', self.news.id), 'Test Post'
+        )
+        self.assertContains(
+            self.get('category_posts', self.sport.id), 'Test Post'
+        )
+
+    # Test that category changes and votes invalidate the list pages
+    def test_category_and_vote_invalidation(self):
+        self.get('post_list')
+        Category.objects.create(name='Science')
+        self.assertContains(self.get('post_list'), 'Science')
+
+        cast_vote(self.user, self.other.id, Vote.UP)
+        self.assertContains(self.get('post_list'), '1 points')
+
+    # Test that logged in users always get a fresh page
+    def test_authenticated_not_cached(self):
+        User.objects.create_user(username='reader', password='password')
+        self.client.login(username='reader', password='password')
+        self.get('post_detail', self.post.id)
+        with self.assertTemplateUsed('news/post_detail.html'):
+            response = self.get('post_detail', self.post.id)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    # Test that a revalidated page is answered with 304 until it changes
+    def test_conditional_get(self):
+        url = reverse('post_detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Comment.objects.create(
+            post=self.post, user=self.user, content='A new comment'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    # Test that pages of logged in users carry no ETag
+    def test_authenticated_no_etag(self):
+        User.objects.create_user(username='reader', password='password')
+        self.client.login(username='reader', password='password')
+        etag = self.get('post_list').get('ETag')
+        self.assertIsNone(etag)
+        response = self.client.get(
+            reverse('post_list'), HTTP_IF_NONE_MATCH='*'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+# Test class for the page cache versions under the database cache, whose
+# incr doesn't keep a key's expiry
+@override_settings(CACHES=DATABASE_CACHES)
+class DatabaseCacheVersionTests(DatabaseCacheMixin, TestCase):
+
+    # Test that a bumped version never expires, which would invalidate
+    # every page of its scope
+    def test_bumped_version_kept(self):
+        version, = get_versions(['list:all'])
+        invalidate('list:all')
+        bumped = cache.get('news:version:list:all')
+        self.assertNotEqual(bumped, version)
+        self.assertEqual(
+            self.cache_get_later('news:version:list:all', 86400), bumped
+        )
+
+
+# Test class for the cached category list and post card fragments
+class FragmentCacheTests(TestCase):
+
+    # Setup method to create a logged in user, a category and a post
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='password'
+        )
+        self.category = Category.objects.create(name='News')
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content',
+            author=self.user, category=self.category
+        )
+        self.client.login(username='testuser', password='password')
+
+    def category_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('post_list'))
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "news_category"' in query['sql']
+        ]
+        return response, queries
+
+    # Test that the category list is only fetched on the first request
+    def test_categories_cached(self):
+        self.category_queries()
+        response, queries = self.category_queries()
+        self.assertEqual(queries, [])
+        self.assertContains(response, 'News')
+
+        # Asserting the selected category comes from the cache as well
+        with self.assertNumQueries(3):
+            self.client.get(
+                reverse('category_posts', args=[self.category.id])
+            )
+
+    # Test that renaming a category refreshes the nav and the post cards
+    def test_category_rename(self):
+        self.category_queries()
+        self.category.name = 'Headlines'
+        self.category.save()
+        response = self.client.get(reverse('post_list'))
+        self.assertNotContains(response, 'Posted in News')
+        self.assertContains(response, 'Posted in Headlines')
+
+    # Test that editing a post refreshes its card
+    def test_post_card_refreshed(self):
+        self.client.get(reverse('post_list'))
+        self.post.title = 'Edited Post'
+        self.post.save()
+        response = self.client.get(reverse('post_list'))
+        self.assertContains(response, 'Edited Post')
+
+    # Test that an unknown category still returns 404
+    def test_unknown_category(self):
+        response = self.client.get(reverse('category_posts', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+# Test class for the full-text search
+class SearchTests(TestCase):
+
+    # Setup method to create a post and a comment to search for
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.post = Post.objects.create(
+            title='Election results', author=self.user,
+            content='The votes have been counted in every district.'
+        )
+        self.comment = Comment.objects.create(
+            post=self.post, user=self.user,
+            content='Turnout was <b>remarkable</b> this year.'
+        )
+
+    # Test that posts and comments are found with highlighted snippets
+    def test_search_posts_and_comments(self):
+        results = search('election')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].kind, 'post')
+        self.assertIn('<mark>Election</mark>', results[0].title)
+
+        results = search('remarkable turnout')
+        self.assertEqual(results[0].kind, 'comment')
+        self.assertEqual(results[0].post_title, 'Election results')
+
+        # Asserting user content is escaped around the highlights
+        self.assertIn('&lt;b&gt;<mark>remarkable</mark>', results[0].snippet)
+
+    # Test that titles rank above bodies and stemming applies
+    def test_ranking(self):
+        Post.objects.create(
+            title='Weather', author=self.user,
+            content='No election news here, just an election mention.'
+        )
+        results = search('elections')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].post_id, self.post.id)
+
+    # Test that edits and deletes keep the index current
+    def test_incremental_updates(self):
+        self.post.content = 'Rewritten without the old words.'
+        self.post.save()
+        self.assertEqual(search('district'), [])
+        self.assertEqual(len(search('rewritten')), 1)
+
+        self.comment.delete()
+        self.assertEqual(search('turnout'), [])
+        self.post.delete()
+        self.assertFalse(SearchEntry.objects.exists())
+
+    # Test that query syntax characters are treated as plain text
+    def test_query_syntax_is_ignored(self):
+        self.assertEqual(len(search('"election" (')), 1)
+        self.assertEqual(search('*'), [])
+
+    # Test that the rebuild command restores a wiped index
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(search('election'), [])
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(len(search('election')), 1)
+        self.assertEqual(len(search('turnout')), 1)
+
+    # Test the search page
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'turnout'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Comment on Election results')
+        self.assertContains(
+            response, f'#comment-{self.comment.id}'
+        )
+
+
+# Test class for the JSON Lines export and import commands
+class TransferCommandTests(TestCase):
+
+    # Setup method to create a small forum
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', password='password'
+        )
+        self.category = Category.objects.create(name='News')
+        self.posts = [
+            Post.objects.create(
+                title=f'Post {i}', content='Test Content',
+                author=self.user, category=self.category
+            )
+            for i in range(3)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], user=self.user, content='Imported comment'
+        )
+        counters.vote_changed(self.posts[1].id, up=4)
+        Post.objects.filter(pk=self.posts[2].pk).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+
+    def export(self, *args):
+        output = StringIO()
+        call_command('export_forum', *args, stdout=output, stderr=StringIO())
+        return output.getvalue()
+
+    # Test that the export has one typed record per row, in order
+    def test_export(self):
+        lines = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual(
+            [line['type'] for line in lines],
+            ['user', 'category', 'post', 'post', 'post', 'comment']
+        )
+        self.assertNotIn('password', lines[0])
+        self.assertIn('password', json.loads(
+            self.export('--include-passwords').splitlines()[0]
+        ))
+
+    # Test that an export can be imported into an empty database
+    def test_round_trip(self):
+        data = self.export('--include-passwords')
+        old_created = Post.objects.get(pk=self.posts[2].pk).created_at
+        User.objects.all().delete()
+        Category.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+
+        path = os.path.join(self.tmpdir(), 'forum.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(data)
+        output = StringIO()
+        call_command('import_forum', path, batch_size=2, stdout=output)
+        self.assertIn('Imported 6 records', output.getvalue())
+
+        # Asserting rows, timestamps and derived data are restored
+        self.assertEqual(Post.objects.count(), 3)
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.posts[1].pk).score, 4)
+        self.assertEqual(
+            Post.objects.get(pk=self.posts[2].pk).created_at, old_created
+        )
+        self.assertEqual(len(search('imported')), 1)
+        self.assertTrue(
+            self.client.login(username='testuser', password='password')
+        )
+
+        # Asserting a second import skips the existing rows
+        output = StringIO()
+        call_command('import_forum', path, stdout=output)
+        self.assertIn('Imported 0 records', output.getvalue())
+        self.assertIn('skipped 6 already present', output.getvalue())
+        self.assertEqual(Post.objects.count(), 3)
+
+    # Test that users and categories clashing with existing rows are mapped
+    # to the right rows instead of being dropped
+    def test_import_conflicts(self):
+        path = os.path.join(self.tmpdir(), 'forum.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(self.export())
+        user_id = self.user.id
+        User.objects.all().delete()
+        Category.objects.all().delete()
+        # The exported user's id belongs to someone else, and the category
+        # exists under another id
+        other = User.objects.create(id=user_id, username='other')
+        news = Category.objects.create(name='News')
+
+        output = StringIO()
+        call_command('import_forum', path, stdout=output)
+        self.assertIn('Imported 5 records', output.getvalue())
+        self.assertIn('skipped 1 already present', output.getvalue())
+
+        user = User.objects.get(username='testuser')
+        self.assertNotEqual(user.id, other.id)
+        self.assertEqual(Category.objects.count(), 1)
+        for post in Post.objects.all():
+            self.assertEqual(post.author_id, user.id)
+            self.assertEqual(post.category_id, news.id)
+        self.assertEqual(Comment.objects.get().user_id, user.id)
+
+    # Test that posts and comments whose ids are taken by other rows are
+    # imported under new ids, replies and paths following them, and that
+    # importing again adds nothing
+    def test_import_renumbers_clashing_rows(self):
+        comment = Comment.objects.get()
+        reply = Comment.objects.create(
+            post=self.posts[0], user=self.user, parent=comment,
+            content='Imported reply'
+        )
+        path = os.path.join(self.tmpdir(), 'forum.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(self.export())
+        Post.objects.all().delete()
+        bob = User.objects.create(username='bob')
+        bobs_post = Post.objects.create(
+            id=self.posts[0].id, title="Bob's post", content='Content',
+            author=bob
+        )
+        Comment.objects.create(
+            id=comment.id, post=bobs_post, user=bob, content="Bob's comment"
+        )
+
+        output = StringIO()
+        call_command('import_forum', path, stdout=output)
+        self.assertIn('3 post(s), 2 comment(s)', output.getvalue())
+        self.assertEqual(
+            list(bobs_post.comments.values_list('content', flat=True)),
+            ["Bob's comment"]
+        )
+        post = Post.objects.get(title='Post 0')
+        self.assertNotEqual(post.id, bobs_post.id)
+        self.assertEqual(post.comment_count, 2)
+        imported, imported_reply = post.comments.order_by('path')
+        self.assertEqual(imported.content, 'Imported comment')
+        self.assertEqual(imported_reply.parent_id, imported.id)
+        self.assertGreater(imported_reply.id, imported.id)
+        self.assertEqual(imported_reply.path, imported.path + path_segment(
+            imported_reply.id
+        ))
+        self.assertEqual(imported_reply.depth, reply.depth)
+
+        output = StringIO()
+        call_command('import_forum', path, stdout=output)
+        self.assertIn('Imported 0 records', output.getvalue())
+        self.assertEqual(Comment.objects.count(), 3)
+
+    # Test that malformed input is reported as a command error
+    def test_import_invalid(self):
+        path = os.path.join(self.tmpdir(), 'bad.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write('{"type": "spaceship"}\n')
+        with self.assertRaises(CommandError):
+            call_command('import_forum', path, stdout=StringIO())
+
+    def tmpdir(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+
+# Test class for the benchmark suite's seeding and measuring helpers
+class BenchmarkTests(TestCase):
+
+    # Test that seeding creates the requested volumes with derived data
+    def test_seed(self):
+        data = benchmark.seed(users=3, categories=2, posts=10, comments=20,
+                              batch_size=4)
+        self.assertEqual(len(data['post_ids']), 10)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertEqual(
+            sum(Post.objects.values_list('comment_count', flat=True)), 20
+        )
+
+    # Test that every scenario runs and reports the expected statistics
+    def test_run_client(self):
+        data = benchmark.seed(users=2, categories=2, posts=5, comments=5)
+        results = benchmark.run_client(data, iterations=3, warmup=1)
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        for summary in results.values():
+            self.assertEqual(summary['requests'], 3)
+            self.assertEqual(summary['errors'], 0)
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+            self.assertGreater(summary['queries_per_request'], 0)
+
+    # Test that servers are compared scenario by scenario against the first
+    def test_compare(self):
+        def run_http(url, data, scenarios, **options):
+            rps = {'http://wsgi': 100.0, 'http://asgi': 250.0}[url]
+            return {
+                name: {'throughput_rps': rps} for name in scenarios
+            }
+
+        with patch.object(benchmark, 'run_http', run_http):
+            report = benchmark.compare(
+                {'wsgi': 'http://wsgi', 'asgi': 'http://asgi'}, {},
+                ['post_list', 'search']
+            )
+        self.assertEqual(report['baseline'], 'wsgi')
+        self.assertEqual(
+            report['relative_throughput']['search'],
+            {'wsgi': 1.0, 'asgi': 2.5}
+        )
+
+    # Test the nearest-rank percentile
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    # Test that the connection setup cost is the difference between runs
+    def test_connection_overhead(self):
+        def run_client(data, scenarios, reconnect=False, **options):
+            mean = 7.5 if reconnect else 5.0
+            return {
+                name: {'mean_ms': mean, 'p50_ms': mean, 'p95_ms': mean + 1}
+                for name in scenarios
+            }
+
+        with patch.object(benchmark, 'run_client', run_client):
+            report = benchmark.connection_overhead({}, ['post_list'])
+        self.assertFalse(report['pooled'])
+        self.assertEqual(
+            report['overhead_ms']['post_list'],
+            {'mean_ms': 2.5, 'p50_ms': 2.5, 'p95_ms': 2.5}
+        )
+
+    # Test that write scenarios aren't throttled
+    @override_settings(
+        NEWS_RATE_LIMITS={'add_comment': '1/h'},
+        NEWS_IP_RATE_LIMITS={'add_comment': '1/h'},
     )
+    def test_run_client_not_throttled(self):
+        data = benchmark.seed(users=2, categories=2, posts=5, comments=5)
+        results = benchmark.run_client(
+            data, ['add_comment'], iterations=3, warmup=0
+        )
+        self.assertEqual(results['add_comment']['errors'], 0)
 
-    response = self.client.post(reverse('post_delete', args=[post.id]))
 
-    # Expect redirection to post list or error page
-    self.assertEqual(response.status_code, 302)
+# Test class for the request instrumentation middleware
+class RequestMetricsTests(TestCase):
+
+    # Setup method to create a post and a staff user, starting from empty
+    # metrics
+    def setUp(self):
+        metrics.flush()
+        cache.clear()
+        self.staff = User.objects.create_user(
+            username='staff', password='password', is_staff=True
+        )
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=self.staff
+        )
+
+    # Test that responses carry a Server-Timing header
+    def test_server_timing_header(self):
+        self.client.login(username='staff', password='password')
+        response = self.client.get(
+            reverse('post_detail', args=[self.post.id])
+        )
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+    # Test that requests are aggregated per view
+    def test_histograms(self):
+        for _ in range(3):
+            self.client.get(reverse('post_list'))
+        report = metrics.report()
+        self.assertEqual(report['post_list']['requests'], 3)
+        self.assertEqual(
+            sum(report['post_list']['histogram'].values()), 3
+        )
+        self.assertGreater(report['post_list']['mean_bytes'], 0)
+
+    # Test that processes keep their counts in slots of their own, which
+    # reports add up
+    def test_processes(self):
+        metrics.record('post_list', 10, 2, 3, 4, 100)
+        metrics.flush()
+        with patch.object(metrics, '_process', 'other'), \
+                patch.dict(metrics._slots, clear=True):
+            metrics.record('post_list', 10, 2, 3, 4, 100)
+            metrics.flush()
+        metrics.record('post_list', 10, 2, 3, 4, 100)
+        self.assertEqual(metrics.report()['post_list']['requests'], 3)
+
+    # Test that the flush thread is started once per process
+    @override_settings(NEWS_METRICS_FLUSH=60)
+    def test_flush_thread(self):
+        with patch.object(metrics, '_flusher_pid', None), \
+                patch('news.metrics.threading.Thread') as thread, \
+                patch('news.metrics.atexit.register'):
+            metrics.record('post_list', 10, 2, 3, 4, 100)
+            metrics.record('post_list', 10, 2, 3, 4, 100)
+        self.assertEqual(thread.return_value.start.call_count, 1)
+
+    # Test that slow requests are logged with their SQL
+    @override_settings(NEWS_SLOW_REQUEST_MS=0)
+    def test_slow_request_logged(self):
+        with self.assertLogs('news.requests', 'WARNING') as logs:
+            self.client.get(reverse('post_detail', args=[self.post.id]))
+        self.assertIn('Slow request GET', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    # Test that the metrics endpoint is staff only
+    def test_metrics_endpoint(self):
+        url = reverse('request_metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username='staff', password='password')
+        self.client.get(reverse('post_list'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('post_list', response.json())
+
+    # Test that connection statistics are reported per database
+    def test_connection_metrics(self):
+        url = reverse('connection_metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username='staff', password='password')
+        stats = self.client.get(url).json()
+        self.assertFalse(stats['default']['pooled'])
+        self.assertTrue(stats['default']['health_checks'])
+        self.assertTrue(stats['default']['open'])
+
+
+# Test class for the request histograms under the database cache
+@override_settings(CACHES=DATABASE_CACHES)
+class DatabaseCacheMetricsTests(
+    DatabaseCacheMixin, QueryBudgetMixin, TestCase
+):
+
+    def setUp(self):
+        metrics.flush()
+        cache.clear()
+
+    # Test that recording a request doesn't touch the cache
+    def test_record_without_queries(self):
+        with self.assertNumQueries(0):
+            for i in range(10):
+                metrics.record(f'view{i}', 10, 2, 3, 4, 100)
+
+    # Test that a flush writes one entry per window whatever the number
+    # of views, and the entry is kept as long as reports read the window
+    def test_flush(self):
+        now = time.time()
+        with patch('news.metrics.time.time', return_value=now):
+            for i in range(10):
+                metrics.record(f'view{i}', 10, 2, 3, 4, 100)
+            with self.assertMaxQueries(10):
+                metrics.flush()
+            metrics.record('view0', 10, 2, 3, 4, 100)
+            with self.assertMaxQueries(10):
+                metrics.flush()
+        key = metrics._slot_key(metrics._window(now), 0)
+        seconds = settings.NEWS_METRICS_WINDOW * settings.NEWS_METRICS_WINDOWS
+        data = self.cache_get_later(key, seconds)
+        self.assertEqual(data['views']['view0']['count'], 2)
+        self.assertEqual(len(data['views']), 10)
+
+
+# Test class for threaded comment replies
+class CommentThreadTests(TestCase):
+
+    # Setup method to create a user and a post to comment on
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='threader', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Threaded Post', content='Reply away', author=self.user
+        )
+
+    def comment(self, content, parent=None):
+        return Comment.objects.create(
+            post=self.post, user=self.user, content=content, parent=parent
+        )
+
+    # Test that replies extend their parent's path by one segment
+    def test_paths_and_depth(self):
+        root = self.comment('root')
+        reply = self.comment('reply', parent=root)
+        nested = self.comment('nested', parent=reply)
+        self.assertEqual(root.depth, 0)
+        self.assertEqual(nested.depth, 2)
+        self.assertTrue(nested.path.startswith(reply.path))
+        self.assertTrue(reply.path.startswith(root.path))
+        self.assertEqual(
+            Comment.objects.get(pk=nested.pk).path, nested.path
+        )
+
+    # Test replying through the comment form
+    def test_reply_view(self):
+        root = self.comment('root')
+        self.client.login(username='threader', password='password')
+        response = self.client.post(
+            reverse('add_comment', args=[self.post.id]),
+            {'content': 'A reply', 'parent': root.id}
+        )
+        reply = Comment.objects.get(content='A reply')
+        self.assertEqual(reply.parent_id, root.id)
+        self.assertTrue(response['Location'].endswith(f'#comment-{reply.id}'))
+
+    # Test that replies past the maximum depth attach to the deepest allowed
+    # ancestor instead
+    @override_settings(NEWS_COMMENT_MAX_DEPTH=2)
+    def test_max_depth(self):
+        root = self.comment('root')
+        child = self.comment('child', parent=root)
+        grandchild = self.comment('grandchild', parent=child)
+        self.client.login(username='threader', password='password')
+        self.client.post(
+            reverse('add_comment', args=[self.post.id]),
+            {'content': 'Too deep', 'parent': grandchild.id}
+        )
+        reply = Comment.objects.get(content='Too deep')
+        self.assertEqual(reply.parent_id, child.id)
+        self.assertEqual(reply.depth, 2)
+
+    # Test that the detail page nests replies under their parents
+    def test_detail_renders_tree(self):
+        root = self.comment('root comment')
+        self.comment('nested reply', parent=root)
+        response = self.client.get(reverse('post_detail', args=[self.post.id]))
+        roots = list(response.context['comments'])
+        self.assertEqual([c.content for c in roots], ['root comment'])
+        self.assertEqual(
+            [c.content for c in roots[0].replies], ['nested reply']
+        )
+
+    # Test that long threads collapse and the thread view pages in the rest
+    def test_collapse_and_thread_pages(self):
+        root = self.comment('root')
+        replies = [self.comment(f'reply {i}', parent=root) for i in range(5)]
+        tree = build_tree(
+            Comment.objects.order_by('path'), collapse_after=2
+        )
+        self.assertEqual(len(tree[0].replies), 2)
+        self.assertEqual(tree[0].hidden_replies, 3)
+        self.assertEqual(tree[0].resume_after, replies[1].path)
+
+        url = reverse('comment_thread', args=[root.id])
+        with self.settings(NEWS_COMMENT_THREAD_PAGE=3):
+            first = self.client.get(url)
+            self.assertEqual(first.context['next_after'], replies[1].path)
+            second = self.client.get(
+                url, {'after': first.context['next_after']}
+            )
+        self.assertEqual(
+            [c.content for c in second.context['comments']],
+            ['reply 2', 'reply 3', 'reply 4']
+        )
+        self.assertIsNone(second.context['next_after'])
+
+    # Test that comments bulk-inserted without paths get them filled in
+    def test_fill_missing_paths(self):
+        root = self.comment('root')
+        Comment.objects.bulk_create([
+            Comment(post=self.post, user=self.user, content='bulk',
+                    parent=root)
+        ])
+        self.assertEqual(fill_missing_paths(), 1)
+        bulk = Comment.objects.get(content='bulk')
+        self.assertEqual(bulk.depth, 1)
+        self.assertTrue(bulk.path.startswith(root.path))
+
+    # Test that the admin can't change where a comment sits in its thread
+    def test_admin_keeps_thread(self):
+        model_admin = admin.site._registry[Comment]
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(username='admin')
+        self.assertEqual(
+            list(model_admin.get_form(request).base_fields),
+            ['post', 'user', 'content', 'parent']
+        )
+        self.assertEqual(
+            list(model_admin.get_form(request, self.comment('root'))
+                 .base_fields),
+            ['user', 'content']
+        )
+
+
+# Test class for paging through a post's comments
+@override_settings(NEWS_COMMENT_PAGE=2)
+class CommentPaginationTests(TestCase):
+
+    # Setup method to create a post with five replied-to comments
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='pager')
+        self.post = Post.objects.create(
+            title='Busy Post', content='Lots to say', author=user
+        )
+        for i in range(5):
+            root = Comment.objects.create(
+                post=self.post, user=user, content=f'comment {i}'
+            )
+            Comment.objects.create(
+                post=self.post, user=user, content=f'reply {i}',
+                parent=root
+            )
+
+    # Test that the detail page shows only the first page of threads
+    def test_first_page(self):
+        response = self.client.get(
+            reverse('post_detail', args=[self.post.id])
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [c.content for c in comments], ['comment 0', 'comment 1']
+        )
+        self.assertEqual(
+            [c.content for c in list(comments)[1].replies], ['reply 1']
+        )
+        self.assertContains(response, 'reply 1')
+        self.assertNotContains(response, 'comment 2')
+        self.assertTrue(comments.has_next)
+
+    # Test that following the fragment endpoint's cursors visits every
+    # top-level comment once, in posting order
+    def test_fragment_pages(self):
+        url = reverse('post_comments', args=[self.post.id])
+        seen = []
+        cursor = ''
+        while True:
+            data = self.client.get(
+                url, {'cursor': cursor, 'format': 'json'}
+            ).json()
+            seen.append(data['count'])
+            if not data['next_cursor']:
+                break
+            cursor = data['next_cursor']
+        self.assertEqual(seen, [2, 2, 1])
+        self.assertIn('comment 4', data['html'])
+        self.assertIn('reply 4', data['html'])
+        self.assertNotIn('Load more comments', data['html'])
+
+    # Test that the fragment endpoint serves bare list items by default
+    def test_html_fragment(self):
+        response = self.client.get(
+            reverse('post_comments', args=[self.post.id])
+        )
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'Load more comments')
+        self.assertTemplateUsed(response, 'news/comment_page.html')
+
+    # Test that new comments are shown within their thread
+    def test_comment_redirect(self):
+        User.objects.create_user(username='poster', password='password')
+        self.client.login(username='poster', password='password')
+        response = self.client.post(
+            reverse('add_comment', args=[self.post.id]),
+            {'content': 'Late to the party'}
+        )
+        comment = Comment.objects.get(content='Late to the party')
+        self.assertRedirects(
+            response,
+            reverse('comment_thread', args=[comment.id])
+            + f'#comment-{comment.id}'
+        )
+
+
+# Test class for the async read views served in ASGI mode
+@override_settings(NEWS_SERVER_MODE='asgi')
+class AsyncViewTests(TestCase):
+
+    # Cleanups run last first, so the URLconf is reloaded again once the
+    # settings override is gone
+    @classmethod
+    def setUpClass(cls):
+        cls.addClassCleanup(cls.reload_urls)
+        super().setUpClass()
+        cls.reload_urls()
+
+    # The URLconf picks the read views at import time
+    @staticmethod
+    def reload_urls():
+        importlib.reload(news.urls)
+        importlib.reload(news_forum.urls)
+        clear_url_caches()
+
+    # Setup method to create a post with a threaded comment
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='asyncuser', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Async Post', content='Served from the event loop',
+            author=self.user
+        )
+        root = Comment.objects.create(
+            post=self.post, user=self.user, content='Async comment'
+        )
+        Comment.objects.create(
+            post=self.post, user=self.user, content='Async reply',
+            parent=root
+        )
+
+    # Test that the read routes resolve to coroutine views
+    def test_routes(self):
+        match = resolve(reverse('post_detail', args=[self.post.id]))
+        self.assertTrue(iscoroutinefunction(match.func))
+        match = resolve(reverse('post_create'))
+        self.assertFalse(iscoroutinefunction(match.func))
+
+    # Test that the worker warms the page cache through the async views
+    def test_warm_pages(self):
+        paths = [
+            reverse('post_list'), reverse('post_detail', args=[self.post.id])
+        ]
+        tasks.warm_pages(paths)
+        with self.assertNumQueries(0):
+            for path in paths:
+                self.assertContains(self.client.get(path), 'Async Post')
+
+    # Test the async list, detail, comments and search views
+    async def test_read_views(self):
+        response = await self.async_client.get(reverse('post_list'))
+        self.assertContains(response, 'Async Post')
+
+        response = await self.async_client.get(
+            reverse('post_detail', args=[self.post.id])
+        )
+        self.assertContains(response, 'Async reply')
+        # The queries run in sync_to_async threads are counted too
+        self.assertRegex(
+            response.headers['Server-Timing'], r'desc="[1-9]\d* queries"'
+        )
+
+        response = await self.async_client.get(
+            reverse('post_comments', args=[self.post.id]),
+            {'format': 'json'}
+        )
+        self.assertEqual(response.json()['count'], 1)
+
+        response = await self.async_client.get(
+            reverse('search'), {'q': 'event'}
+        )
+        self.assertContains(response, 'Async Post')
+
+        response = await self.async_client.get(
+            reverse('post_detail', args=[0])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    # Test that logged in users get a fresh page and anonymous users a
+    # cached one
+    async def test_page_cache(self):
+        url = reverse('post_detail', args=[self.post.id])
+        await self.async_client.get(url)
+        await Post.objects.filter(pk=self.post.pk).aupdate(
+            title='Renamed quietly'
+        )
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Async Post')
+
+        await self.async_client.alogin(
+            username='asyncuser', password='password'
+        )
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Renamed quietly')
+        self.assertContains(response, 'name="parent"')
+
+        await Vote.objects.acreate(
+            user=self.user, post=self.post, value=Vote.UP
+        )
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'data-current="up"')
+
+
+# Test class for live comment events
+class CommentEventTests(TestCase):
+
+    # Setup method to create a user and a post to comment on
+    def setUp(self):
+        self.user = User.objects.create(username='streamer')
+        self.post = Post.objects.create(
+            title='Live Post', content='Watch this', author=self.user
+        )
+
+    # Test that subscribers get events published from other threads
+    async def test_fan_out(self):
+        broker = events.LocalBroker()
+        async with broker.subscribe('post:1', maxsize=5) as first, \
+                broker.subscribe('post:1', maxsize=5) as second:
+            await asyncio.to_thread(broker.publish, 'post:1', {'n': 1})
+            broker.publish('post:2', {'n': 2})
+            self.assertEqual(await first.get(), {'n': 1})
+            self.assertEqual(await second.get(), {'n': 1})
+            self.assertTrue(first.queue.empty())
+        self.assertEqual(broker.subscriber_count('post:1'), 0)
+
+    # Test that a subscriber that falls behind is told to resync instead
+    # of buffering without bound
+    async def test_backpressure(self):
+        broker = events.LocalBroker()
+        async with broker.subscribe('post:1', maxsize=3) as subscription:
+            for n in range(5):
+                broker.publish('post:1', {'n': n})
+            await asyncio.sleep(0)
+            self.assertEqual(await subscription.get(), events.RESYNC)
+            self.assertEqual(await subscription.get(), {'n': 4})
+            self.assertEqual(subscription.dropped, 3)
+
+    # Test that comment changes are published once committed
+    def test_comment_events(self):
+        with patch.object(events, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                comment = Comment.objects.create(
+                    post=self.post, user=self.user, content='First!'
+                )
+            comment_id = comment.pk
+            with self.captureOnCommitCallbacks(execute=True):
+                comment.content = 'First, edited'
+                comment.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                comment.delete()
+        kinds = [call.args[1]['type'] for call in publish.call_args_list]
+        self.assertEqual(kinds, ['created', 'edited', 'deleted'])
+        channel, event = publish.call_args_list[1].args
+        self.assertEqual(channel, f'post:{self.post.id}')
+        self.assertEqual(event['html'], '<p>First, edited</p>')
+        self.assertNotIn('content', event)
+        self.assertEqual(publish.call_args_list[2].args[1]['id'], comment_id)
+
+    # Test that the stream is only served in ASGI mode
+    def test_stream_needs_asgi(self):
+        response = self.client.get(
+            reverse('comment_stream', args=[self.post.id])
+        )
+        self.assertEqual(response.status_code, 204)
+
+    # Test that published events come out of the stream as SSE
+    @override_settings(NEWS_SERVER_MODE='asgi')
+    async def test_stream(self):
+        response = await self.async_client.get(
+            reverse('comment_stream', args=[self.post.id])
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        events.publish(
+            events.post_channel(self.post.id), {'type': 'deleted', 'id': 7}
+        )
+        self.assertEqual(
+            await anext(chunks),
+            b'event: deleted\ndata: {"type":"deleted","id":7}\n\n'
+        )
+        await chunks.aclose()
+
+
+# Test class for the query plan checks
+class ExplainTests(TestCase):
+
+    # Test that no view query reads a whole table
+    def test_views_use_indexes(self):
+        data = benchmark.seed(users=3, categories=2, posts=20, comments=40)
+        results = explain.check_views(data, allow={'news_category'})
+        self.assertTrue(results)
+        flagged = [
+            (name, sql) for name, sql, plan, tables in results if tables
+        ]
+        self.assertEqual(flagged, [])
+
+    # Test that a view failing is an error rather than a clean report
+    def test_failed_view(self):
+        data = benchmark.seed(users=3, categories=2, posts=5, comments=5)
+        data['post_ids'] = [0]
+        with self.assertRaisesMessage(RuntimeError, 'returned status 404'):
+            explain.capture_queries(data, ['post_detail'])
+
+    # Test that the configured database is only checked with reads
+    def test_existing_reads_only(self):
+        with self.assertRaisesMessage(CommandError, 'add_comment'):
+            call_command(
+                'explain_views', '--existing', '--scenarios',
+                'post_list,add_comment'
+            )
+
+    # Test that checking the configured database writes nothing, not even
+    # the login of the user the views are requested as
+    def test_existing_rolled_back(self):
+        benchmark.seed(users=3, categories=2, posts=5, comments=5)
+        with patch('news.benchmark.test_environment', nullcontext):
+            call_command('explain_views', '--existing', stdout=StringIO())
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(
+            User.objects.filter(last_login__isnull=False).exists()
+        )
+
+    # Test that a database without the rows a scenario needs is reported
+    def test_existing_missing_rows(self):
+        User.objects.create(username='reader')
+        with self.assertRaisesMessage(CommandError, 'category_ids missing'):
+            call_command(
+                'explain_views', '--existing', '--scenarios',
+                'post_list,category_posts'
+            )
+
+    # Test that full scans are recognised in each database's plans
+    def test_full_scans(self):
+        self.assertEqual(explain.full_scans(
+            ['SCAN news_post', 'SCAN news_post USING INDEX news_post_idx',
+             'SEARCH news_comment USING INDEX news_comment_idx (post_id=?)'],
+            'sqlite'
+        ), ['news_post'])
+        self.assertEqual(explain.full_scans(
+            ['Limit', 'Seq Scan on news_comment',
+             'Index Scan using news_post_pkey on news_post'],
+            'postgresql', allow={'news_category'}
+        ), ['news_comment'])
+        self.assertEqual(explain.full_scans(['ALL'], 'mysql'), [])
+
+
+# Test class for user profile pages and their aggregates
+class UserProfileTests(TestCase):
+
+    # Setup method to create an author, a reader and a post with a comment
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', password='password'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Profiled Post', content='Some content',
+            author=self.author
+        )
+        Comment.objects.create(
+            post=self.post, user=self.reader, content='Nice post'
+        )
+
+    def profile(self, user):
+        return UserProfile.objects.get(user=user)
+
+    # Test that posts, comments and votes move the aggregates
+    def test_incremental_aggregates(self):
+        self.assertEqual(self.profile(self.author).post_count, 1)
+        self.assertEqual(self.profile(self.reader).comment_count, 1)
+
+        cast_vote(self.reader, self.post.id, Vote.UP)
+        self.assertEqual(self.profile(self.author).karma, 1)
+        cast_vote(self.reader, self.post.id, Vote.DOWN)
+        self.assertEqual(self.profile(self.author).karma, -1)
+
+        self.post.refresh_from_db()
+        self.post.delete()
+        author = self.profile(self.author)
+        self.assertEqual((author.post_count, author.karma), (0, 0))
+        self.assertEqual(self.profile(self.reader).comment_count, 0)
+
+    # Test that the profile page shows the figures without counting rows
+    def test_profile_page(self):
+        url = reverse('user_profile', args=['author'])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertNotIn(
+            'COUNT(', ' '.join(q['sql'] for q in context.captured_queries)
+        )
+        self.assertContains(response, '1 post |')
+        self.assertContains(response, 'Profiled Post')
+
+        response = self.client.get(
+            reverse('user_profile', args=['reader']), {'show': 'comments'}
+        )
+        self.assertContains(response, 'Nice post')
+        self.assertContains(response, '1 comment |')
+        self.assertEqual(
+            self.client.get(
+                reverse('user_profile', args=['nobody'])
+            ).status_code,
+            404
+        )
+
+    # Test paging through a user's posts
+    @override_settings(NEWS_PAGE_SIZE=2)
+    def test_profile_pagination(self):
+        for i in range(3):
+            Post.objects.create(
+                title=f'Later Post {i}', content='More', author=self.author
+            )
+        url = reverse('user_profile', args=['author'])
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(
+            [p.title for p in first], ['Later Post 2', 'Later Post 1']
+        )
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [p.title for p in second], ['Later Post 0', 'Profiled Post']
+        )
+
+    # Test that reconciliation repairs drifted and missing profiles
+    def test_reconcile_profiles(self):
+        UserProfile.objects.filter(user=self.author).update(
+            post_count=7, karma=3
+        )
+        UserProfile.objects.filter(user=self.reader).delete()
+        self.assertEqual(counters.reconcile_profiles(batch_size=1), 2)
+        self.assertEqual(self.profile(self.author).post_count, 1)
+        self.assertEqual(self.profile(self.author).karma, 0)
+        self.assertEqual(self.profile(self.reader).comment_count, 1)
+
+
+# Test class for throttling post and comment creation
+@override_settings(
+    NEWS_RATE_LIMITS={'add_comment': '2/m'},
+    NEWS_IP_RATE_LIMITS={'add_comment': '3/m'},
+)
+class RateLimitTests(TestCase):
+
+    # Setup method to create a signed in user, a post and empty buckets
+    def setUp(self):
+        metrics.flush()
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='writer', password='password'
+        )
+        self.category = Category.objects.create(name='News')
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=self.user
+        )
+        self.client.login(username='writer', password='password')
+        self.url = reverse('add_comment', args=[self.post.id])
+
+    def comment(self):
+        return self.client.post(self.url, {'content': 'Hello there'})
+
+    # Test that rates are parsed into bucket size and refill interval
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('10/m'), (10, 6000))
+        self.assertEqual(ratelimit.parse_rate('5/10m'), (5, 120000))
+        with self.assertRaises(ImproperlyConfigured):
+            ratelimit.parse_rate('0/m')
+
+    # Test that a burst is allowed and the next write gets a 429
+    def test_throttled(self):
+        self.assertEqual(self.comment().status_code, 302)
+        self.assertEqual(self.comment().status_code, 302)
+        response = self.comment()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(response['Retry-After'], ('29', '30'))
+        self.assertEqual(Comment.objects.count(), 2)
+        # Reading the page is not limited
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    # Test that tokens come back at the configured rate and throttled
+    # requests don't use any up
+    def test_refill(self):
+        start = time.time()
+        with patch('news.ratelimit.time.time', return_value=start):
+            self.comment()
+            self.comment()
+            self.assertEqual(self.comment().status_code, 429)
+        with patch('news.ratelimit.time.time', return_value=start + 30):
+            self.assertEqual(self.comment().status_code, 302)
+            self.assertEqual(self.comment().status_code, 429)
+
+    # Test that users are limited separately, and all of them together
+    # by their address
+    def test_per_user_and_address(self):
+        self.comment()
+        self.comment()
+        User.objects.create_user(username='other', password='password')
+        self.client.login(username='other', password='password')
+        self.assertEqual(self.comment().status_code, 302)
+        self.assertEqual(self.comment().status_code, 429)
+        self.assertEqual(
+            self.client.post(
+                self.url, {'content': 'Hello there'}, REMOTE_ADDR='10.0.0.9'
+            ).status_code,
+            302
+        )
+
+    # Test that a request throttled by one bucket doesn't use up a token
+    # of the other
+    def test_tokens_returned(self):
+        with self.settings(NEWS_IP_RATE_LIMITS={'add_comment': '1/m'}):
+            self.assertEqual(self.comment().status_code, 302)
+            self.assertEqual(self.comment().status_code, 429)
+
+        def comment():
+            return self.client.post(
+                self.url, {'content': 'Hello there'}, REMOTE_ADDR='10.0.0.9'
+            )
+        self.assertEqual(comment().status_code, 302)
+        self.assertEqual(comment().status_code, 429)
+
+    # Test that views without a configured rate are not limited
+    def test_unlimited_scope(self):
+        data = {
+            'title': 'Title', 'content': 'Content',
+            'category': self.category.id,
+        }
+        for _ in range(3):
+            response = self.client.post(reverse('post_create'), data)
+            self.assertEqual(response.status_code, 302)
+
+    # Test that the client address comes from the trusted proxy
+    @override_settings(NEWS_TRUSTED_PROXIES=1)
+    def test_client_ip(self):
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='10.0.0.1, 10.0.0.2',
+            REMOTE_ADDR='10.0.0.3'
+        )
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.2')
+        with self.settings(NEWS_TRUSTED_PROXIES=0):
+            self.assertEqual(ratelimit.client_ip(request), '10.0.0.3')
+
+    # Test that throttled requests are counted in the metrics
+    def test_metrics(self):
+        for _ in range(3):
+            self.comment()
+        report = metrics.report()
+        self.assertEqual(report['add_comment']['requests'], 3)
+        self.assertEqual(report['add_comment']['throttled'], 1)
+
+
+# Test class for the rate limit buckets under the database cache, whose
+# incr isn't atomic, so the buckets are stored in their own table
+@override_settings(CACHES=DATABASE_CACHES)
+class StoredRateLimitTests(DatabaseCacheMixin, TestCase):
+    key = 'news:ratelimit:test:ip:10.0.0.1'
+
+    def take(self, rate='2/10m'):
+        return ratelimit.take_token(self.key, *ratelimit.parse_rate(rate))
+
+    # Test that a burst is allowed, the next request is throttled and
+    # taking a token is a single query
+    def test_throttled(self):
+        self.assertFalse(ratelimit.cached_buckets())
+        self.assertEqual(self.take(), 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.take(), 0)
+        self.assertIn(self.take(), (299, 300))
+        self.assertIsNone(cache.get(self.key))
+        self.assertTrue(RateLimitBucket.objects.filter(key=self.key).exists())
+
+    # Test that tokens come back at the configured rate and throttled
+    # requests don't use any up
+    def test_refill(self):
+        start = time.time()
+        with patch('news.ratelimit.time.time', return_value=start):
+            self.take()
+            self.take()
+            self.assertGreater(self.take(), 0)
+        with patch('news.ratelimit.time.time', return_value=start + 300):
+            self.assertEqual(self.take(), 0)
+            self.assertGreater(self.take(), 0)
+
+    # Test that a token taken from one bucket is put back when another
+    # bucket of the request is empty
+    def test_tokens_returned(self):
+        other = 'news:ratelimit:test:user:1'
+        buckets = [(self.key, '2/10m'), (other, '1/10m')]
+        self.assertEqual(ratelimit.take_tokens(buckets), 0)
+        self.assertGreater(ratelimit.take_tokens(buckets), 0)
+        self.assertEqual(self.take(), 0)
+        self.assertGreater(self.take(), 0)
+
+    # Test that only the rows of full buckets are purged
+    def test_purge(self):
+        self.take()
+        RateLimitBucket.objects.create(key='full', full_at=0)
+        self.assertEqual(ratelimit.purge_buckets(), 1)
+        self.assertTrue(RateLimitBucket.objects.filter(key=self.key).exists())
+
+
+# Test class for the RSS and Atom feeds
+class FeedTests(TestCase):
+
+    # Setup method to create posts in two categories
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='testuser')
+        self.news = Category.objects.create(name='News')
+        self.sport = Category.objects.create(name='Sport')
+        self.post = Post.objects.create(
+            title='News Post', content='First line\n\n<b>bold</b>',
+            author=self.user, category=self.news
+        )
+        Post.objects.create(
+            title='Sport Post', content='Test Content',
+            author=self.user, category=self.sport
+        )
+
+    # Test that the feeds list the newest posts
+    def test_feeds(self):
+        response = self.client.get(reverse('post_feed_rss'))
+        self.assertEqual(response['Content-Type'][:19], 'application/rss+xml')
+        self.assertContains(response, '<title>News Post</title>')
+        self.assertContains(response, '<title>Sport Post</title>')
+        self.assertContains(response, '&amp;lt;b&amp;gt;bold')
+        self.assertContains(response, '<dc:creator')
+
+        response = self.client.get(reverse('post_feed_atom'))
+        self.assertEqual(
+            response['Content-Type'][:20], 'application/atom+xml'
+        )
+        self.assertContains(response, '<updated>')
+
+    # Test that category feeds only list the category's posts
+    def test_category_feed(self):
+        response = self.client.get(
+            reverse('category_feed_rss', args=[self.sport.id])
+        )
+        self.assertContains(response, 'News Forum: Sport')
+        self.assertContains(response, 'Sport Post')
+        self.assertNotContains(response, 'News Post')
+        response = self.client.get(reverse('category_feed_atom', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    # Test that unchanged feeds are answered with 304 from one query
+    def test_conditional_get(self):
+        url = reverse('post_feed_rss')
+        response = self.client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        # The Atom feed of the same posts is a different representation
+        response = self.client.get(
+            reverse('post_feed_atom'), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.post.title = 'Edited Post'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Edited Post')
+
+    # Test that renaming an author or a category changes the feed's ETag
+    def test_rename_changes_etag(self):
+        url = reverse('post_feed_rss')
+        etag = self.client.get(url)['ETag']
+        self.news.name = 'Headlines'
+        self.news.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Headlines')
+
+        etag = response['ETag']
+        self.user.username = 'renamed'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'renamed')
+
+
+# Test class for routing reads to replicas, without touching a database
+@override_settings(NEWS_DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    # Setup method to create a router and a view reporting where it reads
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.view = routers.replica_reads(
+            lambda request: (
+                self.router.db_for_read(Post),
+                self.router.db_for_read(User),
+            )
+        )
+
+    # Test that decorated views read the news tables from a replica
+    def test_replica_reads(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(self.view(request), ('replica1', None))
+        self.assertEqual(request.read_replica, 'replica1')
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    # Test that pinned clients and sites without replicas read the primary
+    def test_primary_reads(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        self.assertEqual(self.view(request), (None, None))
+        with self.settings(NEWS_DATABASE_REPLICAS=[]):
+            self.assertEqual(self.view(RequestFactory().get('/')),
+                             (None, None))
+
+    # Test that replicas are left out of migrations
+    def test_allow_migrate(self):
+        self.assertTrue(self.router.allow_migrate('default', 'news'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'news'))
+
+
+# Test class for pinning writers to the primary database
+class ReplicaPinTests(TestCase):
+
+    # Setup method to create a signed in user and a post
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='writer', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=self.user
+        )
+        self.client.login(username='writer', password='password')
+
+    # Test that writes set the pin cookie and reads don't
+    @override_settings(NEWS_DATABASE_REPLICAS=['replica1'])
+    def test_pin_cookie(self):
+        response = self.client.get(reverse('post_list'))
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+        response = self.client.post(
+            reverse('vote_post', args=[self.post.id]), {'value': 'up'}
+        )
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.assertTrue(cookie['httponly'])
+
+    # Test that nothing is pinned without replicas
+    @override_settings(NEWS_DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        response = self.client.post(
+            reverse('vote_post', args=[self.post.id]), {'value': 'up'}
+        )
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+
+# Test class reading from a replica; run it with DATABASE_REPLICA_URLS
+# set, e.g. to the default database's own URL
+@skipUnless(settings.NEWS_DATABASE_REPLICAS, 'No replica configured')
+class ReplicaReadTests(TransactionTestCase):
+    databases = '__all__'
+
+    # Setup method to create a signed in user and a post
+    def setUp(self):
+        cache.clear()
+        self.replica = settings.NEWS_DATABASE_REPLICAS[0]
+        self.user = User.objects.create_user(
+            username='writer', password='password'
+        )
+        self.post = Post.objects.create(
+            title='Test Post', content='Test Content', author=self.user
+        )
+        self.client.login(username='writer', password='password')
+
+    def queries(self, alias, url):
+        with CaptureQueriesContext(connections[alias]) as context:
+            self.client.get(url)
+        return len(context.captured_queries)
+
+    # Test that reads go to the replica until the client writes
+    def test_read_your_writes(self):
+        url = reverse('post_detail', args=[self.post.id])
+        self.assertGreater(self.queries(self.replica, url), 0)
+        self.client.post(
+            reverse('add_comment', args=[self.post.id]),
+            {'content': 'A new comment'}
+        )
+        self.assertEqual(self.queries(self.replica, url), 0)
+        self.assertGreater(self.queries('default', url), 0)
+
+
+calls = []
+
+
+@jobs.task(max_attempts=2)
+def record_call(value):
+    calls.append(value)
+
+
+@jobs.task(max_attempts=2)
+def always_fail():
+    raise ConnectionError('server unreachable')
+
+
+# Test class for the database backed job queue
+class JobQueueTests(TestCase):
+
+    # Setup method to start from an empty call log
+    def setUp(self):
+        calls.clear()
+
+    # Test that queued jobs wait for a worker, which runs them once
+    def test_enqueue_and_work(self):
+        job = record_call.enqueue('a')
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.name, 'news.tests.record_call')
+        self.assertEqual(calls, [])
+        self.assertEqual(jobs.work(), 1)
+        self.assertEqual(calls, ['a'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(jobs.work(), 0)
+
+    # Test that delayed jobs and duplicates by key aren't run early or twice
+    def test_delay_and_key(self):
+        record_call.enqueue('later', delay=60)
+        record_call.enqueue('once', key='k')
+        self.assertIsNone(record_call.enqueue('twice', key='k'))
+        jobs.work()
+        self.assertEqual(calls, ['once'])
+
+    # Test that failures are retried with backoff, then marked failed
+    def test_retry(self):
+        job = always_fail.enqueue()
+        with self.assertLogs('news.jobs', 'WARNING'):
+            jobs.work()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('server unreachable', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('news.jobs', 'ERROR'):
+            jobs.work()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    # Test the exponential backoff bounds
+    @override_settings(NEWS_JOBS_BACKOFF=10, NEWS_JOBS_MAX_BACKOFF=60)
+    def test_backoff(self):
+        self.assertTrue(8 <= jobs.backoff(1) <= 12)
+        self.assertTrue(32 <= jobs.backoff(3) <= 48)
+        self.assertTrue(48 <= jobs.backoff(10) <= 72)
+
+    # Test that jobs of a worker that died are put back
+    def test_requeue_stalled(self):
+        job = record_call.enqueue('a')
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, attempts=1,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(jobs.requeue_stalled(), 1)
+        jobs.work()
+        self.assertEqual(calls, ['a'])
+
+    # Test that synchronous mode runs tasks in place
+    @override_settings(NEWS_JOBS_SYNC=True)
+    def test_sync_mode(self):
+        self.assertIsNone(record_call.enqueue('now'))
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+    # Test that the worker command runs due jobs and exits with --once
+    def test_run_jobs_command(self):
+        record_call.enqueue('a')
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertEqual(calls, ['a'])
+        self.assertIn('Ran 1 job(s)', out.getvalue())
+
+    # Test that email is queued and delivered by the worker
+    @override_settings(
+        EMAIL_BACKEND='news.mail.QueuedEmailBackend',
+        NEWS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_queued_email(self):
+        message = EmailMultiAlternatives(
+            'Hello', 'Plain body', 'from@example.com', ['to@example.com']
+        )
+        message.attach_alternative('<p>HTML body</p>', 'text/html')
+        message.attach('note.bin', b'\x00\x01', 'application/octet-stream')
+        message.send()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().name, 'news.tasks.send_email')
+
+        jobs.work()
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.subject, 'Hello')
+        self.assertEqual(sent.to, ['to@example.com'])
+        self.assertEqual(sent.alternatives[0][1], 'text/html')
+        self.assertEqual(sent.attachments[0][1], b'\x00\x01')
+
+    # Test that the password reset form doesn't send mail in the request
+    @override_settings(
+        EMAIL_BACKEND='news.mail.QueuedEmailBackend',
+        NEWS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_password_reset_queued(self):
+        User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password'
+        )
+        self.client.post(
+            reverse('password_reset'), {'email': 'reader@example.com'}
+        )
+        self.assertEqual(mail.outbox, [])
+        jobs.work()
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+
+    # Test that warmed pages are then served from the page cache
+    def test_warm_pages(self):
+        cache.clear()
+        user = User.objects.create(username='writer')
+        post = Post.objects.create(
+            title='Test Post', content='Test Content', author=user
+        )
+        paths = [reverse('post_list'), reverse('post_detail', args=[post.id])]
+        tasks.warm_pages(paths)
+        with self.assertNumQueries(0):
+            for path in paths:
+                self.assertContains(self.client.get(path), 'Test Post')
+
+    # Test that warm-up requests pass the middleware as real ones do, over
+    # HTTPS when HTTP is redirected, and that missing pages are skipped
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    def test_warm_pages_middleware(self):
+        metrics.flush()
+        cache.clear()
+        paths = [reverse('post_list'), reverse('post_detail', args=[999])]
+        tasks.warm_pages(paths)
+        self.assertEqual(metrics.report(), {})
+        with self.assertNumQueries(0):
+            response = self.client.get(paths[0], secure=True)
+        self.assertEqual(response.status_code, 200)
+
+    # Test that the middleware is loaded once per process
+    def test_warm_pages_handler_reused(self):
+        paths = [reverse('post_list')]
+        with patch.object(
+            tasks.BaseHandler, 'load_middleware', autospec=True,
+            side_effect=tasks.BaseHandler.load_middleware,
+        ) as load:
+            tasks._handlers.clear()
+            tasks.warm_pages(paths)
+            tasks.warm_pages(paths)
+        self.assertEqual(load.call_count, 1)
+
+    # Test that post changes queue a warm-up once committed
+    @override_settings(NEWS_WARM_CACHE=True)
+    def test_warm_on_commit(self):
+        user = User.objects.create(username='writer')
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                title='Test Post', content='Test Content', author=user
+            )
+            Comment.objects.create(post=post, user=user, content='Hello')
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'news.tasks.warm_pages')
+        self.assertEqual(
+            job.args, [['/', reverse('post_detail', args=[post.id])]]
+        )
+
+
+def test_edit_other_users_post(self):
+    # Creating another user
+    another_user = User.objects.create(username='anotheruser')
+
+    # Creating a test post
+    post = Post.objects.create(
+        title='Test Post', content='Just a test', author=another_user
+    )
+
+    response = self.client.get(reverse('post_edit', args=[post.id]))
+
+    # Expect redirection to post list or error page
+    self.assertEqual(response.status_code, 302)
+
+
+def test_delete_other_users_post(self):
+    # Creating another user
+    another_user = User.objects.create(username='anotheruser')
+
+    # Creating a test post
+    post = Post.objects.create(
+        title='Test Post', content='Just a test', author=another_user
+    )
+
+    response = self.client.post(reverse('post_delete', args=[post.id]))
+
+    # Expect redirection to post list or error page
+    self.assertEqual(response.status_code, 302)
+
+
+# Test class for deleting accounts in the background
+class AccountDeletionTests(TestCase):
+
+    # Setup method to create an author with a discussed post, a reply to
+    # someone else and a vote
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', password='password'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', password='password'
+        )
+        post = Post.objects.create(
+            title='Doomed Post', content='Some content', author=self.author
+        )
+        parent = None
+        for i in range(3):
+            parent = Comment.objects.create(
+                post=post, user=self.reader, content=f'Reply {i}',
+                parent=parent
+            )
+        self.other = Post.objects.create(
+            title='Other Post', content='Some content', author=self.reader
+        )
+        kept = Comment.objects.create(
+            post=self.other, user=self.reader, content='Kept'
+        )
+        reply = Comment.objects.create(
+            post=self.other, user=self.author, content='Going',
+            parent=kept
+        )
+        Comment.objects.create(
+            post=self.other, user=self.reader, content='Answer',
+            parent=reply
+        )
+        cast_vote(self.author, self.other.id, Vote.UP)
+
+    # Test that the view deactivates and logs out at once, and the worker
+    # removes the rest
+    def test_delete_account_view(self):
+        self.client.login(username='author', password='password')
+        response = self.client.post(reverse('delete_account'))
+        self.assertRedirects(response, reverse('post_list'))
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.is_active)
+        self.assertEqual(Post.objects.filter(author=self.author).count(), 1)
+        self.assertNotIn('_auth_user_id', self.client.session)
+        self.assertFalse(
+            self.client.login(username='author', password='password')
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse('user_profile', args=['author'])
+            ).status_code,
+            404
+        )
+
+        jobs.work()
+        self.assertFalse(User.objects.filter(username='author').exists())
+        deletion = AccountDeletion.objects.get()
+        self.assertIsNone(deletion.user)
+        self.assertIsNotNone(deletion.finished_at)
+        self.assertEqual(
+            (deletion.posts_total, deletion.comments_total), (1, 1)
+        )
+        self.assertEqual(
+            (deletion.posts_deleted, deletion.comments_deleted,
+             deletion.votes_deleted),
+            (1, 5, 1)
+        )
+
+    # Test that every batch stays within its size and the counters stay
+    # in step
+    def test_purge_batches(self):
+        deletion = accounts.request_deletion(self.author)
+        sizes = []
+        while True:
+            deleted = accounts.purge_batch(deletion, 2)
+            if not deleted:
+                break
+            sizes.append(deleted)
+        self.assertEqual(sizes, [2, 1, 1, 2, 1])
+        self.assertEqual(
+            list(Comment.objects.values_list('content', flat=True)),
+            ['Kept']
+        )
+        self.assertFalse(SearchEntry.objects.filter(
+            body__in=['Doomed Post', 'Going', 'Answer']
+        ).exists())
+        self.other.refresh_from_db()
+        self.assertEqual(
+            (self.other.comment_count, self.other.upvotes, self.other.score),
+            (1, 0, 0)
+        )
+        profile = UserProfile.objects.get(user=self.reader)
+        self.assertEqual((profile.comment_count, profile.karma), (1, 0))
+        self.assertEqual(accounts.purge_batch(deletion, 2), 0)
+
+    # Test that a run out of time queues the remainder
+    @override_settings(NEWS_ACCOUNT_PURGE_SECONDS=0)
+    def test_purge_yields(self):
+        deletion = accounts.request_deletion(self.author)
+        jobs.work()
+        job = Job.objects.get(status=Job.QUEUED)
+        self.assertEqual(job.key, accounts.purge_key(deletion.pk))
+        self.assertTrue(User.objects.filter(username='author').exists())
+
+
+# Test class for the Markdown subset and its pre-rendered columns
+class MarkupTests(TestCase):
+
+    # Setup method to create a user
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='writer', password='password'
+        )
+
+    # Test the supported syntax
+    def test_render(self):
+        self.assertEqual(
+            markup.render('Some **bold**, *italic* and `code`\nnext line'),
+            '<p>Some <strong>bold</strong>, <em>italic</em> and '
+            '<code>code</code><br>\nnext line</p>'
+        )
+        self.assertEqual(
+            markup.render('> quoted\n\n- one\n- two\n\n1. first'),
+            '<blockquote><p>quoted</p></blockquote>\n'
+            '<ul><li>one</li>\n<li>two</li></ul>\n<ol><li>first</li></ol>'
+        )
+        self.assertEqual(
+            markup.render('```\n*not* <b>bold</b>\n```'),
+            '<pre><code>*not* &lt;b&gt;bold&lt;/b&gt;</code></pre>'
+        )
+        self.assertEqual(
+            markup.render('[docs](https://example.com/a_b_c) snake_case'),
+            '<p><a href="https://example.com/a_b_c" rel="nofollow ugc">'
+            'docs</a> snake_case</p>'
+        )
+        # Backticks only make code in the link text, not in the URL
+        self.assertEqual(
+            markup.render('[`run()` docs](https://example.com/`run`)'),
+            '<p><a href="https://example.com/`run`" rel="nofollow ugc">'
+            '<code>run()</code> docs</a></p>'
+        )
+
+    # Test that HTML and unsafe links are never passed through
+    def test_sanitized(self):
+        html = markup.render(
+            '<script>alert(1)</script> [x](javascript:alert(1)) '
+            '[y](https://example.com/" onclick="alert(1))'
+        )
+        self.assertNotIn('<script', html)
+        self.assertNotIn('href="javascript', html)
+        self.assertNotIn('" onclick', html)
+        self.assertIn('&lt;script&gt;', html)
+
+    # Test that saving stores the HTML and excerpt, and only when the
+    # content is saved
+    def test_rendered_on_save(self):
+        post = Post.objects.create(
+            title='Test Post', content='**Big** news. ' + 'More. ' * 50,
+            author=self.user
+        )
+        post.refresh_from_db()
+        self.assertTrue(post.content_html.startswith('<p><strong>Big'))
+        self.assertTrue(post.excerpt.startswith('Big news. More.'))
+        self.assertEqual(len(post.excerpt), markup.EXCERPT_LENGTH)
+
+        Post.objects.filter(pk=post.pk).update(content='*Edited*')
+        post.refresh_from_db()
+        post.title = 'Retitled'
+        post.save(update_fields=['title'])
+        post.refresh_from_db()
+        self.assertTrue(post.content_html.startswith('<p><strong>Big'))
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, '<p><em>Edited</em></p>')
+
+        comment = Comment.objects.create(
+            post=post, user=self.user, content='A _fine_ reply'
+        )
+        comment.refresh_from_db()
+        self.assertEqual(comment.content_html, '<p>A <em>fine</em> reply</p>')
+        self.assertEqual(comment.excerpt, 'A fine reply')
+
+    # Test that the pages show the stored HTML and the list never loads
+    # the content column
+    def test_pages(self):
+        post = Post.objects.create(
+            title='Test Post', content='Read *this*', author=self.user
+        )
+        Comment.objects.create(
+            post=post, user=self.user, content='I **agree**'
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('post_list'))
+        self.assertContains(response, '<p>Read this</p>', html=True)
+        sql = ' '.join(q['sql'] for q in context.captured_queries)
+        self.assertNotIn('"news_post"."content"', sql)
+
+        response = self.client.get(reverse('post_detail', args=[post.id]))
+        self.assertContains(response, '<p>Read <em>this</em></p>')
+        self.assertContains(response, '<p>I <strong>agree</strong></p>')
@@ -0,0 +1,100 @@
+# Comment threads stored as materialized paths. A comment's path is the
+# path of its parent followed by its own id as a fixed-width, zero-padded
+# segment, so sorting by path lists every thread depth-first and a whole
+# subtree is one contiguous, indexable range of paths.
+
+SEGMENT_WIDTH = 10
+
+
+def path_segment(pk):
+    return f'{pk:0{SEGMENT_WIDTH}d}'
+
+
+def depth_of(path):
+    return len(path) // SEGMENT_WIDTH - 1
+
+
+# Path of the ancestor at `depth` (0 is the thread's top-level comment)
+def ancestor_path(path, depth):
+    return path[:(depth + 1) * SEGMENT_WIDTH]
+
+
+# Bounds (lower inclusive, upper exclusive) of the paths in the subtree
+# rooted at `path`. Paths are digits only, so the subtree ends where the
+# last segment's number is one higher, in every collation.
+def subtree_bounds(path):
+    last = int(path[-SEGMENT_WIDTH:]) + 1
+    return path, path[:-SEGMENT_WIDTH] + path_segment(last)
+
+
+# Give comments inserted without a path (bulk inserts, imports) their
+# path and depth. Parents always have lower ids than their replies, so
+# processing by id sees every parent before its children. Returns the
+# number of comments fixed.
+def fill_missing_paths(batch_size=1000):
+    from .models import Comment
+
+    fixed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Comment.objects.filter(path='', pk__gt=last_id)
+            .only('id', 'parent').order_by('pk')[:batch_size]
+        )
+        if not batch:
+            return fixed
+        parent_ids = {c.parent_id for c in batch if c.parent_id}
+        paths = dict(
+            Comment.objects.filter(pk__in=parent_ids)
+            .values_list('pk', 'path')
+        )
+        for comment in batch:
+            parent_path = paths.get(comment.parent_id, '')
+            comment.path = parent_path + path_segment(comment.pk)
+            comment.depth = depth_of(comment.path)
+            paths[comment.pk] = comment.path
+        Comment.objects.bulk_update(batch, ['path', 'depth'])
+        fixed += len(batch)
+        last_id = batch[-1].pk
+
+
+# Assemble comments sorted by path into trees in a single pass. Each
+# comment gets a `replies` list; comments whose parent isn't among them
+# become roots. With `collapse_after`, each root shows at most that many
+# descendants; the rest are counted in `hidden_replies` and can be paged in
+# from the thread view, starting after `resume_after`.
+def build_tree(comments, collapse_after=None):
+    roots = []
+    nodes = {}
+    collapsed = {}
+    for comment in comments:
+        comment.replies = []
+        parent = nodes.get(comment.parent_id)
+        if parent is not None:
+            root = parent.thread_root
+        elif comment.parent_id in collapsed:
+            root = collapsed[comment.parent_id]
+        else:
+            root = comment
+            comment.hidden_replies = 0
+            comment.shown_replies = 0
+            comment.resume_after = None
+            roots.append(comment)
+
+        if root is not comment:
+            if parent is None or (
+                collapse_after is not None
+                and root.shown_replies >= collapse_after
+            ):
+                if not root.hidden_replies:
+                    root.resume_after = root.last_path
+                root.hidden_replies += 1
+                collapsed[comment.pk] = root
+                continue
+            root.shown_replies += 1
+            parent.replies.append(comment)
+
+        comment.thread_root = root
+        root.last_path = comment.path
+        nodes[comment.pk] = comment
+    return roots
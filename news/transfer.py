@@ -0,0 +1,264 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from . import markup
+from .models import Post, Comment, Category
+from .threads import depth_of, path_segment
+
+# Bulk export and import of the forum as JSON Lines: one record per line,
+# tagged with its type and written in dependency order (users, categories,
+# posts, comments). Both directions are generator pipelines that hold at
+# most one batch in memory.
+
+USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name',
+               'is_active', 'date_joined']
+CATEGORY_FIELDS = ['id', 'name', 'description']
+POST_FIELDS = ['id', 'title', 'content', 'author_id', 'category_id',
+               'created_at', 'updated_at', 'upvotes', 'downvotes']
+COMMENT_FIELDS = ['id', 'post_id', 'user_id', 'parent_id', 'path',
+                  'depth', 'content', 'created_at']
+
+MODELS = {
+    'user': (User, USER_FIELDS),
+    'category': (Category, CATEGORY_FIELDS),
+    'post': (Post, POST_FIELDS),
+    'comment': (Comment, COMMENT_FIELDS),
+}
+
+DATETIME_FIELDS = {'date_joined', 'created_at', 'updated_at'}
+
+# Unique fields other than the id identifying users and categories
+NATURAL_KEYS = {'user': 'username', 'category': 'name'}
+
+# Fields on which an existing row with the id of an imported one must
+# agree for the two to be the same row (e.g. on a resumed import)
+IDENTITY_FIELDS = {
+    'user': ['username'],
+    'category': ['name'],
+    'post': ['author_id', 'title', 'created_at'],
+    'comment': ['post_id', 'user_id', 'created_at'],
+}
+
+# Record types the foreign keys of each record type refer to
+FOREIGN_KEYS = {
+    'post': {'author_id': 'user', 'category_id': 'category'},
+    'comment': {'post_id': 'post', 'user_id': 'user', 'parent_id': 'comment'},
+}
+
+
+# JSON encoder that keeps full microsecond precision on datetimes, which
+# DjangoJSONEncoder rounds to milliseconds
+class RecordEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _stream(record_type, batch_size, extra_fields=()):
+    model, fields = MODELS[record_type]
+    fields = fields + list(extra_fields)
+    rows = model.objects.order_by('pk').values(*fields)
+    for row in rows.iterator(chunk_size=batch_size):
+        yield {'type': record_type, **row}
+
+
+def export_records(batch_size=1000, include_passwords=False):
+    user_fields = ['password'] if include_passwords else []
+    return chain(
+        _stream('user', batch_size, user_fields),
+        _stream('category', batch_size),
+        _stream('post', batch_size),
+        _stream('comment', batch_size),
+    )
+
+
+# Write records to a text stream, yielding each record's type as it goes
+def write_jsonl(records, stream):
+    for record in records:
+        stream.write(json.dumps(record, cls=RecordEncoder) + '\n')
+        yield record['type']
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'line {number}: {error}')
+        if record.get('type') not in MODELS:
+            raise ValueError(f'line {number}: unknown record type')
+        yield record
+
+
+def _build(record):
+    model, fields = MODELS[record['type']]
+    values = {}
+    for name in fields:
+        if name not in record:
+            continue
+        value = record[name]
+        if name in DATETIME_FIELDS and value:
+            value = parse_datetime(value)
+        values[name] = value
+    obj = model(**values)
+    if record['type'] == 'user':
+        if record.get('password'):
+            obj.password = record['password']
+        else:
+            obj.set_unusable_password()
+    elif record['type'] == 'post':
+        obj.score = obj.upvotes - obj.downvotes
+    if record['type'] in ('post', 'comment'):
+        markup.render_content(obj)
+    return obj
+
+
+# Keep the exported timestamps instead of letting auto_now/auto_now_add
+# stamp every imported row with the current time
+@contextmanager
+def preserve_timestamps():
+    fields = [
+        field
+        for model, _ in MODELS.values()
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+# Explicit ids leave PostgreSQL sequences behind the data
+def _reset_sequences(models):
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+# Point the foreign keys of a row at the ids their rows were imported under
+def _remap(record_type, obj, remap):
+    for name, target in FOREIGN_KEYS.get(record_type, {}).items():
+        value = getattr(obj, name)
+        setattr(obj, name, remap[target].get(value, value))
+
+
+# Recompute the paths of the renumbered comments of a batch (and so of
+# their replies, which are renumbered with them) from their parents' paths
+def _repath(batch, renumbered):
+    paths = {comment.pk: comment.path for comment in batch}
+    missing = {c.parent_id for c in renumbered if c.parent_id not in paths}
+    paths.update(
+        Comment.objects.filter(pk__in=missing).values_list('pk', 'path')
+    )
+    for comment in renumbered:
+        if comment.path:
+            comment.path = (
+                paths.get(comment.parent_id, '') + path_segment(comment.pk)
+            )
+            comment.depth = depth_of(comment.path)
+            paths[comment.pk] = comment.path
+
+
+# Insert the rows of a batch that aren't there yet and return how many
+# were inserted. A row is only skipped when it is provably in the database
+# already: the row holding its id, or for a renumbered one any row, agrees
+# on its IDENTITY_FIELDS (as on a resumed import), or it is a user or
+# category whose username or name exists. Rows whose id is taken by a
+# different row are inserted under new ids above every id in use, as are
+# the replies of a renumbered comment, which must keep higher ids than
+# their parents. `remap` collects the ids rows were imported under, and
+# the foreign keys of later rows are pointed at them.
+def _flush(record_type, batch, remap):
+    model = MODELS[record_type][0]
+    key = NATURAL_KEYS.get(record_type)
+    fields = IDENTITY_FIELDS[record_type]
+    with transaction.atomic():
+        existing = {
+            row[0]: row[1:]
+            for row in model.objects.filter(
+                pk__in=[obj.pk for obj in batch]
+            ).values_list('pk', *fields)
+        }
+        known = {}
+        if key:
+            names = [getattr(obj, key) for obj in batch]
+            known = dict(
+                model.objects.filter(**{f'{key}__in': names})
+                .values_list(key, 'pk')
+            )
+        next_id = None
+        new = []
+        renumbered = []
+        for obj in batch:
+            parent_id = getattr(obj, 'parent_id', None)
+            _remap(record_type, obj, remap)
+            if key and getattr(obj, key) in known:
+                remap[record_type][obj.pk] = known[getattr(obj, key)]
+                continue
+            row = existing.get(obj.pk)
+            if row == tuple(getattr(obj, field) for field in fields):
+                continue
+            if row is not None or parent_id in remap[record_type]:
+                same = model.objects.filter(**{
+                    field: getattr(obj, field) for field in fields
+                }).values_list('pk', flat=True).first()
+                if same is not None:
+                    remap[record_type][obj.pk] = same
+                    continue
+                if next_id is None:
+                    next_id = max(
+                        model.objects.aggregate(top=Max('pk'))['top'] or 0,
+                        max(obj.pk for obj in batch),
+                    ) + 1
+                remap[record_type][obj.pk] = obj.pk = next_id
+                next_id += 1
+                renumbered.append(obj)
+            new.append(obj)
+        if record_type == 'comment' and renumbered:
+            _repath(new, renumbered)
+        model.objects.bulk_create(new)
+        _reset_sequences([model])
+    return len(new)
+
+
+# Insert records in batches of one type, each batch in its own transaction.
+# Rows already in the database are skipped, so an interrupted import can
+# be re-run, and rows clashing with others are renumbered (see _flush).
+# Yields (type, inserted, skipped) after every batch.
+def import_records(records, batch_size=1000):
+    batch = []
+    batch_type = None
+    remap = {record_type: {} for record_type in MODELS}
+    with preserve_timestamps():
+        for record in records:
+            if record['type'] != batch_type or len(batch) >= batch_size:
+                if batch:
+                    inserted = _flush(batch_type, batch, remap)
+                    yield batch_type, inserted, len(batch) - inserted
+                batch = []
+                batch_type = record['type']
+            batch.append(_build(record))
+        if batch:
+            inserted = _flush(batch_type, batch, remap)
+            yield batch_type, inserted, len(batch) - inserted
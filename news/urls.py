@@ -1,17 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+from .feeds import atom_feed, rss_feed
 from django.contrib.auth import views as auth_views
 
+# The read views run natively async when served over ASGI
+reads = async_views if settings.NEWS_SERVER_MODE == 'asgi' else views
+
 urlpatterns = [
-    path('', views.post_list, name='post_list'),
-    path('post/<int:id>/', views.post_detail, name='post_detail'),
+    path('', reads.post_list, name='post_list'),
+    path('post/<int:id>/', reads.post_detail, name='post_detail'),
     path('post/new/', views.post_create, name='post_create'),
     path('post/<int:id>/edit/', views.post_edit, name='post_edit'),
     path('post/<int:id>/delete/', views.post_delete, name='post_delete'),
+    path('post/<int:id>/vote/', views.vote_post, name='vote_post'),
+    path('post/<int:id>/comments/',
+         reads.post_comments, name='post_comments'),
+    path('post/<int:id>/comments/stream/',
+         async_views.comment_stream, name='comment_stream'),
     path('signup/', views.signup, name='signup'),
     path('login/', auth_views.LoginView.as_view(), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('post/<int:post_id>/comment/', views.add_comment, name='add_comment'),
+    path('comment/<int:comment_id>/thread/',
+         views.comment_thread, name='comment_thread'),
     path('comment/<int:comment_id>/edit/',
          views.edit_comment, name='edit_comment'),
     path('comment/<int:comment_id>/delete/',
@@ -19,5 +31,16 @@ urlpatterns = [
     path('account/delete/', views.delete_account, name='delete_account'),
     path('account/settings/', views.account_settings, name='account_settings'),
     path('category/<int:category_id>/',
-         views.post_list, name='category_posts'),
+         reads.post_list, name='category_posts'),
+    path('feed/rss/', rss_feed, name='post_feed_rss'),
+    path('feed/atom/', atom_feed, name='post_feed_atom'),
+    path('category/<int:category_id>/feed/rss/',
+         rss_feed, name='category_feed_rss'),
+    path('category/<int:category_id>/feed/atom/',
+         atom_feed, name='category_feed_atom'),
+    path('search/', reads.search, name='search'),
+    path('user/<str:username>/', views.user_profile, name='user_profile'),
+    path('metrics/requests/', views.request_metrics, name='request_metrics'),
+    path('metrics/connections/',
+         views.connection_metrics, name='connection_metrics'),
 ]
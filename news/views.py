@@ -1,8 +1,31 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.contrib import messages
-from .models import Post, Comment, Category
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from .models import Post, Comment, UserProfile, Vote
+from . import accounts, metrics
+from .cache import (
+    cache_response, detail_scopes, get_category, list_scopes
+)
 from .forms import PostForm, CommentForm, CustomUserCreationForm
+from .pagination import KeysetPaginator
+from .queries import (
+    comment_page, comment_queryset, post_list_queryset, post_detail_queryset,
+    user_comment_queryset,
+)
+from .ranking import SORT_ORDERINGS
+from .ratelimit import rate_limit
+from .routers import replica_reads
+from .search import search as search_index
+from .threads import ancestor_path, build_tree, subtree_bounds
+from .voting import cast_vote, current_vote
 
 
 # User signup view
@@ -23,38 +46,120 @@ def account_settings(request):
     return render(request, 'news/account_settings.html')
 
 
-# View to display a list of posts, optionally filtered by category
+# View to display a page of posts, optionally filtered by category
+@cache_response(list_scopes)
+@replica_reads
 def post_list(request, category_id=None):
+    selected_category = None
     if category_id:
-        posts = Post.objects.filter(category_id=category_id).order_by(
-            '-created_at')
-        selected_category = get_object_or_404(Category, id=category_id)
-    else:
-        posts = Post.objects.all().order_by('-created_at')
-        selected_category = None
+        # Resolved from the cached category list rather than the database
+        selected_category = get_category(category_id)
+        if selected_category is None:
+            raise Http404('No Category matches the given query.')
+    posts = post_list_queryset(category_id)
+
+    # Ordered by ?sort=hot|new|top, paged with an opaque cursor over the
+    # indexed ordering columns
+    sort = request.GET.get('sort')
+    if sort not in SORT_ORDERINGS:
+        sort = settings.NEWS_DEFAULT_SORT
+    paginator = KeysetPaginator(posts, ordering=SORT_ORDERINGS[sort])
+    page = paginator.get_page(request.GET.get('cursor'))
 
-    categories = Category.objects.all()
     return render(request, 'news/post_list.html', {
-        'posts': posts,
-        'categories': categories,
-        'selected_category': selected_category
+        'posts': page,
+        'page_obj': page,
+        'selected_category': selected_category,
+        'sort': sort,
+    })
+
+
+# View to search posts and comments
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = search_index(query) if query else []
+    return render(request, 'news/search.html', {
+        'query': query,
+        'results': results,
+    })
+
+
+# View to display a user's aggregates and, newest first, a page of their
+# posts or (with ?show=comments) their comments
+def user_profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('profile').only(
+            'id', 'username', 'date_joined', 'profile__post_count',
+            'profile__comment_count', 'profile__karma',
+        ),
+        username=username, is_active=True
+    )
+    try:
+        profile = author.profile
+    except UserProfile.DoesNotExist:
+        profile = UserProfile(user=author)
+
+    show = 'comments' if request.GET.get('show') == 'comments' else 'posts'
+    if show == 'comments':
+        items = user_comment_queryset().filter(user=author)
+    else:
+        items = post_list_queryset().filter(author=author)
+    page = KeysetPaginator(items).get_page(request.GET.get('cursor'))
+
+    return render(request, 'news/user_profile.html', {
+        'author': author,
+        'profile': profile,
+        'show': show,
+        'page_obj': page,
     })
 
 
 # View to display details of a specific post
+@cache_response(detail_scopes)
+@replica_reads
 def post_detail(request, id):
-    post = get_object_or_404(Post, id=id)
+    post = get_object_or_404(post_detail_queryset(), id=id)
     form = CommentForm()
-    return render(request, 'news/post_detail.html',
-                  {'post': post, 'form': form})
+    comments = comment_page(
+        post.id, request.GET.get('comments'),
+        collapse_after=settings.NEWS_COMMENT_COLLAPSE_AFTER
+    )
+    return render(request, 'news/post_detail.html', {
+        'post': post, 'form': form, 'comments': comments,
+        'current_vote': current_vote(request.user, post.id)})
 
 
-# View to delete the user's account (requires login)
+# View to fetch the next page of a post's comments, as an HTML fragment
+# to append to the comment list or, with ?format=json, wrapped in JSON
+@cache_response(detail_scopes)
+@replica_reads
+def post_comments(request, id):
+    post = get_object_or_404(Post.objects.only('id'), id=id)
+    comments = comment_page(
+        post.id, request.GET.get('cursor'),
+        collapse_after=settings.NEWS_COMMENT_COLLAPSE_AFTER
+    )
+    context = {'post': post, 'comments': comments}
+    if request.GET.get('format') != 'json':
+        return render(request, 'news/comment_page.html', context)
+    return JsonResponse({
+        'html': render_to_string(
+            'news/comment_page.html', context, request=request
+        ),
+        'count': len(comments),
+        'next_cursor': comments.next_cursor,
+    })
+
+
+# View to delete the user's account (requires login). The account is
+# deactivated and the user logged out at once; their content is removed
+# in the background (see news.accounts).
 @login_required
 def delete_account(request):
     if request.method == 'POST':
         user = request.user
-        user.delete()
+        logout(request)
+        accounts.request_deletion(user)
         messages.success(
             request, 'Your account has been successfully deleted.')
         return redirect('post_list')
@@ -63,6 +168,7 @@ def delete_account(request):
 
 # View to create a new post (requires login)
 @login_required
+@rate_limit('post_create')
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST)
@@ -89,7 +195,10 @@ def post_edit(request, id):
     if request.method == 'POST':
         form = PostForm(request.POST, instance=post)
         if form.is_valid():
-            form.save()
+            # Leave the counters to their F() updates
+            form.save(commit=False).save(
+                update_fields=Post.edited_fields(form.Meta.fields)
+            )
             messages.success(request, 'Post updated successfully!')
             return redirect('post_detail', id=post.id)
     else:
@@ -113,8 +222,25 @@ def post_delete(request, id):
     return render(request, 'news/post_confirm_delete.html', {'post': post})
 
 
-# View to add a comment to a post (requires login)
+# Comment a reply attaches to. Replies to comments at the deepest allowed
+# level attach to that comment's parent instead, so threads never nest
+# deeper than NEWS_COMMENT_MAX_DEPTH.
+def _reply_parent(post, parent_id):
+    if not parent_id or not parent_id.isdigit():
+        return None
+    comments = Comment.objects.only('id', 'post', 'path', 'depth')
+    parent = get_object_or_404(comments, id=parent_id, post=post)
+    max_depth = settings.NEWS_COMMENT_MAX_DEPTH
+    if parent.depth >= max_depth:
+        parent = comments.get(
+            post=post, path=ancestor_path(parent.path, max_depth - 1)
+        )
+    return parent
+
+
+# View to add a comment (or a reply to one) to a post (requires login)
 @login_required
+@rate_limit('add_comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if request.method == 'POST':
@@ -123,12 +249,54 @@ def add_comment(request, post_id):
             comment = form.save(commit=False)
             comment.post = post
             comment.user = request.user
+            comment.parent = _reply_parent(post, request.POST.get('parent'))
             comment.save()
-            return redirect('post_detail', id=post.id)
+            # The post page only shows the first page of comments, so
+            # show the new comment within its thread
+            root_id = int(ancestor_path(comment.path, 0))
+            return redirect(
+                reverse('comment_thread', args=[root_id])
+                + f'#comment-{comment.id}'
+            )
     else:
         form = CommentForm()
+    post = get_object_or_404(post_detail_queryset(), id=post_id)
+    comments = comment_page(
+        post.id, collapse_after=settings.NEWS_COMMENT_COLLAPSE_AFTER
+    )
     return render(request, 'news/post_detail.html', {
-        'post': post, 'form': form})
+        'post': post, 'form': form, 'comments': comments,
+        'current_vote': current_vote(request.user, post.id)})
+
+
+# View to page through one comment's thread, in thread order
+def comment_thread(request, comment_id):
+    root = get_object_or_404(
+        Comment.objects.select_related('post').only(
+            'id', 'path', 'post', 'post__title'
+        ),
+        id=comment_id
+    )
+    lower, upper = subtree_bounds(root.path)
+    comments = comment_queryset().filter(
+        post_id=root.post_id, path__lt=upper
+    )
+    # Continue after the last comment of the previous page
+    after = request.GET.get('after', '')
+    if after.isdigit() and lower <= after < upper:
+        comments = comments.filter(path__gt=after)
+    else:
+        comments = comments.filter(path__gte=lower)
+
+    page_size = settings.NEWS_COMMENT_THREAD_PAGE
+    rows = list(comments[:page_size + 1])
+    next_after = rows[page_size - 1].path if len(rows) > page_size else None
+    return render(request, 'news/comment_thread.html', {
+        'post': root.post,
+        'root': root,
+        'comments': build_tree(rows[:page_size]),
+        'next_after': next_after,
+    })
 
 
 # View to edit an existing comment (requires login)
@@ -154,3 +322,35 @@ def delete_comment(request, comment_id):
         comment.delete()
         return redirect('post_detail', id=post_id)
     return render(request, 'news/delete_comment.html', {'comment': comment})
+
+
+# View to vote on a post (requires login); answers with the new tallies
+@login_required
+@require_POST
+def vote_post(request, id):
+    values = {'up': Vote.UP, 'down': Vote.DOWN, 'none': 0}
+    value = values.get(request.POST.get('value'))
+    if value is None:
+        return JsonResponse(
+            {'error': 'value must be one of: up, down, none'}, status=400
+        )
+    post = get_object_or_404(Post.objects.only('id'), id=id)
+    tallies = cast_vote(request.user, post.id, value)
+    return JsonResponse({
+        'post': post.id,
+        'vote': request.POST['value'],
+        **tallies,
+    })
+
+
+# View to dump the rolling per-view request metrics (staff only)
+@staff_member_required
+def request_metrics(request):
+    return JsonResponse(metrics.report())
+
+
+# View to dump this worker's database connection and pool statistics
+# (staff only)
+@staff_member_required
+def connection_metrics(request):
+    return JsonResponse(metrics.connection_stats())
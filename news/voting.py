@@ -0,0 +1,80 @@
+from django.db import IntegrityError, transaction
+
+from . import counters
+from .cache import invalidate_post
+from .models import Post, Vote
+
+# Names of the vote values, as sent by the vote buttons (see
+# static/js/voting.js)
+VOTE_NAMES = {Vote.UP: 'up', Vote.DOWN: 'down'}
+
+
+# Tally deltas (up, down) for a vote value entering or leaving the ledger
+def _delta(value, sign=1):
+    if value == Vote.UP:
+        return sign, 0
+    if value == Vote.DOWN:
+        return 0, sign
+    return 0, 0
+
+
+# Record `value` (Vote.UP, Vote.DOWN or 0 to withdraw) as the user's vote on
+# the post and return the post's new tallies. Each ledger change is a
+# conditional write whose row count tells us whether it really happened, so
+# repeated or concurrent requests apply every delta exactly once, and the
+# counters themselves move with a single UPDATE.
+def cast_vote(user, post_id, value):
+    with transaction.atomic():
+        up = down = 0
+        if value:
+            try:
+                with transaction.atomic():
+                    Vote.objects.create(user=user, post_id=post_id,
+                                        value=value)
+                up, down = _delta(value)
+            except IntegrityError:
+                # Switch an existing opposite vote; a no-op if unchanged
+                switched = Vote.objects.filter(
+                    user=user, post_id=post_id, value=-value
+                ).update(value=value)
+                if switched:
+                    up, down = _delta(value)
+                    old_up, old_down = _delta(-value, sign=-1)
+                    up, down = up + old_up, down + old_down
+        else:
+            for old in (Vote.UP, Vote.DOWN):
+                deleted, _ = Vote.objects.filter(
+                    user=user, post_id=post_id, value=old
+                ).delete()
+                if deleted:
+                    up, down = _delta(old, sign=-1)
+                    break
+        if up or down:
+            counters.vote_changed(post_id, up=up, down=down)
+    tallies = Post.objects.values(
+        'upvotes', 'downvotes', 'score', 'category_id'
+    ).get(pk=post_id)
+    if up or down:
+        invalidate_post(post_id, tallies['category_id'])
+    del tallies['category_id']
+    return tallies
+
+
+# The name of the user's vote on the post ('up' or 'down'), or '' if they
+# haven't voted, so the page can tell the script which vote is active
+def current_vote(user, post_id):
+    if not user.is_authenticated:
+        return ''
+    value = Vote.objects.filter(
+        user=user, post_id=post_id
+    ).values_list('value', flat=True).first()
+    return VOTE_NAMES.get(value, '')
+
+
+async def acurrent_vote(user, post_id):
+    if not user.is_authenticated:
+        return ''
+    value = await Vote.objects.filter(
+        user=user, post_id=post_id
+    ).values_list('value', flat=True).afirst()
+    return VOTE_NAMES.get(value, '')
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 
 # Middleware configuration: handles requests/responses
 MIDDLEWARE = [
+    'news.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,7 +43,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'news.middleware.StaticFilesMiddleware',
+    'news.middleware.ReplicaPinMiddleware',
 ]
 
 # URL configuration
@@ -60,6 +62,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'news.context_processors.categories',
             ],
         },
     },
@@ -67,6 +70,11 @@ TEMPLATES = [
 
 # WSGI application configuration
 WSGI_APPLICATION = 'news_forum.wsgi.application'
+ASGI_APPLICATION = 'news_forum.asgi.application'
+
+# 'wsgi' serves with sync gunicorn workers, 'asgi' with uvicorn workers
+# and async read views (see gunicorn.conf.py and news/urls.py)
+NEWS_SERVER_MODE = env('NEWS_SERVER_MODE', default='wsgi')
 
 # Database configuration for development and production environments
 if env('DJANGO_ENV') == 'development':
@@ -84,9 +92,53 @@ if env('DJANGO_ENV') == 'development':
 else:
     # Heroku PostgreSQL configuration
     DATABASES = {
-        'default': dj_database_url.config(conn_max_age=600)
+        'default': dj_database_url.config()
     }
 
+# Read replicas: DATABASE_REPLICA_URLS lists connection URLs of replicas of
+# the default database, added as aliases replica1, replica2, ... The post
+# list, post detail and feed views read from them (see news.routers); with
+# none configured everything runs on default. In tests they mirror default.
+for number, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[])):
+    replica = dj_database_url.parse(url)
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{number + 1}'] = replica
+NEWS_DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['news.routers.ReplicaRouter']
+
+# Seconds a client reads from the primary after writing, so it sees its
+# own changes despite replication lag, and seconds an anonymous page read
+# from a replica is cached (it may miss a write the replica hasn't got yet)
+NEWS_REPLICA_PIN_SECONDS = env.int('NEWS_REPLICA_PIN_SECONDS', default=10)
+NEWS_REPLICA_CACHE_TIMEOUT = env.int('NEWS_REPLICA_CACHE_TIMEOUT', default=30)
+
+# Database connections. With DATABASE_POOL=true each process keeps a pool
+# of DATABASE_POOL_MIN_SIZE to DATABASE_POOL_MAX_SIZE PostgreSQL
+# connections shared by its threads, waiting up to DATABASE_POOL_TIMEOUT
+# seconds for a free one; otherwise each thread keeps its own connection
+# for DATABASE_CONN_MAX_AGE seconds. That defaults to 0 (a connection per
+# request) in asgi mode, where the ORM runs in ever new sync_to_async
+# threads that would each leave a persistent connection behind; use the
+# pool there instead. Either way a connection is checked before it is
+# reused, so one dropped by the server is replaced instead of failing the
+# request. See news.metrics.connection_stats for pool usage.
+DATABASE_POOL = env.bool('DATABASE_POOL', default=False)
+for database in DATABASES.values():
+    database['CONN_HEALTH_CHECKS'] = True
+    if DATABASE_POOL and 'postgresql' in database['ENGINE']:
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DATABASE_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DATABASE_POOL_MAX_SIZE', default=10),
+            'timeout': env.float('DATABASE_POOL_TIMEOUT', default=10),
+            'max_idle': 300,
+        }
+    else:
+        database['CONN_MAX_AGE'] = env.int(
+            'DATABASE_CONN_MAX_AGE',
+            default=0 if NEWS_SERVER_MODE == 'asgi' else 600
+        )
+
 # Password validation settings
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -140,8 +192,133 @@ STATICFILES_STORAGE = (
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Email backend configuration for sending emails (e.g., password resets)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Cache configuration. The page cache versions, rate-limit buckets and
+# request metrics must be seen by every process (web workers, run_jobs,
+# management commands), so the default is the database cache, whose table
+# "manage.py createcachetable" creates (the Procfile's release phase runs
+# it). Set CACHE_URL to Redis or Memcached for faster, atomic counters.
+# The database cache's incr/decr read the value and write it back with the
+# default timeout, neither atomically nor keeping the key's expiry, so
+# code doesn't count with them on backends other than Redis and Memcached:
+# the rate-limit buckets then live in a table of their own (news.ratelimit).
+# Only tests, which run in one process, use per-process memory.
+CACHES = {
+    'default': env.cache('CACHE_URL', default=(
+        'locmemcache://' if env('DJANGO_ENV') == 'test'
+        else 'dbcache://news_cache'
+    )),
+}
+
+# Seconds an anonymous page stays cached; writes invalidate it sooner
+NEWS_CACHE_TIMEOUT = env.int('NEWS_CACHE_TIMEOUT', default=300)
+
+# Seconds a rendered template fragment (category list, post card) is kept;
+# fragments are keyed on versions, so edits never show stale fragments
+NEWS_FRAGMENT_CACHE_TIMEOUT = env.int(
+    'NEWS_FRAGMENT_CACHE_TIMEOUT', default=3600
+)
+
+# Category pre-selected when creating a post
+NEWS_DEFAULT_CATEGORY = env('NEWS_DEFAULT_CATEGORY', default='News')
+
+# Number of posts shown per page on the post list pages
+NEWS_PAGE_SIZE = env.int('NEWS_PAGE_SIZE', default=20)
+
+# Number of posts in the RSS and Atom feeds
+NEWS_FEED_ITEMS = env.int('NEWS_FEED_ITEMS', default=30)
+
+# Default ordering of the post list pages: 'hot', 'new' or 'top'
+NEWS_DEFAULT_SORT = env('NEWS_DEFAULT_SORT', default='new')
+
+# Comment threads: deepest reply level, number of replies shown under a
+# top-level comment before the rest of its thread is collapsed, comments
+# per page of the thread view and top-level comments per page of the post
+# detail page
+NEWS_COMMENT_MAX_DEPTH = env.int('NEWS_COMMENT_MAX_DEPTH', default=6)
+NEWS_COMMENT_COLLAPSE_AFTER = env.int(
+    'NEWS_COMMENT_COLLAPSE_AFTER', default=50
+)
+NEWS_COMMENT_THREAD_PAGE = env.int('NEWS_COMMENT_THREAD_PAGE', default=100)
+NEWS_COMMENT_PAGE = env.int('NEWS_COMMENT_PAGE', default=30)
+
+# Live comment updates (ASGI mode only): broker class fanning events out to
+# the open streams, events buffered per stream before a slow client is
+# told to resync, and seconds between keep-alive comments on idle streams
+NEWS_EVENT_BROKER = env(
+    'NEWS_EVENT_BROKER', default='news.events.LocalBroker'
+)
+NEWS_EVENT_BUFFER = env.int('NEWS_EVENT_BUFFER', default=100)
+NEWS_EVENT_KEEPALIVE = env.int('NEWS_EVENT_KEEPALIVE', default=15)
+
+# Write throttling: token-bucket rates per view as "tokens/period" (s, m,
+# h or d, optionally with a multiplier, e.g. 5/10m) for each user and for
+# each client address (looser, as addresses can be shared), and the number
+# of proxies in front of the app whose X-Forwarded-For entries identify the
+# client (1 on Heroku)
+NEWS_RATE_LIMITS = env.dict('NEWS_RATE_LIMITS', default={
+    'post_create': '5/10m',
+    'add_comment': '10/m',
+})
+NEWS_IP_RATE_LIMITS = env.dict('NEWS_IP_RATE_LIMITS', default={
+    'post_create': '20/10m',
+    'add_comment': '40/m',
+})
+NEWS_TRUSTED_PROXIES = env.int('NEWS_TRUSTED_PROXIES', default=0)
+
+# Full-text search: backend class (empty picks the one matching the
+# database), PostgreSQL text search configuration and number of results
+NEWS_SEARCH_BACKEND = env('NEWS_SEARCH_BACKEND', default='')
+NEWS_SEARCH_CONFIG = env('NEWS_SEARCH_CONFIG', default='english')
+NEWS_SEARCH_RESULTS = env.int('NEWS_SEARCH_RESULTS', default=50)
+
+# Request instrumentation: requests slower than this (ms) are logged with
+# their SQL; per-view histograms cover NEWS_METRICS_WINDOWS windows of
+# NEWS_METRICS_WINDOW seconds and are pushed to the cache every
+# NEWS_METRICS_FLUSH seconds by a background thread of each process (0, as
+# in tests, only when a report is made)
+NEWS_SLOW_REQUEST_MS = env.int('NEWS_SLOW_REQUEST_MS', default=500)
+NEWS_METRICS_WINDOW = env.int('NEWS_METRICS_WINDOW', default=300)
+NEWS_METRICS_WINDOWS = env.int('NEWS_METRICS_WINDOWS', default=12)
+NEWS_METRICS_FLUSH = env.int('NEWS_METRICS_FLUSH', default=(
+    0 if env('DJANGO_ENV') == 'test' else 10
+))
+
+# Background jobs (news.jobs), run by "manage.py run_jobs": with
+# NEWS_JOBS_SYNC tasks run in the calling thread instead. Failed jobs are
+# retried up to NEWS_JOBS_ATTEMPTS times, NEWS_JOBS_BACKOFF seconds after
+# the first failure and twice as long after each further one (at most
+# NEWS_JOBS_MAX_BACKOFF); jobs running for NEWS_JOBS_TIMEOUT seconds are
+# assumed lost, and finished ones are kept for NEWS_JOBS_KEEP seconds
+NEWS_JOBS_SYNC = env.bool('NEWS_JOBS_SYNC', default=False)
+NEWS_JOBS_ATTEMPTS = env.int('NEWS_JOBS_ATTEMPTS', default=5)
+NEWS_JOBS_BACKOFF = env.int('NEWS_JOBS_BACKOFF', default=10)
+NEWS_JOBS_MAX_BACKOFF = env.int('NEWS_JOBS_MAX_BACKOFF', default=3600)
+NEWS_JOBS_TIMEOUT = env.int('NEWS_JOBS_TIMEOUT', default=600)
+NEWS_JOBS_KEEP = env.int('NEWS_JOBS_KEEP', default=7 * 86400)
+
+# Deleted accounts are purged by a background job (news.accounts) in
+# transactions of at most NEWS_ACCOUNT_PURGE_BATCH_SIZE rows, for up to
+# NEWS_ACCOUNT_PURGE_SECONDS per run before yielding to other jobs
+NEWS_ACCOUNT_PURGE_BATCH_SIZE = env.int(
+    'NEWS_ACCOUNT_PURGE_BATCH_SIZE', default=200
+)
+NEWS_ACCOUNT_PURGE_SECONDS = env.int('NEWS_ACCOUNT_PURGE_SECONDS', default=30)
+
+# Re-render the pages of changed posts in the background so anonymous
+# readers hit a warm page cache; needs a cache shared with the worker
+NEWS_WARM_CACHE = env.bool('NEWS_WARM_CACHE', default=(
+    'LocMemCache' not in CACHES['default']['BACKEND']
+))
+
+# Host name of the warm-up requests; must be one of ALLOWED_HOSTS
+NEWS_WARM_HOST = env('NEWS_WARM_HOST', default='localhost')
+
+# Email is queued as background jobs (news.mail) and delivered by the
+# worker with NEWS_EMAIL_BACKEND (e.g., password resets)
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='news.mail.QueuedEmailBackend')
+NEWS_EMAIL_BACKEND = env(
+    'NEWS_EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend'
+)
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True